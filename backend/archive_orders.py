@@ -0,0 +1,13 @@
+import argparse
+import json
+
+from clients import get_order_store
+from config import ORDER_ARCHIVE_DAYS
+from utils.order_archive import archive_closed
+
+parser = argparse.ArgumentParser(description="Compact closed orders into archive segments")
+parser.add_argument("--days", type=int, default=ORDER_ARCHIVE_DAYS, help="archive orders older than this")
+parser.add_argument("--dry-run", action="store_true", help="only count the candidates")
+args = parser.parse_args()
+
+print(json.dumps(archive_closed(get_order_store(), args.days, dry_run=args.dry_run), indent=2))
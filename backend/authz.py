@@ -1,48 +1,123 @@
 import functools
+import hashlib
 import json
+import os
+import threading
+import time
 from flask import request, jsonify
 import firebase_admin
-from firebase_admin import auth, firestore, credentials
+from firebase_admin import auth, credentials
 from google.cloud import secretmanager
+from clients import get_db
+from config import TOKEN_CACHE_SIZE, ROLE_CACHE_TTL, SERVICE_ACCOUNT_SECRET, SERVICE_ACCOUNT_CACHE_PATH
+from utils import metrics
+from utils.startup import timed
+from utils.ttl_cache import TTLCache
+
+_firebase_lock = threading.Lock()
+
 
 def get_service_account_from_secret(secret_id: str, version_id: str = "latest"):
     client = secretmanager.SecretManagerServiceClient()
-    name = f"projects/keen-snow-470010-a7/secrets/service-key/versions/1"
+    name = SERVICE_ACCOUNT_SECRET
     response = client.access_secret_version(request={"name": name})
     payload = response.payload.data.decode("UTF-8")
     return json.loads(payload)
 
-# Fetch credentials
-service_account_info = get_service_account_from_secret("service-key")
-cred = credentials.Certificate(service_account_info)
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred)
+def load_service_account():
+    """Service account JSON, cached on local disk so each instance hits Secret Manager once"""
+    try:
+        with open(SERVICE_ACCOUNT_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    info = get_service_account_from_secret("service-key")
+    try:
+        fd = os.open(SERVICE_ACCOUNT_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(info, f)
+    except OSError as err:
+        print(f"Could not cache service account: {err}")
+    return info
+
+
+def ensure_firebase_app():
+    """Initialise firebase_admin on first use instead of at import time"""
+    if firebase_admin._apps:
+        return
+    with _firebase_lock:
+        if not firebase_admin._apps:
+            with timed("firebase.init"):
+                cred = credentials.Certificate(load_service_account())
+                firebase_admin.initialize_app(cred)
+
+
+# Verified tokens are cached until they expire; roles for a short TTL
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+role_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
 
-db = firestore.client()
 
+def cache_stats():
+    """Hit/miss counters for the token and role caches"""
+    return {"tokens": token_cache.stats(), "roles": role_cache.stats()}
 
-def get_user_from_request():
+
+def verify_token(token, fresh=False):
+    """
+    Verify a Firebase ID token. Results are cached by token hash until the
+    token's own expiry; fresh=True skips the cache and checks revocation.
+    """
+    ensure_firebase_app()
+    if fresh:
+        return auth.verify_id_token(token, check_revoked=True)
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    decoded = token_cache.get(key)
+    if decoded is None:
+        decoded = auth.verify_id_token(token)
+        ttl = decoded.get("exp", 0) - time.time()
+        if ttl > 0:
+            token_cache.set(key, decoded, ttl=ttl)
+    return decoded
+
+
+def has_admin_role(uid, fresh=False):
+    is_admin = None if fresh else role_cache.get(uid)
+    if is_admin is None:
+        with metrics.span("firestore"):
+            doc = get_db().collection("roles").document(uid).get()
+        is_admin = bool(doc.to_dict().get("admin")) if doc.exists else False
+        role_cache.set(uid, is_admin)
+    return is_admin
+
+
+def get_user_from_request(fresh=False):
     hdr = request.headers.get("Authorization", "")
     if not hdr.startswith("Bearer "): 
         return None
     token = hdr.split(" ", 1)[1]
     try:
-        decoded = auth.verify_id_token(token)
+        decoded = verify_token(token, fresh=fresh)
         uid = decoded["uid"]
         is_admin = bool(decoded.get("admin"))
         if not is_admin:
-            doc = db.collection("roles").document(uid).get()
-            is_admin = bool(doc.to_dict().get("admin")) if doc.exists else False
+            is_admin = has_admin_role(uid, fresh=fresh)
         return {"uid": uid, "email": decoded.get("email"), "admin": is_admin}
     except Exception as err:
         print(str(err))
         return None
 
-def require_admin(fn):
+def require_admin(fn=None, *, fresh=False):
+    """
+    Gate a route on an admin user. Use @require_admin(fresh=True) on
+    revocation-sensitive routes to bypass the token and role caches.
+    """
+    if fn is None:
+        return functools.partial(require_admin, fresh=fresh)
+
     @functools.wraps(fn)
     def _wrap(*a, **kw):
-        u = get_user_from_request()
+        u = get_user_from_request(fresh=fresh)
         if not u: 
             return jsonify({"error":"unauthenticated"}), 401
         if not u.get("admin"): 
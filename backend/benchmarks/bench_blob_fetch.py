@@ -0,0 +1,84 @@
+"""
+Serial vs parallel download of orders/*.json blobs.
+
+Runs against a local fake GCS server, e.g.
+    docker run -d -p 4443:4443 fsouza/fake-gcs-server -scheme http
+    STORAGE_EMULATOR_HOST=http://localhost:4443 python benchmarks/bench_blob_fetch.py --orders 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import storage
+from utils.blob_fetch import fetch_orders, share_http_pool
+
+
+def seed(bucket, count):
+    existing = sum(1 for _ in bucket.list_blobs(prefix="orders/"))
+    for _ in range(max(count - existing, 0)):
+        oid = str(uuid.uuid4())
+        order = {
+            "order_id": oid,
+            "created_at": "2025-10-20T10:00:00",
+            "status": "NOT_ENQUIRED",
+            "customer_name": "Bench",
+            "items": [{"id": "p1", "name": "Colour Bijili", "price": 140, "mrp": 1400, "quantity": 2}],
+            "total": 280,
+        }
+        bucket.blob(f"orders/{oid}.json").upload_from_string(json.dumps(order), content_type="application/json")
+
+
+def serial(bucket):
+    # Same loop orders() used before the index
+    out = []
+    for blob in bucket.list_blobs(prefix="orders/"):
+        if blob.name.endswith(".json"):
+            out.append(json.loads(blob.download_as_string()))
+    return len(out)
+
+
+def parallel(bucket, workers):
+    count = 0
+    for _, order, error in fetch_orders(bucket, max_workers=workers):
+        if error is None:
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--bucket", default="bench-orders")
+    args = parser.parse_args()
+
+    if not os.getenv("STORAGE_EMULATOR_HOST"):
+        sys.exit("Set STORAGE_EMULATOR_HOST to a fake GCS server, e.g. http://localhost:4443")
+
+    client = share_http_pool(storage.Client(project="bench", credentials=AnonymousCredentials()), args.workers)
+    bucket = client.bucket(args.bucket)
+    if not bucket.exists():
+        bucket = client.create_bucket(args.bucket)
+    seed(bucket, args.orders)
+
+    t0 = time.perf_counter()
+    n_serial = serial(bucket)
+    t_serial = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    n_parallel = parallel(bucket, args.workers)
+    t_parallel = time.perf_counter() - t0
+
+    print(f"serial:   {n_serial} orders in {t_serial:.2f}s ({n_serial / t_serial:.0f}/s)")
+    print(f"parallel: {n_parallel} orders in {t_parallel:.2f}s ({n_parallel / t_parallel:.0f}/s, {args.workers} workers)")
+    print(f"speedup:  {t_serial / t_parallel:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
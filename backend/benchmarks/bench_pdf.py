@@ -0,0 +1,62 @@
+"""
+Invoice render time and peak memory for 10, 100 and 1000 line items.
+
+    python benchmarks/bench_pdf.py [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.pdf_utils import render_order_pdf, pdf_cache
+
+
+def make_order(n_items):
+    return {
+        "order_id": f"bench-{n_items}",
+        "customer_name": "Bench Customer",
+        "customer_email": "bench@example.com",
+        "customer_phone": "9999999999",
+        "customer_address": "1 Bench Street, Sivakasi",
+        "items": [
+            {"id": f"p{i}", "name": f"Colour Bijili {i} (50 pcs)", "mrp": 1400, "price": 140, "quantity": 1 + i % 5}
+            for i in range(n_items)
+        ],
+        "total": 0,
+        "coupon_code": None,
+    }
+
+
+def measure(order, repeat, use_cache):
+    pdf_cache.clear()
+    render_order_pdf(order, use_cache=use_cache)  # warm up fonts/imports and the cache
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        pdf = render_order_pdf(order, use_cache=use_cache)
+    per_call = (time.perf_counter() - t0) / repeat
+
+    tracemalloc.start()
+    render_order_pdf(order, use_cache=use_cache)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_call, peak, len(pdf)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'items':>6} {'mode':>7} {'ms/render':>10} {'peak KiB':>9} {'pdf KiB':>8}")
+    for n in (10, 100, 1000):
+        order = make_order(n)
+        for mode, use_cache in (("render", False), ("cached", True)):
+            per_call, peak, size = measure(order, args.repeat, use_cache)
+            print(f"{n:>6} {mode:>7} {per_call * 1000:>10.2f} {peak / 1024:>9.0f} {size / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
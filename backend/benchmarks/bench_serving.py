@@ -0,0 +1,90 @@
+"""
+Throughput per instance with sync vs gevent gunicorn workers, at rising
+client concurrency, using the loadtest.py request mix.
+
+Start the emulators and export the environment described in loadtest.py,
+seed once, then:
+    python benchmarks/bench_serving.py --workers 1 --concurrency 8,32,128 --duration 20 --out serving.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import loadtest  # noqa: E402
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_command(mode, app, bind, workers):
+    cmd = ["gunicorn", "-b", bind, "-w", str(workers)]
+    if mode == "gevent":
+        cmd += ["-c", "gunicorn_gevent.py"]
+    return cmd + [app]
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/api/products", timeout=5).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"server at {url} did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", default="8,32,128", help="comma separated client counts")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--mix", default=loadtest.DEFAULT_MIX)
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--sync-app", default="main:app")
+    parser.add_argument("--gevent-app", default="gevent_app:app")
+    parser.add_argument("--out", help="write JSON results here")
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = []
+    for mode, app in (("sync", args.sync_app), ("gevent", args.gevent_app)):
+        server = subprocess.Popen(
+            server_command(mode, app, f"127.0.0.1:{args.port}", args.workers),
+            cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_ready(url)
+            for concurrency in levels:
+                run_args = SimpleNamespace(
+                    url=url, concurrency=concurrency, duration=args.duration, warmup=args.warmup,
+                    mix=args.mix, coupon=loadtest.LOADTEST_COUPON, seed=1
+                )
+                result = loadtest.run(run_args)
+                errors = sum(s["errors"] for s in result["scenarios"].values())
+                results.append({"mode": mode, "concurrency": concurrency, "errors": errors, **result["total"]})
+                r = results[-1]
+                print(f"{mode:<7} c={concurrency:<4} {r['rps']:>9} req/s  p50 {r['p50_ms']} ms  "
+                      f"p95 {r['p95_ms']} ms  p99 {r['p99_ms']} ms  errors {errors}")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"commit": loadtest._git_commit(), "workers": args.workers, "runs": results}, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
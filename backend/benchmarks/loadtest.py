@@ -0,0 +1,273 @@
+"""
+Closed-loop load test of the public catalog and checkout paths:
+GET /api/products, GET /api/orders/apply-coupon, POST /api/orders/quick-checkout
+and POST /api/enquiry.
+
+Run the API against local emulators/fakes, e.g.
+    gcloud emulators firestore start --host-port=localhost:8080
+    docker run -d -p 4443:4443 fsouza/fake-gcs-server -scheme http
+    python -m aiosmtpd -n -l localhost:1025
+
+    export FIRESTORE_EMULATOR_HOST=localhost:8080 STORAGE_EMULATOR_HOST=http://localhost:4443
+    ORDER_STORE=sqlite SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=false GMAIL_EMAIL= \\
+    COUPON_RATE_PER_MINUTE=1000000 COUPON_RATE_BURST=1000000 \\
+        gunicorn -w 2 -b :5000 main:app
+
+then seed the emulator once and drive it:
+    python benchmarks/loadtest.py --seed-products 300
+    python benchmarks/loadtest.py --url http://localhost:5000 --concurrency 32 --duration 60 --out results.json
+    python benchmarks/loadtest.py ... --compare baseline.json
+
+Results are JSON (per-scenario throughput, p50/p95/p99 and status counts plus
+the git commit) so runs can be diffed between commits.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MIX = "products=60,coupon=15,checkout=20,enquiry=5"
+LOADTEST_COUPON = "LOADTEST10"
+
+
+def seed(products):
+    """Write products and a test voucher straight into the (emulated) Firestore"""
+    from clients import get_db
+
+    db = get_db()
+    batch = db.batch()
+    for i in range(products):
+        batch.set(db.collection("products").document(f"loadtest-{i:04d}"), {
+            "name": f"Loadtest product {i}",
+            "category": f"Category {i % 12}",
+            "mrp": 100 + i * 7,
+            "price": round((100 + i * 7) * 0.2, 2),
+            "is_active": True,
+            "sequence_number": 100000 + i,
+        })
+        if (i + 1) % 400 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.set(db.collection("voucher").document(LOADTEST_COUPON), {
+        "code": LOADTEST_COUPON, "discount_type": "percentage", "discount_value": 10,
+    })
+    batch.commit()
+    print(f"seeded {products} products and voucher {LOADTEST_COUPON}")
+
+
+class VirtualUser:
+    """One browser-like client: keeps its session, catalog ETag and product list"""
+
+    def __init__(self, url, rng, catalog, coupon):
+        self.url = url.rstrip("/")
+        self.rng = rng
+        self.catalog = catalog
+        self.coupon = coupon
+        self.session = requests.Session()
+        self.etag = None
+
+    def products(self):
+        headers = {}
+        # Returning visitors revalidate; first visits download the catalog
+        if self.etag and self.rng.random() < 0.5:
+            headers["If-None-Match"] = self.etag
+        r = self.session.get(f"{self.url}/api/products", headers=headers, timeout=30)
+        self.etag = r.headers.get("ETag", self.etag)
+        return r
+
+    def coupon_check(self):
+        code = self.coupon if self.rng.random() < 0.7 else f"BOGUS{self.rng.randint(0, 999)}"
+        return self.session.get(f"{self.url}/api/orders/apply-coupon", params={"code": code}, timeout=30)
+
+    def checkout(self):
+        picks = self.rng.sample(self.catalog, min(len(self.catalog), self.rng.randint(1, 8)))
+        body = {
+            "customer_name": "Load Test",
+            "customer_phone": "9000000000",
+            "customer_email": "loadtest@example.com",
+            "customer_address": "1 Test Street",
+            "items": [{"id": pid, "quantity": self.rng.randint(1, 10)} for pid in picks],
+        }
+        if self.coupon and self.rng.random() < 0.3:
+            body["coupon_code"] = self.coupon
+        return self.session.post(f"{self.url}/api/orders/quick-checkout", json=body, timeout=60)
+
+    def enquiry(self):
+        return self.session.post(f"{self.url}/api/enquiry", json={
+            "name": "Load Test",
+            "phone": "9000000000",
+            "message": "Bulk order enquiry",
+        }, timeout=60)
+
+
+SCENARIOS = {
+    "products": VirtualUser.products,
+    "coupon": VirtualUser.coupon_check,
+    "checkout": VirtualUser.checkout,
+    "enquiry": VirtualUser.enquiry,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    catalog = [p["id"] for p in requests.get(f"{args.url.rstrip('/')}/api/products", timeout=30).json()]
+    if not catalog and "checkout" in mix:
+        raise SystemExit("no active products; seed some with --seed-products")
+
+    samples = defaultdict(list)    # scenario -> [latency seconds]
+    statuses = defaultdict(Counter)
+    lock = threading.Lock()
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    deadline = measure_from + args.duration
+
+    def user(i):
+        rng = random.Random(args.seed * 100003 + i)
+        vu = VirtualUser(args.url, rng, catalog, args.coupon)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status = str(SCENARIOS[name](vu).status_code)
+            except requests.RequestException as e:
+                status = type(e).__name__
+            t1 = time.perf_counter()
+            if t0 >= measure_from:
+                with lock:
+                    samples[name].append(t1 - t0)
+                    statuses[name][status] += 1
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(user, range(args.concurrency)))
+
+    scenarios = {}
+    for name in names:
+        lat = sorted(samples[name])
+        # 4xx are expected (bogus coupon codes, rate limiting) and show up under
+        # "status"; errors are server failures and transport exceptions
+        errors = sum(n for s, n in statuses[name].items() if not s.isdigit() or s.startswith("5"))
+        scenarios[name] = {
+            "requests": len(lat),
+            "errors": errors,
+            "rps": round(len(lat) / args.duration, 2),
+            "p50_ms": _ms(percentile(lat, 50)),
+            "p95_ms": _ms(percentile(lat, 95)),
+            "p99_ms": _ms(percentile(lat, 99)),
+            "max_ms": _ms(lat[-1] if lat else None),
+            "status": dict(statuses[name]),
+        }
+    all_lat = sorted(x for name in names for x in samples[name])
+    return {
+        "commit": _git_commit(),
+        "started_at": started_at,
+        "config": {k: getattr(args, k) for k in ("url", "concurrency", "duration", "warmup", "mix", "seed")},
+        "total": {
+            "requests": len(all_lat),
+            "rps": round(len(all_lat) / args.duration, 2),
+            "p50_ms": _ms(percentile(all_lat, 50)),
+            "p95_ms": _ms(percentile(all_lat, 95)),
+            "p99_ms": _ms(percentile(all_lat, 99)),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(result, baseline=None):
+    cols = ("requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    print(f"{'scenario':<10}" + "".join(f"{c:>12}" for c in cols))
+    rows = dict(result["scenarios"], total=result["total"])
+    for name, row in rows.items():
+        print(f"{name:<10}" + "".join(f"{_fmt(row.get(c)):>12}" for c in cols))
+        if baseline:
+            base = dict(baseline["scenarios"], total=baseline["total"]).get(name)
+            if base:
+                print(f"{'  vs base':<10}" + "".join(f"{_delta(row.get(c), base.get(c)):>12}" for c in cols))
+    if baseline:
+        print(f"baseline: commit {baseline.get('commit')} at {baseline.get('started_at')}")
+
+
+def _fmt(value):
+    return "-" if value is None else str(value)
+
+
+def _delta(new, old):
+    if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or not old:
+        return ""
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,...")
+    parser.add_argument("--coupon", default=LOADTEST_COUPON)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write JSON results here")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--seed-products", type=int, metavar="N",
+                        help="seed N products and the test voucher into Firestore, then exit")
+    args = parser.parse_args()
+
+    if args.seed_products:
+        seed(args.seed_products)
+        return
+
+    result = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(result, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
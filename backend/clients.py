@@ -0,0 +1,64 @@
+"""
+Lazily constructed Google Cloud clients, shared by the whole process.
+Nothing here touches the network until a client is first requested.
+"""
+import functools
+
+from config import (
+    ORDERS_BUCKET, PRODUCTS_BUCKET, ORDER_STORE, ORDER_STORE_PATH, ORDER_PDF_DIR, ORDER_ARCHIVE_DIR,
+    JOB_QUEUE, JOB_QUEUE_PATH, ENQUIRY_LOG, ENQUIRY_LOG_PATH, ENQUIRY_FLUSH_SECONDS, ENQUIRY_DIGEST_SECONDS
+)
+from utils.startup import timed
+
+
+@functools.lru_cache(maxsize=None)
+def get_db():
+    """The single Firestore client used by the app and authz"""
+    from google.cloud import firestore
+    with timed("client.firestore"):
+        return firestore.Client()
+
+
+@functools.lru_cache(maxsize=None)
+def get_storage_client():
+    from google.cloud import storage
+    from utils.blob_fetch import share_http_pool
+    with timed("client.storage"):
+        return share_http_pool(storage.Client())
+
+
+@functools.lru_cache(maxsize=None)
+def get_orders_bucket():
+    return get_storage_client().bucket(ORDERS_BUCKET)
+
+
+@functools.lru_cache(maxsize=None)
+def get_products_bucket():
+    return get_storage_client().bucket(PRODUCTS_BUCKET)
+
+
+@functools.lru_cache(maxsize=None)
+def get_order_store():
+    """Order storage backend selected by ORDER_STORE (gcs or sqlite)"""
+    from utils.order_store import GCSOrderStore, SQLiteOrderStore
+    if ORDER_STORE == "sqlite":
+        return SQLiteOrderStore(ORDER_STORE_PATH, ORDER_PDF_DIR, ORDER_ARCHIVE_DIR)
+    return GCSOrderStore(get_orders_bucket)
+
+
+@functools.lru_cache(maxsize=None)
+def get_job_queue():
+    """Job queue backend selected by JOB_QUEUE (firestore or sqlite)"""
+    from utils.job_queue import FirestoreJobQueue, SQLiteJobQueue
+    if JOB_QUEUE == "sqlite":
+        return SQLiteJobQueue(JOB_QUEUE_PATH)
+    return FirestoreJobQueue(get_db)
+
+
+@functools.lru_cache(maxsize=None)
+def get_enquiry_log():
+    """Pending-enquiry backend selected by ENQUIRY_LOG (firestore or sqlite)"""
+    from utils.enquiry_log import FirestoreEnquiryLog, SQLiteEnquiryLog
+    if ENQUIRY_LOG == "sqlite":
+        return SQLiteEnquiryLog(ENQUIRY_LOG_PATH, ENQUIRY_FLUSH_SECONDS, ENQUIRY_DIGEST_SECONDS)
+    return FirestoreEnquiryLog(get_db, ENQUIRY_FLUSH_SECONDS, ENQUIRY_DIGEST_SECONDS)
@@ -15,3 +15,34 @@ GMAIL_EMAIL = os.getenv("GMAIL_EMAIL", '')
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD", '')
 GUPSHUP_API_KEY = os.getenv("GUPSHUP_API_KEY", '')
 GUPSHUP_SOURCE_NUMBER = os.getenv("GUPSHUP_SOURCE_NUMBER", '')
+JOB_QUEUE = os.getenv("JOB_QUEUE", "firestore")  # firestore | sqlite (dev and tests only)
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "/tmp/ambu-jobs.sqlite3")
+JOB_CRON_SECONDS = float(os.getenv("JOB_CRON_SECONDS", "50"))  # work per cron call to /api/internal/jobs/run
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("true", "1", "yes")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "20"))
+SMTP_RATE_PER_MINUTE = float(os.getenv("SMTP_RATE_PER_MINUTE", "60"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "2048"))
+ROLE_CACHE_TTL = float(os.getenv("ROLE_CACHE_TTL", "60"))
+SERVICE_ACCOUNT_SECRET = os.getenv("SERVICE_ACCOUNT_SECRET", "projects/keen-snow-470010-a7/secrets/service-key/versions/1")
+SERVICE_ACCOUNT_CACHE_PATH = os.getenv("SERVICE_ACCOUNT_CACHE_PATH", "/tmp/ambu-service-account.json")
+VOUCHER_CACHE_TTL = float(os.getenv("VOUCHER_CACHE_TTL", "300"))
+COUPON_RATE_PER_MINUTE = float(os.getenv("COUPON_RATE_PER_MINUTE", "30"))
+COUPON_RATE_BURST = int(os.getenv("COUPON_RATE_BURST", "20"))
+ORDER_STORE = os.getenv("ORDER_STORE", "gcs")  # gcs | sqlite
+ORDER_STORE_PATH = os.getenv("ORDER_STORE_PATH", "/tmp/ambu-orders.sqlite3")
+ORDER_PDF_DIR = os.getenv("ORDER_PDF_DIR", "/tmp/ambu-order-pdfs")
+ORDER_ARCHIVE_DIR = os.getenv("ORDER_ARCHIVE_DIR", "/tmp/ambu-order-archive")  # sqlite store only
+ORDER_ARCHIVE_DAYS = int(os.getenv("ORDER_ARCHIVE_DAYS", "120"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", '')
+IDEMPOTENCY_PATH = os.getenv("IDEMPOTENCY_PATH", "/tmp/ambu-idempotency.sqlite3")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))  # client-supplied keys
+IDEMPOTENCY_CART_TTL = float(os.getenv("IDEMPOTENCY_CART_TTL", "120"))  # cart-hash keys
+ENQUIRY_LOG = os.getenv("ENQUIRY_LOG", "firestore")  # firestore | sqlite (dev and tests only)
+ENQUIRY_LOG_PATH = os.getenv("ENQUIRY_LOG_PATH", "/tmp/ambu-enquiries.sqlite3")
+ENQUIRY_FLUSH_SECONDS = float(os.getenv("ENQUIRY_FLUSH_SECONDS", "60"))
+ENQUIRY_DIGEST_SECONDS = float(os.getenv("ENQUIRY_DIGEST_SECONDS", "3600"))  # 0 = one email per enquiry
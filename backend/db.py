@@ -1,3 +0,0 @@
-from google.cloud import firestore
-
-db = firestore.Client()
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""
+Gevent entry point. Request time is mostly spent waiting on Firestore, GCS
+and SMTP, so cooperative workers serve many requests per process:
+
+    gunicorn -c gunicorn_gevent.py -b :$PORT gevent_app:app
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+# Firestore and Secret Manager use gRPC, which needs its own gevent hookup
+# before any channel is created
+import grpc.experimental.gevent as grpc_gevent  # noqa: E402
+
+grpc_gevent.init_gevent()
+
+# Job handlers block on sqlite and CPU-bound rendering; keep them off the hub
+from utils import job_queue  # noqa: E402
+
+job_queue.use_native_threads()
+
+from main import app  # noqa: E402,F401
@@ -0,0 +1,8 @@
+# gunicorn settings for the gevent serving mode (see gevent_app.py)
+import os
+
+worker_class = "gevent"
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+# Concurrent requests per worker; each one mostly waits on network I/O
+worker_connections = int(os.getenv("GEVENT_WORKER_CONNECTIONS", "200"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
@@ -0,0 +1,42 @@
+"""
+Bulk import products from a CSV or JSON file.
+
+    python import_products.py products.csv [--mode upsert] [--dry-run]
+
+CSV columns (header row): name, category, mrp, price, image_url, description,
+is_active, sequence_number. JSON: a list of objects with the same keys.
+"""
+import argparse
+import json
+
+from utils.product_import import parse_rows, import_products, MODES
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--mode", choices=MODES, default="create")
+    parser.add_argument("--format", choices=["csv", "json"])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--report", help="write the full per-row report as JSON here")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "json")
+    with open(args.path, "rb") as f:
+        rows = parse_rows(f.read(), fmt)
+    result = import_products(rows, mode=args.mode, dry_run=args.dry_run)
+
+    for entry in result["rows"]:
+        if entry["status"] in ("error", "skipped") or entry.get("note"):
+            print(f"row {entry['row']} {entry['name']!r}: {entry['status']} {entry.get('error') or entry.get('note')}")
+    print(
+        f"{'Dry run: ' if args.dry_run else ''}{result['created']} created, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {result['skipped']} skipped, {result['errors']} errors"
+    )
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
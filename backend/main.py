@@ -1,23 +1,48 @@
-from flask import Flask, request, jsonify
+from utils import startup  # first import, so the startup clock covers the rest
+import time
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from google.cloud import firestore, storage
+from google.cloud import firestore
 from datetime import datetime
-import uuid, json
-from authz import require_admin, get_user_from_request
-from utils.pdf_utils import render_order_pdf
-from utils.email_utils import send_order_pdf_to_admin, send_enquiry_pdf_to_admin
-from config import ORDERS_BUCKET, PRODUCTS_BUCKET, PRICE_LIST_BLOB, FRONTEND_ORIGIN, GUPSHUP_API_KEY
+import uuid
+import multiprocessing
+from authz import require_admin, get_user_from_request, cache_stats
+from utils.email_utils import send_enquiry_digest, get_transport
+from config import (
+    PRICE_LIST_BLOB, FRONTEND_ORIGIN, GUPSHUP_API_KEY, JOB_CRON_SECONDS, CATALOG_CACHE_TTL,
+    COUPON_RATE_PER_MINUTE, COUPON_RATE_BURST, SLOW_REQUEST_MS, METRICS_TOKEN,
+    IDEMPOTENCY_PATH, IDEMPOTENCY_TTL, IDEMPOTENCY_CART_TTL, ORDER_ARCHIVE_DAYS
+)
 from marshmallow import ValidationError
 from schema import VoucherCreateSchema, VoucherListSchema
 
-from db import db
-
-from utils.order_utils import validate_coupon
+from clients import get_db, get_orders_bucket, get_products_bucket, get_order_store, get_job_queue, get_enquiry_log
+
+from utils.order_utils import validate_coupon, voucher_table
+from utils.rate_limit import KeyedRateLimiter
+from utils.order_records import check_filters, STATUSES, StatusConflict, MAX_BULK_STATUS, CHECKOUT_FIELDS
+from utils import order_pipeline
+from utils.job_queue import run_blocking
+from utils.catalog_cache import CatalogCache
+from utils import product_order
+from utils import product_import
+from utils import product_images
+from utils import idempotency
+from utils import enquiry_log
+from utils import analytics
+from utils import order_archive
+from utils.product_search import ProductSearch
+from utils import invoice_export
+from utils import pricing
+from utils import order_export
+from utils import metrics
+from utils.pdf_utils import pdf_cache
 # from utils.whatsapputils import send_order_confirmation, send_order_shipped
 
 
 app = Flask(__name__)
 CORS(app, origins=[FRONTEND_ORIGIN, "http://localhost:5173"], supports_credentials=True)
+metrics.init_app(app, slow_ms=SLOW_REQUEST_MS)
 
 # --- Common error handler ---
 def api_error_response(error, status=500):
@@ -27,34 +52,99 @@ def api_error_response(error, status=500):
     }), status
 
 
-storage_client = storage.Client()
-orders_bucket = storage_client.bucket(ORDERS_BUCKET)
-products_bucket = storage_client.bucket(PRODUCTS_BUCKET)
+def client_key():
+    """
+    Client identity for rate limits. App Engine sets X-Appengine-User-IP and
+    strips any client-sent copy; X-Forwarded-For is not used because its
+    first hop is whatever the client wrote there.
+    """
+    return request.headers.get("X-Appengine-User-IP") or request.remote_addr or "unknown"
+
+
+job_queue = get_job_queue()
+order_pipeline.register(job_queue, get_order_store)
+analytics.register(job_queue, get_order_store)
+order_archive.register(job_queue, get_order_store)
+enquiries = get_enquiry_log()
+enquiry_log.register(job_queue, enquiries, get_orders_bucket, send_enquiry_digest)
+# Spawned helper processes (invoice rendering) re-import this module; only
+# the serving process runs jobs
+if multiprocessing.parent_process() is None:
+    job_queue.start_worker()
+
+idempotency_store = idempotency.IdempotencyStore(IDEMPOTENCY_PATH)
+
+coupon_limiter = KeyedRateLimiter(COUPON_RATE_PER_MINUTE, COUPON_RATE_BURST)
 
 voucher_create_schema = VoucherCreateSchema()
 voucher_list_schema = VoucherListSchema(many=True)
-voucher_collection = db.collection("voucher")
+
+
+def voucher_collection():
+    return get_db().collection("voucher")
+
+@metrics.timed("firestore")
+def load_active_products():
+    docs = get_db().collection("products").where("is_active","==",True) \
+        .order_by("sequence_number", direction=firestore.Query.ASCENDING).stream()
+    out = []
+    for d in docs:
+        x = d.to_dict(); x["id"] = d.id; out.append(x)
+    return out
+
+
+catalog_cache = CatalogCache(load_active_products, ttl=CATALOG_CACHE_TTL)
+product_search = ProductSearch(catalog_cache)
+product_images.register(
+    job_queue, get_products_bucket, product_order.products_collection, on_change=catalog_cache.invalidate
+)
 
 # -------- Public --------
 @app.get("/api/products")
 def list_products():
     try:
-        cat = request.args.get('category')
-        q = db.collection("products").where("is_active","==",True)
-        if cat: q = q.where("category","==",cat)
-        docs = q.order_by("sequence_number", direction=firestore.Query.ASCENDING).stream()
-        out = []
-        for d in docs:
-            x = d.to_dict(); x["id"] = d.id; out.append(x)
-        return jsonify(out)
+        cached = catalog_cache.get(request.args.get('category') or None)
+        if request.if_none_match.contains(cached.etag):
+            resp = app.response_class(status=304)
+        else:
+            resp = app.response_class(cached.body, mimetype="application/json")
+        resp.set_etag(cached.etag)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
     except Exception as e:
         return api_error_response(e)
 
 
+@app.get("/api/products/search")
+def search_products():
+    """
+    Search active products by name, category and description, with category
+    and price facets. Query params: q, category, min_price, max_price,
+    sort (relevance|price_asc|price_desc), limit (max 200), offset
+    """
+    try:
+        args = request.args
+        try:
+            min_price = float(args["min_price"]) if args.get("min_price") else None
+            max_price = float(args["max_price"]) if args.get("max_price") else None
+            return jsonify(product_search.search(
+                q=args.get("q", ""),
+                category=args.get("category") or None,
+                min_price=min_price,
+                max_price=max_price,
+                sort=args.get("sort", "relevance"),
+                limit=int(args.get("limit", 24)),
+                offset=int(args.get("offset", 0)),
+            ))
+        except ValueError as err:
+            return jsonify({"error": str(err)}), 400
+    except Exception as e:
+        return api_error_response(e)
+
 @app.get("/api/price-list-url")
 def price_list_url():
     try:
-        blob = products_bucket.blob(PRICE_LIST_BLOB)
+        blob = get_products_bucket().blob(PRICE_LIST_BLOB)
         url = blob.generate_signed_url(version='v4', expiration=3600, method='GET')
         return jsonify({"url": url})
     except Exception as e:
@@ -69,6 +159,9 @@ def apply_coupon():
         if not coupon_code:
             return jsonify({"error": "Coupon code is required"}), 400
 
+        if not coupon_limiter.allow(client_key()):
+            return jsonify({"error": "Too many coupon attempts, please wait a minute"}), 429
+
         result = validate_coupon(coupon_code)
         if not result.get("valid"):
             return jsonify({"error": result.get("error", "Invalid coupon code")}), 400
@@ -79,51 +172,66 @@ def apply_coupon():
         return api_error_response(e)
 
 
+def checkout_key():
+    """
+    Idempotency key for a checkout: the client's Idempotency-Key header, or
+    else a short-lived hash of the cart and customer so double submits of
+    the same order collapse into one
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    key = idempotency.header_key()
+    if key:
+        return f"checkout:{key}", idempotency.fingerprint(data), IDEMPOTENCY_TTL
+    items = data.get("items")
+    if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+        return None
+    cart = {
+        "items": sorted((str(i.get("id")), str(i.get("quantity", 1))) for i in items),
+        "coupon": (data.get("coupon_code") or "").strip().upper(),
+        "customer": [
+            str(data.get(f) or "").strip().lower()
+            for f in ("customer_name", "customer_phone", "customer_email", "customer_address")
+        ],
+    }
+    cart_hash = idempotency.fingerprint(cart)
+    return f"checkout-cart:{cart_hash}", cart_hash, IDEMPOTENCY_CART_TTL
+
+
 @app.post("/api/orders/quick-checkout")
+@idempotency.idempotent(idempotency_store, checkout_key)
 def quick_checkout():
+    """Store the order and hand PDF/email work to the background pipeline"""
     try:
-        data = request.json or {}
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
+        # Anything else the client sends (emailed_admin, order_pdf, ...) would
+        # otherwise be stored and trusted by the pipeline
+        data = {k: body[k] for k in CHECKOUT_FIELDS if k in body}
         order_id = str(uuid.uuid4())
         data['order_id'] = order_id
         data['created_at'] = datetime.utcnow().isoformat()
         data['status'] = "NOT_ENQUIRED"  # default new orders
         data['order_pdf'] = None
+        data['pipeline_status'] = order_pipeline.QUEUED
 
-        # Save order JSON first
-        orders_bucket.blob(f"orders/{order_id}.json").upload_from_string(
-            json.dumps(data),
-            content_type='application/json'
-        )
-
-        # Generate PDF
-        pdf = render_order_pdf(data)
-
-        # Upload PDF to bucket
-        pdf_blob = orders_bucket.blob(f"pdf/{order_id}.pdf")
-        pdf_blob.upload_from_string(pdf, content_type="application/pdf")
+        # Price from the catalog; client-sent prices and totals are ignored
+        coupon_code = str(body.get("coupon_code") or "").strip() or None
+        voucher = voucher_table.get(coupon_code) if coupon_code else None
+        if coupon_code and not voucher:
+            return jsonify({"error": "Invalid coupon code"}), 400
+        try:
+            data.update(pricing.price_order(body.get("items"), catalog_cache.by_id(), voucher, coupon_code))
+        except pricing.PricingError as err:
+            return jsonify({"error": str(err)}), 400
 
-        pdf_url = pdf_blob.public_url
-        data["order_pdf"] = pdf_url
+        get_order_store().put(data)
 
-        # Save updated JSON with PDF URL
-        orders_bucket.blob(f"orders/{order_id}.json").upload_from_string(
-            json.dumps(data),
-            content_type='application/json'
-        )
-
-        # Send email to admin and customer
-        emailed_admin = send_order_pdf_to_admin(
-            order=data,
-            pdf_bytes=pdf
-        )
-        emailed_customer = False
-        if data.get("customer_email"):
-            emailed_customer = send_order_pdf_to_admin(
-                recipient=data["customer_email"],
-                order=data,
-                pdf_bytes=pdf,
-                is_customer=True
-            )
+        # PDF rendering, upload, emails and analytics run on the job queue
+        order_pipeline.enqueue(job_queue, order_id)
+        analytics.enqueue(job_queue, order_id)
 
         # Send WhatsApp message (optional)
         # if data.get("customer_phone") and GUPSHUP_API_KEY:
@@ -134,25 +242,64 @@ def quick_checkout():
 
         return jsonify({
             "order_id": order_id,
-            "emailed_admin": emailed_admin,
-            "emailed_customer": emailed_customer,
-            # "whatsapp_sent": whatsapp_sent,
-            "order_pdf": pdf_url
+            "total": data["total"],
+            "pipeline_status": order_pipeline.QUEUED,
+            "status_url": f"/api/orders/{order_id}/pipeline-status"
+        }), 202
+    except Exception as e:
+        return api_error_response(e)
+
+
+@app.get("/api/orders/<order_id>/pipeline-status")
+def order_pipeline_status(order_id):
+    """Poll the invoice/email pipeline for an order"""
+    try:
+        order = get_order_store().get(order_id)
+        if order is None:
+            return jsonify({"error": "Order not found"}), 404
+        job = job_queue.get(order_pipeline.JOB_KIND, order_id)
+        if job:
+            # Exception text stays server-side; this route is public
+            job.pop("last_error", None)
+        return jsonify({
+            "order_id": order_id,
+            "pipeline_status": order.get("pipeline_status", order_pipeline.DONE),
+            "order_pdf": order.get("order_pdf"),
+            "emailed_admin": order.get("emailed_admin", False),
+            "emailed_customer": order.get("emailed_customer", False),
+            "job": job,
         })
     except Exception as e:
         return api_error_response(e)
 
 
 
+@app.get("/api/internal/jobs/run")
+def run_jobs():
+    """
+    Run ready jobs for up to JOB_CRON_SECONDS. App Engine cron (cron.yaml)
+    calls this so queued work keeps moving when no instance is serving traffic.
+    """
+    # App Engine strips X-Appengine-Cron from outside requests
+    if request.headers.get("X-Appengine-Cron") != "true":
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        ran = run_blocking(job_queue.run_pending, deadline=time.monotonic() + JOB_CRON_SECONDS)
+        return jsonify({"ran": ran})
+    except Exception as e:
+        return api_error_response(e)
+
+
 @app.post("/api/enquiry")
 def enquiry():
     try:
         payload = request.json or {}
         payload['id'] = str(uuid.uuid4())
         payload['created_at'] = datetime.utcnow().isoformat()
-        orders_bucket.blob(f"enquiries/{payload['id']}.json").upload_from_string(json.dumps(payload), content_type='application/json')
-        emailed = send_enquiry_pdf_to_admin(payload)
-        return jsonify({"ok": True, "email": emailed})
+        # Persisted before we answer; compacted into bucket segments and mailed in digests by jobs
+        enquiries.append(payload)
+        enquiries.schedule(job_queue, payload['id'])
+        return jsonify({"ok": True, "id": payload['id']})
     except Exception as e:
         return api_error_response(e)
 
@@ -166,54 +313,188 @@ def me():
         return api_error_response(e)
 
 # -------- Admin --------
+@app.get("/api/admin/mail/stats")
+@require_admin
+def mail_stats():
+    """Sent/failed/retried/reconnect/cancelled counters of this instance's SMTP transport"""
+    try:
+        return jsonify(get_transport().stats())
+    except Exception as e:
+        return api_error_response(e)
+
+@app.get("/api/admin/enquiries")
+@require_admin
+def list_enquiries():
+    """Newest-first page of enquiries from the bucket segments"""
+    try:
+        limit = int(request.args.get("limit", 50))
+        days = min(int(request.args.get("days", 30)), 366)
+        cursor = request.args.get("cursor") or None
+        items, next_cursor = enquiry_log.read_page(get_orders_bucket(), limit, cursor, days)
+        body = {"enquiries": items, "next_cursor": next_cursor}
+        if cursor is None:
+            # Persisted but not in a segment yet
+            body["buffered"] = enquiries.buffered()
+        return jsonify(body)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid paging parameters: {e}"}), 400
+    except Exception as e:
+        return api_error_response(e)
+
+@app.post("/api/admin/enquiries/flush")
+@require_admin
+def flush_enquiries():
+    """Flush pending enquiries into segments now; ?digest=true also mails pending ones"""
+    try:
+        body = {"flushed": enquiries.flush(get_orders_bucket())}
+        if request.args.get("digest", "").lower() in ("true", "1", "yes"):
+            body["digested"] = enquiries.send_digests(send_enquiry_digest)
+        body.update(enquiries.stats())
+        return jsonify(body)
+    except Exception as e:
+        return api_error_response(e)
+
+@app.get("/api/admin/startup")
+@require_admin
+def startup_report():
+    """Import time of this worker and how long each lazy client took to build"""
+    try:
+        return jsonify(startup.report())
+    except Exception as e:
+        return api_error_response(e)
+
+@app.get("/api/admin/auth/cache-stats")
+@require_admin
+def auth_cache_stats():
+    """Hit rates of the ID-token and role caches on this instance"""
+    try:
+        return jsonify(cache_stats())
+    except Exception as e:
+        return api_error_response(e)
+
 @app.post("/api/admin/upload-url")
 @require_admin
 def upload_image():
     """
-    Uploads image directly to GCS and returns public URL
+    JSON {"filename", "content_type", "size"}: returns a V4 signed PUT URL so the
+    browser uploads straight to the bucket ({"upload_url", "headers",
+    "public_url", ...}). A multipart `file` is still accepted and proxied.
+    Resized variants are generated once the URL is saved on a product.
     """
     try:
         file = request.files.get("file")
-        if not file or not file.filename:
+        if file is None:
+            body = request.get_json(silent=True) or {}
+            try:
+                return jsonify(product_images.signed_upload(
+                    get_products_bucket(), body.get("filename"), body.get("content_type"), body.get("size")
+                ))
+            except (TypeError, ValueError) as err:
+                return jsonify({"error": str(err)}), 400
+        if not file.filename:
             return jsonify({"error": "No file provided"}), 400
+        if (request.content_length or 0) > product_images.MAX_UPLOAD_BYTES:
+            return jsonify({"error": "Image is too large"}), 413
+        try:
+            product_images.check_image(file.stream)
+        except ValueError as err:
+            return jsonify({"error": str(err)}), 400
 
         # Create unique path
         path = f"products/{uuid.uuid4()}-{file.filename}"
-        blob = products_bucket.blob(path)
+        blob = get_products_bucket().blob(path)
 
         # Upload file
-        blob.upload_from_file(file, content_type=file.content_type)
+        with metrics.span("gcs"):
+            blob.upload_from_file(file, content_type=file.content_type)
 
         return jsonify({"public_url": blob.public_url})
     except Exception as e:
         return api_error_response(e)
 
+
+@app.post("/api/admin/products/<pid>/image/variants")
+@require_admin
+def regenerate_image_variants(pid):
+    """Queue (re)rendering of a product's image variants"""
+    try:
+        snap = get_db().collection("products").document(pid).get()
+        if not snap.exists:
+            return jsonify({"error": "Product not found"}), 404
+        image_url = snap.to_dict().get("image_url")
+        if not image_url:
+            return jsonify({"error": "Product has no image"}), 400
+        product_images.enqueue(job_queue, pid, image_url, force=True)
+        return jsonify({"queued": True, "id": pid}), 202
+    except Exception as e:
+        return api_error_response(e)
+
 @app.patch("/api/admin/orders/<order_id>/status")
-# @require_admin
+@require_admin
 def update_order_status(order_id):
-    """Update only the status field of an order"""
+    """
+    Update only the status field of an order.
+    Body: {"status": ..., "from": optional status the order must still be in}
+    """
     try:
         data = request.json or {}
         new_status = data.get("status")
-
-        allowed_status = ["NOT_ENQUIRED", "IN_PROGRESS", "DELIVERED", "ABORTED"]
-        if new_status not in allowed_status:
-            return jsonify({"error": f"Invalid status. Allowed: {allowed_status}"}), 400
-
-        blob = orders_bucket.blob(f"orders/{order_id}.json")
-        if not blob.exists():
+        if new_status not in STATUSES:
+            return jsonify({"error": f"Invalid status. Allowed: {list(STATUSES)}"}), 400
+
+        store = get_order_store()
+        order_data = store.update_status(order_id, new_status, expected=data.get("from"))
+        if order_data is None:
+            if store.is_archived(order_id):
+                return jsonify({"error": "Archived orders are read-only"}), 409
             return jsonify({"error": "Order not found"}), 404
+        analytics.enqueue(job_queue, order_id)
 
-        order_data = json.loads(blob.download_as_string())
-        order_data["status"] = new_status
+        return jsonify({"message": "Status updated", "order": order_data})
+    except StatusConflict as e:
+        return jsonify({"error": str(e), "current_status": e.current}), 409
+    except Exception as e:
+        return api_error_response(e)
 
-        # Save back to GCS
-        blob.upload_from_string(
-            json.dumps(order_data),
-            content_type="application/json"
-        )
 
-        return jsonify({"message": "Status updated", "order": order_data})
+@app.post("/api/admin/orders/status")
+@require_admin
+def bulk_update_order_status():
+    """
+    Move many orders to one status, e.g. mark a day's shipments DELIVERED.
+    Body: {"ids": [...], "status": ..., "from": optional expected current status}
+    Each order is updated independently; the response lists what happened to each.
+    """
+    try:
+        data = request.json or {}
+        ids = data.get("ids") or []
+        new_status = data.get("status")
+        if new_status not in STATUSES:
+            return jsonify({"error": f"Invalid status. Allowed: {list(STATUSES)}"}), 400
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            return jsonify({"error": "ids must be a non-empty list of order ids"}), 400
+        if len(ids) > MAX_BULK_STATUS:
+            return jsonify({"error": f"At most {MAX_BULK_STATUS} orders per request"}), 400
+
+        updated, missing, conflicts, failed = [], [], [], []
+        results = get_order_store().update_statuses(dict.fromkeys(ids), new_status, expected=data.get("from"))
+        for oid, order, error in results:
+            if isinstance(error, StatusConflict):
+                conflicts.append({"order_id": oid, "current_status": error.current})
+            elif error is not None:
+                failed.append({"order_id": oid, "error": str(error)})
+            elif order is None:
+                missing.append(oid)
+            else:
+                updated.append(oid)
+                analytics.enqueue(job_queue, oid)
+        return jsonify({
+            "status": new_status,
+            "updated": updated,
+            "missing": missing,
+            "conflicts": conflicts,
+            "failed": failed,
+        })
     except Exception as e:
         return api_error_response(e)
 
@@ -228,7 +509,7 @@ def create_product():
             return jsonify({"error": "Product name is required"}), 400
 
         # Check duplicate name
-        existing = db.collection("products").where("name", "==", name).limit(1).get()
+        existing = get_db().collection("products").where("name", "==", name).limit(1).get()
         if existing:
             return jsonify({"error": "Product with this name already exists"}), 400
 
@@ -246,75 +527,263 @@ def create_product():
         seq = doc.get("sequence_number")
         if seq is None:
             # default = max + 1
-            last = db.collection("products").order_by("sequence_number", direction=firestore.Query.DESCENDING).limit(1).get()
+            last = get_db().collection("products").order_by("sequence_number", direction=firestore.Query.DESCENDING).limit(1).get()
             doc["sequence_number"] = (last[0].to_dict()["sequence_number"] + 1) if last else 1
+            ref = get_db().collection("products").add(doc)[1]
         else:
-            # shift others if collision
-            shift_products_for_sequence(seq)
-
-        ref = db.collection("products").add(doc)[1]
+            try:
+                doc["sequence_number"] = int(seq)
+            except (TypeError, ValueError):
+                return jsonify({"error": "Invalid sequence_number"}), 400
+            # shift the run of products starting at this slot
+            ref = product_order.insert_product(doc)
+        catalog_cache.invalidate()
+        if doc.get("image_url"):
+            product_images.enqueue(job_queue, ref.id, doc["image_url"])
         snap = ref.get()
         return jsonify({"id": ref.id, **snap.to_dict()}), 201
     except Exception as e:
         return api_error_response(e)
 
-def shift_products_for_sequence(new_seq, exclude_id=None):
-    products = db.collection("products").order_by("sequence_number").stream()
-    updates = []
-    pos = 1
-    for p in products:
-        if p.id == exclude_id:
-            continue
-        pdata = p.to_dict()
-        if pos == new_seq:
-            pos += 1
-        if pdata.get("sequence_number") != pos:
-            updates.append((p.id, pos))
-        pos += 1
+@app.get("/api/admin/orders")
+@require_admin
+def orders():
+    """
+    Page through orders from the order index, or the archive with archived=true.
+    Query params: status, from, to (ISO dates), sort (created_at|total),
+    direction (asc|desc), limit (max 500), cursor
+    """
+    try:
+        try:
+            limit = min(max(int(request.args.get("limit", 50)), 1), 500)
+        except ValueError:
+            return jsonify({"error": "Invalid limit"}), 400
+        store = get_order_store()
+        archived = request.args.get("archived", "").lower() in ("true", "1", "yes")
+        try:
+            orders, next_cursor = (store.query_archived if archived else store.query)(
+                status=request.args.get("status"),
+                date_from=request.args.get("from"),
+                date_to=request.args.get("to"),
+                sort=request.args.get("sort", "created_at"),
+                direction=request.args.get("direction", "desc"),
+                limit=limit,
+                cursor=request.args.get("cursor"),
+            )
+        except ValueError as err:
+            return jsonify({"error": str(err)}), 400
+        return jsonify({"orders": orders, "next_cursor": next_cursor})
+    except Exception as e:
+        return api_error_response(e)
+
+@app.get("/api/admin/orders/<order_id>")
+@require_admin
+def get_order(order_id):
+    """One full order; archived orders are read from their segment"""
+    try:
+        store = get_order_store()
+        order = store.get(order_id)
+        if order is None:
+            return jsonify({"error": "Order not found"}), 404
+        return jsonify({"order": order, "archived": store.is_archived(order_id)})
+    except Exception as e:
+        return api_error_response(e)
+
 
-    batch = db.batch()
-    for pid, seq in updates:
-        batch.update(db.collection("products").document(pid), {"sequence_number": seq})
-    batch.commit()
+@app.post("/api/admin/orders/archive")
+@require_admin
+def archive_orders():
+    """
+    Compact closed (DELIVERED/ABORTED) orders older than older_than_days into
+    archive segments on the job queue. Body: {"older_than_days", "dry_run"}
+    """
+    try:
+        data = request.json or {}
+        try:
+            days = int(data.get("older_than_days", ORDER_ARCHIVE_DAYS))
+        except (TypeError, ValueError):
+            return jsonify({"error": "older_than_days must be an integer"}), 400
+        if days < 1:
+            return jsonify({"error": "older_than_days must be at least 1"}), 400
+        if data.get("dry_run"):
+            return jsonify(order_archive.archive_closed(get_order_store(), days, dry_run=True))
+        job = order_archive.enqueue(job_queue, days)
+        return jsonify({"job": job, "older_than_days": days}), 202
+    except Exception as e:
+        return api_error_response(e)
 
 
+@app.get("/api/admin/orders/archive")
+@require_admin
+def archive_status():
+    """Archive size, and the state of an archive job with ?job=<key>"""
+    try:
+        body = get_order_store().archive.stats()
+        if request.args.get("job"):
+            body["job"] = job_queue.get(order_archive.JOB_KIND, request.args["job"])
+        return jsonify(body)
+    except Exception as e:
+        return api_error_response(e)
 
 
-@app.get("/api/admin/orders")
-# @require_admin
-def orders():
-    """Fetch all orders from GCS"""
-    try:
-        blobs = storage_client.list_blobs(ORDERS_BUCKET, prefix="orders/")
-        orders = []
-        for blob in blobs:
-            if not blob.name.endswith(".json"):
-                continue
-            data = blob.download_as_string()
+@app.get("/api/admin/analytics/summary")
+@require_admin
+def analytics_summary():
+    """Orders, revenue and status counts for ?from=YYYY-MM-DD&to=YYYY-MM-DD, from the rollups"""
+    try:
+        date_from, date_to = analytics.parse_range(request.args.get("from"), request.args.get("to"))
+        return jsonify(analytics.summary(date_from, date_to))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return api_error_response(e)
+
+
+@app.get("/api/admin/analytics/products")
+@require_admin
+def analytics_products():
+    """Best sellers in the range; ?sort=quantity|revenue&limit=20"""
+    try:
+        date_from, date_to = analytics.parse_range(request.args.get("from"), request.args.get("to"))
+        limit = min(int(request.args.get("limit", 20)), 500)
+        products = analytics.top_products(date_from, date_to, request.args.get("sort", "quantity"), limit)
+        catalog = catalog_cache.by_id()
+        for p in products:
+            p["name"] = catalog.get(p["id"], {}).get("name")
+        return jsonify({"from": date_from, "to": date_to, "products": products})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return api_error_response(e)
+
+
+@app.get("/api/admin/analytics/vouchers")
+@require_admin
+def analytics_vouchers():
+    try:
+        date_from, date_to = analytics.parse_range(request.args.get("from"), request.args.get("to"))
+        return jsonify({"from": date_from, "to": date_to, "vouchers": analytics.voucher_usage(date_from, date_to)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return api_error_response(e)
+
+
+@app.post("/api/admin/analytics/verify")
+@require_admin
+def analytics_verify():
+    """Recompute the rollups from every stored order and report differences"""
+    try:
+        return jsonify(analytics.verify(analytics.iter_orders(get_order_store())))
+    except Exception as e:
+        return api_error_response(e)
+
+
+@app.get("/api/admin/orders/export")
+@require_admin
+def export_orders():
+    """
+    Stream orders as NDJSON or CSV.
+    Query params: format (ndjson|csv), fields (comma separated, from
+    order_export.EXPORT_FIELDS), status, from, to.
+    Gzipped on the fly when the client accepts gzip.
+    """
+    try:
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in order_export.FORMATS:
+            return jsonify({"error": f"Invalid format. Allowed: {list(order_export.FORMATS)}"}), 400
+        filters = {
+            "status": request.args.get("status"),
+            "date_from": request.args.get("from"),
+            "date_to": request.args.get("to"),
+        }
+        # Validate filters before the response starts streaming
+        try:
+            fields = order_export.parse_fields(request.args.get("fields"))
+            check_filters(date_from=filters["date_from"], date_to=filters["date_to"])
+        except ValueError as err:
+            return jsonify({"error": str(err)}), 400
+
+        # Quality-aware: "gzip;q=0" refuses gzip
+        compress = request.accept_encodings["gzip"] > 0
+        headers = {"Content-Disposition": f"attachment; filename=orders.{fmt}", "Vary": "Accept-Encoding"}
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+        return Response(
+            stream_with_context(order_export.stream_export(get_order_store(), fmt, fields, compress=compress, **filters)),
+            mimetype=order_export.FORMATS[fmt],
+            headers=headers
+        )
+    except Exception as e:
+        return api_error_response(e)
+
+@app.post("/api/admin/orders/invoices/export")
+@require_admin
+def export_invoices():
+    """
+    Stream invoices for many orders as one ZIP (default) or one merged PDF.
+    Body: {"ids": [...]} or {"status", "from", "to"} filters, plus "format": "zip"|"pdf"
+    """
+    try:
+        body = request.json or {}
+        fmt = body.get("format", "zip")
+        if fmt not in ("zip", "pdf"):
+            return jsonify({"error": "format must be zip or pdf"}), 400
+
+        ids = body.get("ids")
+        if ids is None:
             try:
-                order = json.loads(data)
-                orders.append(order)
-            except json.JSONDecodeError:
-                continue
-        # Sort by created_at descending
-        orders.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        return jsonify(orders)
+                ids = [o["order_id"] for o in get_order_store().iter_summaries(
+                    status=body.get("status"),
+                    date_from=body.get("from"),
+                    date_to=body.get("to"),
+                )]
+            except ValueError as err:
+                return jsonify({"error": str(err)}), 400
+        elif not isinstance(ids, list):
+            return jsonify({"error": "ids must be a list"}), 400
+        if not ids:
+            return jsonify({"error": "No orders match the filter"}), 404
+        if fmt == "pdf" and len(ids) > invoice_export.MAX_MERGED_ORDERS:
+            return jsonify({"error": f"Merged PDF is limited to {invoice_export.MAX_MERGED_ORDERS} orders; use format=zip"}), 400
+
+        invoices = invoice_export.iter_invoices(get_order_store(), ids)
+        if fmt == "zip":
+            body_iter, mimetype, filename = invoice_export.stream_zip(invoices), "application/zip", "invoices.zip"
+        else:
+            body_iter, mimetype, filename = invoice_export.stream_merged_pdf(invoices), "application/pdf", "invoices.pdf"
+        return Response(
+            stream_with_context(body_iter),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    except Exception as e:
+        return api_error_response(e)
+
+@app.get("/api/admin/orders/<order_id>/invoice.pdf")
+@require_admin
+def order_invoice(order_id):
+    """Invoice PDF from the order store (used by the local backend's order_pdf URLs)"""
+    try:
+        pdf = get_order_store().get_pdf(order_id)
+        if pdf is None:
+            return jsonify({"error": "Invoice not found"}), 404
+        return Response(pdf, mimetype="application/pdf")
     except Exception as e:
         return api_error_response(e)
 
 @app.delete("/api/admin/orders/<order_id>")
-# @require_admin
+@require_admin
 def delete_order(order_id):
-    """Delete an order from GCS"""
+    """Delete an order from the order store"""
     try:
-        blob = orders_bucket.blob(f"orders/{order_id}.json")
-        
-        if not blob.exists():
+        store = get_order_store()
+        if not store.delete(order_id):
+            if store.is_archived(order_id):
+                return jsonify({"error": "Archived orders are read-only"}), 409
             return jsonify({"error": "Order not found"}), 404
-        
-        # Delete the blob
-        blob.delete()
-        
+        analytics.enqueue(job_queue, order_id)
+
         return jsonify({"message": "Order deleted successfully", "order_id": order_id}), 200
         
     except Exception as e:
@@ -334,7 +803,7 @@ def update_product(pid):
         # Validate name uniqueness if updated
         if "name" in patch:
             name = patch["name"].strip()
-            existing = db.collection("products").where("name", "==", name).limit(1).get()
+            existing = get_db().collection("products").where("name", "==", name).limit(1).get()
             if existing and existing[0].id != pid:
                 return jsonify({"error": "Another product with this name already exists"}), 400
             patch["name"] = name
@@ -353,18 +822,24 @@ def update_product(pid):
             return jsonify({"error": "Invalid numeric/boolean value"}), 400
 
         # Check if product exists
-        doc_ref = db.collection("products").document(pid)
+        doc_ref = get_db().collection("products").document(pid)
         doc_snap = doc_ref.get()
         if not doc_snap.exists:
             return jsonify({"error": "Product not found"}), 404
 
-        # If sequence_number is updated, shift others
+        writes = dict(patch)
+        if "image_url" in patch and patch["image_url"] != doc_snap.to_dict().get("image_url"):
+            # Variants of the old image must not outlive it
+            writes.update(product_images.stale_variant_fields())
         if "sequence_number" in patch:
-            new_seq = patch["sequence_number"]
-            shift_products_for_sequence(new_seq, exclude_id=pid)
-
-        # Update product
-        doc_ref.update(patch)
+            # Move and update in one transaction, shifting only the affected run
+            fields = {k: v for k, v in writes.items() if k != "sequence_number"}
+            product_order.move_product(pid, patch["sequence_number"], patch=fields)
+        else:
+            doc_ref.update(writes)
+        catalog_cache.invalidate()
+        if patch.get("image_url"):
+            product_images.enqueue(job_queue, pid, patch["image_url"])
         return jsonify({"id": pid, **patch})
     except Exception as e:
         return api_error_response(e)
@@ -372,32 +847,85 @@ def update_product(pid):
 
 
 
-@app.delete("/api/admin/products/<pid>")
+@app.post("/api/admin/products/import")
+@require_admin
+def import_products():
+    """
+    Bulk create/update products from CSV or JSON.
+    Send a multipart `file` (.csv/.json), a text/csv body, or JSON: a list of
+    products or {"products": [...], "mode": ..., "dry_run": ...}.
+    Query params: mode (create|upsert), dry_run, format (csv|json) to override detection.
+    Returns per-row results; rows that fail validation do not stop the rest.
+    """
+    try:
+        options = {}
+        upload = request.files.get("file")
+        if upload is not None:
+            fmt = request.args.get("format") or ("csv" if upload.filename.lower().endswith(".csv") else "json")
+            payload = upload.read()
+        elif request.mimetype == "text/csv":
+            fmt, payload = "csv", request.get_data()
+        else:
+            fmt, payload = "json", request.get_json(silent=True)
+            if isinstance(payload, dict):
+                options = payload
+        try:
+            rows = product_import.parse_rows(payload, fmt)
+        except (ValueError, UnicodeDecodeError) as err:
+            return jsonify({"error": f"Could not read {fmt} input: {err}"}), 400
+        if not rows:
+            return jsonify({"error": "No products to import"}), 400
+        if len(rows) > product_import.MAX_IMPORT_ROWS:
+            return jsonify({"error": f"At most {product_import.MAX_IMPORT_ROWS} rows per import"}), 400
+
+        mode = request.args.get("mode") or options.get("mode") or "create"
+        if mode not in product_import.MODES:
+            return jsonify({"error": f"Invalid mode. Allowed: {list(product_import.MODES)}"}), 400
+        dry_run = str(request.args.get("dry_run", options.get("dry_run", False))).lower() in ("true", "1", "yes")
+
+        result = product_import.import_products(rows, mode=mode, dry_run=dry_run)
+        if result["created"] or result["updated"]:
+            catalog_cache.invalidate()
+        for row, entry in zip(rows, result["rows"]):
+            if entry["status"] in ("created", "updated") and row.get("image_url") and not dry_run:
+                product_images.enqueue(job_queue, entry["id"], row["image_url"])
+        return jsonify(result)
+    except Exception as e:
+        return api_error_response(e)
+
+
+@app.post("/api/admin/products/reorder")
 @require_admin
+def reorder_products():
+    """Reorder the listed products among the slots they already occupy"""
+    try:
+        ids = (request.json or {}).get("ids")
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            return jsonify({"error": "ids must be a non-empty list of product ids"}), 400
+        if len(set(ids)) != len(ids):
+            return jsonify({"error": "ids must be unique"}), 400
+        try:
+            changed = product_order.reorder_products(ids)
+        except KeyError as err:
+            return jsonify({"error": f"Product not found: {err.args[0]}"}), 404
+        catalog_cache.invalidate()
+        return jsonify({"reordered": len(ids), "updated": changed})
+    except Exception as e:
+        return api_error_response(e)
+
+
+@app.delete("/api/admin/products/<pid>")
+@require_admin(fresh=True)
 def delete_product(pid):
     try:
-        doc_ref = db.collection('products').document(pid)
+        doc_ref = get_db().collection('products').document(pid)
         doc_snap = doc_ref.get()
         if not doc_snap.exists:
             return jsonify({"error": "Product not found"}), 404
 
-        # Get the sequence number of the product being deleted
-        seq_to_delete = doc_snap.to_dict().get("sequence_number")
-
-        # Delete the product
+        # The freed sequence_number stays as a gap; later inserts absorb it
         doc_ref.delete()
-
-        # Shift sequence_numbers for products after the deleted one
-        if seq_to_delete is not None:
-            products = db.collection("products").order_by("sequence_number").stream()
-            batch = db.batch()
-            for p in products:
-                pdata = p.to_dict()
-                if pdata.get("sequence_number", 0) > seq_to_delete:
-                    batch.update(db.collection("products").document(p.id), {
-                        "sequence_number": pdata.get("sequence_number") - 1
-                    })
-            batch.commit()
+        catalog_cache.invalidate()
 
         return jsonify({"deleted": True, "id": pid})
     except Exception as e:
@@ -412,7 +940,7 @@ def delete_product(pid):
 def list_vouchers():
     """Fetch all vouchers from Firestore"""
     try:
-        docs = voucher_collection.stream()
+        docs = voucher_collection().stream()
         vouchers = [doc.to_dict() for doc in docs]
         return jsonify(voucher_list_schema.dump(vouchers))
     except Exception as e:
@@ -430,30 +958,60 @@ def create_voucher():
             return jsonify({"errors": err.messages}), 400
 
         # Check if voucher with same code already exists
-        existing = voucher_collection.document(data["code"]).get()
+        existing = voucher_collection().document(data["code"]).get()
         if existing.exists:
             return jsonify({"error": "Voucher code already exists"}), 400
 
         # Save using code as document ID
-        voucher_collection.document(data["code"]).set(data)
+        voucher_collection().document(data["code"]).set(data)
+        voucher_table.invalidate()
         return jsonify(data), 201
     except Exception as e:
         return api_error_response(e)
 
 
 @app.route("/api/vouchers/<string:code>", methods=["DELETE"])
-@require_admin
+@require_admin(fresh=True)
 def delete_voucher(code):
     """Delete a voucher by code"""
     try:
-        doc_ref = voucher_collection.document(code)
+        doc_ref = voucher_collection().document(code)
         if not doc_ref.get().exists:
             return jsonify({"error": "Voucher not found"}), 404
 
         doc_ref.delete()
+        voucher_table.invalidate()
         return jsonify({"message": f"Voucher '{code}' deleted successfully"})
     except Exception as e:
         return api_error_response(e)
 
+def _cache_samples(field):
+    caches = dict(cache_stats(), pdf=pdf_cache.stats())
+    return [({"cache": name}, stats[field]) for name, stats in caches.items()]
+
+
+def _mail_samples():
+    return [({"event": name}, value) for name, value in get_transport().stats().items() if name != "queued"]
+
+
+metrics.registry.add_collector(lambda: _cache_samples("hits"), "ambu_cache_hits_total", "In-process cache hits", "counter")
+metrics.registry.add_collector(lambda: _cache_samples("misses"), "ambu_cache_misses_total", "In-process cache misses", "counter")
+metrics.registry.add_collector(lambda: _cache_samples("size"), "ambu_cache_entries", "Entries held per cache")
+metrics.registry.add_collector(_mail_samples, "ambu_mail_events_total", "SMTP transport counters", "counter")
+metrics.registry.add_collector(
+    lambda: [({}, get_transport().stats()["queued"])], "ambu_mail_queued", "Messages waiting for an SMTP worker"
+)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint; requires `Authorization: Bearer $METRICS_TOKEN` when set"""
+    if METRICS_TOKEN and request.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+startup.record("import.main", time.perf_counter() - startup.PROCESS_START)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,16 @@
+import sys
+
+from clients import get_order_store
+from utils import analytics
+
+# Usage: python rebuild_analytics.py [--verify]
+store = get_order_store()
+if "--verify" in sys.argv:
+    report = analytics.verify(analytics.iter_orders(store))
+    for m in report["details"]:
+        print(f'{m["day"]} {m["field"]}: expected {m["expected"]}, stored {m["actual"]}')
+    print(f'Checked {report["orders"]} orders over {report["days"]} days: {report["mismatches"]} mismatches')
+    sys.exit(0 if report["ok"] else 1)
+
+count = analytics.rebuild(analytics.iter_orders(store))
+print(f'Rebuilt analytics from {count} orders')
@@ -0,0 +1,7 @@
+from clients import get_orders_bucket
+from utils.order_index import rebuild_index
+
+count, errors = rebuild_index(get_orders_bucket())
+for name, err in errors.items():
+    print(f'Failed {name}: {err}')
+print(f'Indexed {count} orders ({len(errors)} failed)')
@@ -0,0 +1,45 @@
+"""
+Import-time breakdown of the backend module graph.
+
+    python startup_report.py
+
+Each module is imported in dependency order and timed on its own, so a
+slow new import or an eager network call shows up as a jump in one row.
+For a per-package view use `python -X importtime main.py`.
+"""
+import importlib
+import time
+
+MODULES = [
+    "config",
+    "flask",
+    "flask_cors",
+    "marshmallow",
+    "google.cloud.firestore",
+    "google.cloud.storage",
+    "firebase_admin",
+    "reportlab.pdfgen.canvas",
+    "clients",
+    "authz",
+    "schema",
+    "utils.pdf_utils",
+    "utils.email_utils",
+    "utils.order_index",
+    "utils.order_pipeline",
+    "utils.catalog_cache",
+    "utils.product_order",
+    "main",
+]
+
+total = 0.0
+for name in MODULES:
+    t0 = time.perf_counter()
+    importlib.import_module(name)
+    ms = (time.perf_counter() - t0) * 1000
+    total += ms
+    print(f"{name:<28} {ms:9.1f} ms")
+print(f"{'total':<28} {total:9.1f} ms")
+
+from utils import startup
+for name, ms in startup.report()["timings_ms"].items():
+    print(f"  recorded {name:<19} {ms:9.1f} ms")
@@ -0,0 +1,32 @@
+"""Random catalogs, vouchers and carts shared by tests/test_pricing.py and benchmarks/bench_pricing.py"""
+
+
+def make_catalog(rng, n=400):
+    return {
+        f"p{i}": {"id": f"p{i}", "name": f"Product {i}", "price": round(rng.uniform(5, 5000), rng.choice([0, 1, 2])), "mrp": 0}
+        for i in range(n)
+    }
+
+
+def make_vouchers(rng):
+    vouchers = {}
+    for i in range(20):
+        kind = rng.choice(["percentage", "flat"])
+        value = rng.choice([2, 5, 10, 12.5, 33.3, 50, 80, 99]) if kind == "percentage" else round(rng.uniform(2, 3000), 2)
+        vouchers[f"V{i}"] = {"code": f"V{i}", "discount_type": kind, "discount_value": value}
+    # Flat discount above most subtotals, and a voucher from before discount_type existed
+    vouchers["BIG"] = {"code": "BIG", "discount_type": "flat", "discount_value": 1000000}
+    vouchers["OLD"] = {"code": "OLD", "discount_value": 15}
+    return vouchers
+
+
+def make_carts(rng, catalog, vouchers, count):
+    ids = list(catalog)
+    codes = list(vouchers) + [None] * len(vouchers)
+    return [
+        {
+            "items": [{"id": rng.choice(ids), "quantity": rng.randint(1, 50)} for _ in range(rng.randint(1, 30))],
+            "coupon_code": rng.choice(codes),
+        }
+        for _ in range(count)
+    ]
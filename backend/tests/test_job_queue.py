@@ -0,0 +1,118 @@
+"""SQLiteJobQueue behaviour and the order pipeline's resumable steps, offline."""
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from utils import order_pipeline
+from utils.job_queue import SQLiteJobQueue, DONE, FAILED, PENDING
+from utils.order_store import SQLiteOrderStore
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"), backoff_seconds=0)
+
+
+def test_enqueue_dedupes_on_kind_and_key(queue):
+    ran = []
+    queue.register("email", ran.append)
+    queue.register("invoice", ran.append)
+    assert queue.enqueue("email", "order-1", {"n": 1}) is True
+    assert queue.enqueue("email", "order-1", {"n": 2}) is False
+    assert queue.enqueue("invoice", "order-1", {"n": 3}) is True
+    assert queue.run_pending() == 2
+    assert sorted(r["n"] for r in ran) == [1, 3]
+    assert queue.get("email", "order-1")["status"] == DONE
+
+
+def test_failing_job_retries_until_failed_then_calls_on_failure_once(queue):
+    failures = []
+
+    def handler(payload):
+        raise RuntimeError("smtp down")
+
+    queue.register("email", handler, on_failure=lambda payload, error: failures.append((payload, str(error))))
+    queue.enqueue("email", "order-1", {"order_id": "order-1"}, max_attempts=3)
+    assert queue.run_pending() == 3
+    job = queue.get("email", "order-1")
+    assert job["status"] == FAILED and job["attempts"] == 3 and job["last_error"] == "smtp down"
+    assert failures == [({"order_id": "order-1"}, "smtp down")]
+    assert queue.run_once() is False
+
+
+def test_failed_attempt_backs_off(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"), backoff_seconds=60)
+    queue.register("email", lambda payload: 1 / 0)
+    queue.enqueue("email", "order-1", {})
+    assert queue.run_once() is True
+    job = queue.get("email", "order-1")
+    assert job["status"] == PENDING and job["attempts"] == 1
+    # Not due again for another minute
+    assert queue.run_once() is False
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.05)
+    queue.enqueue("email", "order-1", {})
+    first = queue._claim()
+    assert first["attempts"] == 1
+    # Still leased: another worker gets nothing
+    assert queue._claim() is None
+    time.sleep(0.1)
+    # The first worker died without finishing; its lease ran out
+    second = queue._claim()
+    assert second["key"] == "order-1" and second["attempts"] == 2
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteOrderStore(str(tmp_path / "orders.sqlite3"), str(tmp_path / "pdf"), str(tmp_path / "archive"))
+
+
+@pytest.fixture
+def pipeline_calls(monkeypatch):
+    calls = {"render": 0, "emails": []}
+
+    def render(order):
+        calls["render"] += 1
+        return b"%PDF-1.4 invoice"
+
+    def submit(order, pdf, recipient=None, is_customer=False):
+        calls["emails"].append("customer" if is_customer else "admin")
+        future = Future()
+        future.set_result(True)
+        return future
+
+    monkeypatch.setattr(order_pipeline, "render_order_pdf", render)
+    monkeypatch.setattr(order_pipeline, "submit_order_email", submit)
+    return calls
+
+
+def make_order(**fields):
+    return {"order_id": "order-1", "created_at": "2025-10-01T10:00:00", "status": "NOT_ENQUIRED",
+            "total": 100.0, "customer_email": "c@example.com", "items": [], **fields}
+
+
+def test_pipeline_runs_every_step_for_a_new_order(store, pipeline_calls):
+    store.put(make_order(pipeline_status=order_pipeline.QUEUED))
+    order_pipeline.process_order(store, "order-1")
+    assert pipeline_calls == {"render": 1, "emails": ["admin", "customer"]}
+    order = store.get("order-1")
+    assert order["pipeline_status"] == order_pipeline.DONE
+    assert order["emailed_admin"] and order["emailed_customer"]
+    assert store.get_pdf("order-1") == b"%PDF-1.4 invoice"
+
+
+def test_pipeline_retry_skips_finished_steps(store, pipeline_calls):
+    store.put(make_order(pipeline_status=order_pipeline.QUEUED, order_pdf=store.pdf_url("order-1"), emailed_admin=True))
+    store.put_pdf("order-1", b"%PDF-1.4 earlier")
+    order_pipeline.process_order(store, "order-1")
+    assert pipeline_calls == {"render": 0, "emails": ["customer"]}
+    assert store.get("order-1")["pipeline_status"] == order_pipeline.DONE
+
+
+def test_pipeline_is_a_no_op_once_done(store, pipeline_calls):
+    store.put(make_order(pipeline_status=order_pipeline.DONE))
+    order_pipeline.process_order(store, "order-1")
+    assert pipeline_calls == {"render": 0, "emails": []}
@@ -0,0 +1,127 @@
+"""MailTransport against a local debugging SMTP server on a free port."""
+import socket
+import socketserver
+import threading
+from email.message import EmailMessage
+
+import pytest
+
+from utils.mail_transport import MailTransport, wait_or_cancel
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: no auth, no TLS; DATA bodies are recorded"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections.append(self.connection)
+        self.reply("220 localhost debugging server")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command == "DATA":
+                self.reply("354 end with .")
+                body = []
+                for data in iter(self.rfile.readline, b""):
+                    if data == b".\r\n":
+                        break
+                    body.append(data)
+                server.hold.wait(5)
+                with server.lock:
+                    server.messages.append(b"".join(body))
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self.reply("250 ok")
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = []
+        self.messages = []
+        # Cleared to stall deliveries after DATA, set to let them finish
+        self.hold = threading.Event()
+        self.hold.set()
+
+    def drop_connections(self):
+        """Close every client session, as a provider does with stale ones"""
+        with self.lock:
+            for conn in self.connections:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+@pytest.fixture
+def smtp_server():
+    server = DebugSMTPServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.hold.set()
+    server.shutdown()
+    server.server_close()
+
+
+def make_transport(server, **kwargs):
+    return MailTransport("127.0.0.1", server.server_address[1], starttls=False, rate_per_minute=60000, **kwargs)
+
+
+def message(subject):
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "shop@example.com", "admin@example.com", subject
+    msg.set_content("order")
+    return msg
+
+
+def test_messages_share_one_pooled_connection(smtp_server):
+    transport = make_transport(smtp_server, pool_size=1)
+    for i in range(5):
+        assert transport.send(message(f"order {i}"), timeout=5) is True
+    assert len(smtp_server.messages) == 5
+    assert len(smtp_server.connections) == 1
+    assert transport.stats()["sent"] == 5
+
+
+def test_reconnects_after_the_server_drops_the_session(smtp_server):
+    transport = make_transport(smtp_server, pool_size=1)
+    transport.send(message("before"), timeout=5)
+    smtp_server.drop_connections()
+    assert transport.send(message("after"), timeout=5) is True
+    assert len(smtp_server.messages) == 2
+    assert len(smtp_server.connections) == 2
+    stats = transport.stats()
+    assert (stats["retried"], stats["reconnects"], stats["failed"]) == (1, 1, 0)
+
+
+def test_timed_out_message_still_queued_is_cancelled(smtp_server):
+    transport = make_transport(smtp_server, pool_size=1, batch_size=1)
+    smtp_server.hold.clear()
+    first = transport.submit(message("slow"))
+    second = transport.submit(message("queued behind it"))
+    with pytest.raises(TimeoutError):
+        wait_or_cancel(second, 0.2)
+    assert second.cancelled()
+    smtp_server.hold.set()
+    assert first.result(timeout=5) is True
+    # Queue drained: the worker skipped the cancelled message
+    transport.send(message("next"), timeout=5)
+    assert [b"queued behind it" in m for m in smtp_server.messages] == [False, False]
+    assert transport.stats()["cancelled"] == 1
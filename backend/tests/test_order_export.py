@@ -0,0 +1,25 @@
+"""Order export field validation and streaming, against the SQLite store."""
+import gzip
+import json
+
+import pytest
+
+from utils import order_export
+from utils.order_store import SQLiteOrderStore
+
+
+def test_parse_fields_defaults_strips_and_rejects_unknown_names():
+    assert order_export.parse_fields(None) == list(order_export.DEFAULT_FIELDS)
+    assert order_export.parse_fields(" total, customer_email ") == ["total", "customer_email"]
+    with pytest.raises(ValueError, match="secret"):
+        order_export.parse_fields("total,secret")
+
+
+def test_gzipped_ndjson_round_trips(tmp_path):
+    store = SQLiteOrderStore(str(tmp_path / "orders.sqlite3"), str(tmp_path / "pdf"), str(tmp_path / "archive"))
+    for i in range(3):
+        store.put({"order_id": f"o{i}", "created_at": f"2025-10-0{i + 1}T10:00:00", "status": "NOT_ENQUIRED",
+                   "total": 10.0 * i, "customer_email": f"c{i}@example.com", "items": []})
+    body = b"".join(order_export.stream_export(store, "ndjson", ["order_id", "customer_email"], compress=True))
+    rows = [json.loads(line) for line in gzip.decompress(body).splitlines()]
+    assert rows == [{"order_id": f"o{i}", "customer_email": f"c{i}@example.com"} for i in (2, 1, 0)]
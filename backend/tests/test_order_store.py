@@ -0,0 +1,203 @@
+"""
+Conformance tests every OrderStore backend must pass.
+
+The SQLite store runs in a temp dir. The GCS store runs against the
+configured ORDERS_BUCKET and Firestore order index, and only when
+STORAGE_EMULATOR_HOST and FIRESTORE_EMULATOR_HOST point at emulators:
+the tests write and delete orders.
+"""
+import os
+import uuid
+
+import pytest
+
+from utils.order_records import StatusConflict
+from utils.order_store import SQLiteOrderStore
+
+GCS_ENV = ("STORAGE_EMULATOR_HOST", "FIRESTORE_EMULATOR_HOST", "ORDERS_BUCKET")
+
+
+@pytest.fixture(params=["sqlite", "gcs"])
+def store(request, tmp_path):
+    if request.param == "gcs":
+        missing = [name for name in GCS_ENV if not os.getenv(name)]
+        if missing:
+            pytest.skip(f"GCS store needs emulators: set {', '.join(missing)}")
+        from clients import get_orders_bucket
+        from utils.order_store import GCSOrderStore
+        return GCSOrderStore(get_orders_bucket)
+    return SQLiteOrderStore(str(tmp_path / "orders.sqlite3"), str(tmp_path / "pdf"), str(tmp_path / "archive"))
+
+
+@pytest.fixture
+def run():
+    """Prefix for this test's order ids, so runs against a shared bucket don't collide"""
+    return f"conf-{uuid.uuid4().hex[:8]}"
+
+
+def make_order(run, i, status="NOT_ENQUIRED", total=None):
+    return {
+        "order_id": f"{run}-{i:03d}",
+        "created_at": f"2025-10-{1 + i % 28:02d}T10:00:{i % 60:02d}",
+        "status": status,
+        "total": float(total if total is not None else 100 + i),
+        "customer_name": f"Customer {i}",
+        "customer_phone": "9999999999",
+        "items": [{"id": "p1", "name": "Colour Bijili", "mrp": 1400, "price": 140, "quantity": 1}],
+        "extra": {"kept": True},
+    }
+
+
+def test_put_get_roundtrip(store, run):
+    order = make_order(run, 0)
+    store.put(order)
+    assert store.get(order["order_id"]) == order
+
+
+def test_put_replaces(store, run):
+    order = make_order(run, 1)
+    store.put(order)
+    order["status"] = "IN_PROGRESS"
+    store.put(order)
+    assert store.get(order["order_id"])["status"] == "IN_PROGRESS"
+
+
+def test_missing_order_is_none(store, run):
+    assert store.get(f"{run}-missing") is None
+    assert store.delete(f"{run}-missing") is False
+    results = {oid: (order, err) for oid, order, err in store.get_many([f"{run}-missing"])}
+    assert results[f"{run}-missing"] == (None, None)
+
+
+def test_get_many_returns_all(store, run):
+    orders = [make_order(run, i) for i in range(10, 15)]
+    for o in orders:
+        store.put(o)
+    got = {oid: order for oid, order, _ in store.get_many([o["order_id"] for o in orders])}
+    assert got == {o["order_id"]: o for o in orders}
+
+
+def test_delete_removes_from_listing(store, run):
+    order = make_order(run, 20)
+    store.put(order)
+    assert store.delete(order["order_id"]) is True
+    assert store.get(order["order_id"]) is None
+    assert order["order_id"] not in {o["order_id"] for o in store.iter_summaries()}
+
+
+def test_query_filters_sorts_and_pages(store, run):
+    orders = [make_order(run, i, status="DELIVERED" if i % 3 == 0 else "ABORTED") for i in range(30, 60)]
+    for o in orders:
+        store.put(o)
+    mine = lambda rows: [r for r in rows if r["order_id"].startswith(run)]
+
+    delivered = mine(store.iter_summaries(page_size=4, status="DELIVERED"))
+    assert {o["order_id"] for o in delivered} == {o["order_id"] for o in orders if o["status"] == "DELIVERED"}
+    created = [o["created_at"] for o in delivered]
+    assert created == sorted(created, reverse=True)
+
+    by_total = mine(store.iter_summaries(page_size=7, sort="total", direction="asc"))
+    totals = [o["total"] for o in by_total]
+    assert totals == sorted(totals)
+    assert len({o["order_id"] for o in by_total}) == len(by_total), "pages overlap"
+
+    ranged = mine(store.iter_summaries(date_from="2025-10-05", date_to="2025-10-10"))
+    assert all("2025-10-05" <= o["created_at"] < "2025-10-10" for o in ranged)
+    assert ranged, "date range matched nothing"
+
+
+def test_summaries_drop_full_payload(store, run):
+    order = make_order(run, 70)
+    store.put(order)
+    summary = next(o for o in store.iter_summaries() if o["order_id"] == order["order_id"])
+    assert "extra" not in summary and summary["items"][0]["name"] == "Colour Bijili"
+
+
+def test_invalid_filters_raise(store, run):
+    with pytest.raises(ValueError):
+        store.query(sort="customer_name")
+
+
+def test_deleted_cursor_raises(store, run):
+    order = make_order(run, 75)
+    store.put(order)
+    store.delete(order["order_id"])
+    with pytest.raises(ValueError):
+        store.query(cursor=order["order_id"])
+
+
+def test_status_transitions(store, run):
+    order = make_order(run, 80)
+    store.put(order)
+    assert store.update_status(order["order_id"], "DELIVERED")["status"] == "DELIVERED"
+    assert store.get(order["order_id"])["extra"] == {"kept": True}
+    assert store.update_status(order["order_id"], "DELIVERED")["status"] == "DELIVERED"
+    for status, expected in (("ABORTED", None), ("NOT_ENQUIRED", "IN_PROGRESS")):
+        with pytest.raises(StatusConflict) as conflict:
+            store.update_status(order["order_id"], status, expected=expected)
+        assert conflict.value.current == "DELIVERED"
+    assert store.update_status(f"{run}-missing", "DELIVERED") is None
+    delivered = [o for o in store.iter_summaries(status="DELIVERED") if o["order_id"] == order["order_id"]]
+    assert delivered, "listing still shows the old status"
+
+
+def test_bulk_status_update(store, run):
+    orders = [make_order(run, i) for i in range(90, 100)]
+    for o in orders:
+        store.put(o)
+    store.update_status(orders[0]["order_id"], "ABORTED")
+    ids = [o["order_id"] for o in orders] + [f"{run}-missing"]
+    results = {oid: (order, err) for oid, order, err in store.update_statuses(ids, "IN_PROGRESS", expected="NOT_ENQUIRED")}
+    assert results[f"{run}-missing"] == (None, None)
+    assert results[orders[0]["order_id"]][1].current == "ABORTED"
+    assert all(results[o["order_id"]][0]["status"] == "IN_PROGRESS" for o in orders[1:])
+    assert all(store.get(o["order_id"])["status"] == "IN_PROGRESS" for o in orders[1:])
+
+
+def test_update_fields_keeps_status(store, run):
+    order = make_order(run, 85)
+    store.put(order)
+    stale = store.get(order["order_id"])
+    store.update_status(order["order_id"], "IN_PROGRESS")
+    # A background writer holding `stale` patches only its own fields
+    patched = store.update_fields(stale["order_id"], {"order_pdf": "/invoice.pdf", "pipeline_status": "DONE"})
+    assert patched["status"] == "IN_PROGRESS" and patched["pipeline_status"] == "DONE"
+    got = store.get(order["order_id"])
+    assert got["status"] == "IN_PROGRESS" and got["order_pdf"] == "/invoice.pdf" and got["extra"] == {"kept": True}
+    listed = next(o for o in store.iter_summaries() if o["order_id"] == order["order_id"])
+    assert listed["order_pdf"] == "/invoice.pdf"
+    assert store.update_fields(f"{run}-missing", {"pipeline_status": "DONE"}) is None
+    with pytest.raises(ValueError):
+        store.update_fields(order["order_id"], {"status": "ABORTED"})
+
+
+def test_pdf_roundtrip(store, run):
+    oid = f"{run}-pdf"
+    assert store.get_pdf(oid) is None
+    url = store.put_pdf(oid, b"%PDF-1.4 test")
+    assert url
+    assert store.get_pdf(oid) == b"%PDF-1.4 test"
+    assert dict(store.get_pdfs([oid, f"{run}-nopdf"])) == {oid: b"%PDF-1.4 test", f"{run}-nopdf": None}
+
+
+def test_archived_orders_read_lazily(store, run):
+    orders = [make_order(run, 40 + i, status="DELIVERED") for i in range(3)]
+    for order in orders:
+        store.put(order)
+    store.archive.write(orders)
+    for order in orders:
+        store.remove_live(order["order_id"])
+    ids = {o["order_id"] for o in orders}
+    first = orders[0]["order_id"]
+    assert store.get(first) == orders[0]
+    assert store.is_archived(first) and not store.is_archived(f"{run}-missing")
+    assert not any(s["order_id"] in ids for s in store.iter_summaries())
+    assert store.update_status(first, "IN_PROGRESS") is None
+    assert {oid for oid, order, _ in store.get_many(sorted(ids)) if order} == ids
+    seen, cursor = set(), None
+    while True:
+        page, cursor = store.query_archived(status="DELIVERED", limit=2, cursor=cursor)
+        seen.update(s["order_id"] for s in page)
+        if not cursor:
+            break
+    assert ids <= seen
@@ -0,0 +1,39 @@
+"""Invoice PDF pagination and the shared table header."""
+import re
+
+import pytest
+
+pytest.importorskip("reportlab")
+
+from utils import pdf_utils
+
+
+def _page_count(pdf):
+    return int(re.search(rb"/Count (\d+)", pdf).group(1))
+
+
+def _rows_on_first_page():
+    # Customer block above the table is 70pt; see _draw_order
+    y = pdf_utils.H - 40 - 70 - pdf_utils.TABLE_HEADER_HEIGHT
+    rows = 0
+    while y >= pdf_utils.BOTTOM_MARGIN:
+        y -= pdf_utils.ROW_HEIGHT
+        rows += 1
+    return rows
+
+
+def _order(n):
+    items = [{"name": f"Item {i}", "quantity": 1, "mrp": 20, "price": 10} for i in range(n)]
+    return {"order_id": "o1", "items": items, "total": 10.0 * n}
+
+
+def test_full_last_page_does_not_start_an_empty_one():
+    rows = _rows_on_first_page()
+    assert _page_count(pdf_utils.render_order_pdf(_order(rows), use_cache=False)) == 1
+    assert _page_count(pdf_utils.render_order_pdf(_order(rows + 1), use_cache=False)) == 2
+
+
+def test_header_form_is_reused_on_every_page():
+    pdf = pdf_utils.render_order_pdf(_order(3 * _rows_on_first_page()), use_cache=False)
+    assert pdf.count(b"/Subtype /Form") == 1
+    assert pdf.count(b"/FormXob.") >= _page_count(pdf)
@@ -0,0 +1,34 @@
+"""The vectorised batch pricing must match price_order to the paisa."""
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from pricing_factories import make_catalog, make_vouchers, make_carts
+from utils.pricing import PricingError, price_order, price_batch, to_paise
+
+FIELDS = ("subtotal", "discount", "total")
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_batch_matches_single_order_pricing(seed):
+    rng = random.Random(seed)
+    catalog = make_catalog(rng)
+    vouchers = make_vouchers(rng)
+    carts = make_carts(rng, catalog, vouchers, 2000)
+
+    batch = price_batch(carts, catalog, vouchers)
+    mismatches = []
+    for i, cart in enumerate(carts):
+        single = price_order(cart["items"], catalog, vouchers.get(cart["coupon_code"]), cart["coupon_code"])
+        for field in FIELDS:
+            if to_paise(single[field]) != to_paise(batch[field][i]):
+                mismatches.append((i, field, single[field], float(batch[field][i])))
+    assert not mismatches, mismatches[:10]
+
+
+@pytest.mark.parametrize("items", ["abc", [1], [{"quantity": 2}], [{"id": ["p1"]}], {"id": "p1"}])
+def test_malformed_items_raise_pricing_error(items):
+    with pytest.raises(PricingError):
+        price_order(items, {"p1": {"id": "p1", "price": 10}})
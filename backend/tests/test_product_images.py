@@ -0,0 +1,38 @@
+"""Upload validation and variant rendering, without a bucket."""
+from io import BytesIO
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from utils import product_images
+
+
+def encode(size, fmt, color="white"):
+    buf = BytesIO()
+    Image.new("RGB", size, color).save(buf, fmt)
+    return buf.getvalue()
+
+
+def test_oversized_image_is_rejected_from_its_header():
+    # 32 MP of one colour compresses to a ~100 KB PNG
+    data = encode((8000, 4000), "PNG")
+    assert len(data) < product_images.MAX_UPLOAD_BYTES
+    with pytest.raises(product_images.ImageTooLarge):
+        product_images.check_image(BytesIO(data))
+    with pytest.raises(product_images.ImageTooLarge):
+        product_images.render_variants(data)
+
+
+def test_check_image_rejects_non_images_and_rewinds_valid_ones():
+    with pytest.raises(ValueError):
+        product_images.check_image(BytesIO(b"GIF89a? not really"))
+    stream = BytesIO(encode((640, 480), "JPEG"))
+    product_images.check_image(stream)
+    assert stream.tell() == 0 and not stream.closed
+
+
+def test_large_jpeg_renders_every_variant():
+    variants = product_images.render_variants(encode((4000, 3000), "JPEG", "red"))
+    assert {name: (v["width"], v["height"]) for name, v in variants.items()} == {"thumb": (160, 120), "card": (480, 360)}
+    assert all(v["webp"] and v["jpeg"] for v in variants.values())
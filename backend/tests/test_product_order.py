@@ -0,0 +1,24 @@
+"""Slot assignment for bulk product reordering."""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.cloud.firestore")
+
+from utils import product_order
+
+
+def _snap(pid, **fields):
+    return SimpleNamespace(id=pid, reference=SimpleNamespace(id=pid), to_dict=lambda: fields)
+
+
+def test_reorder_reuses_existing_slots():
+    by_id = {"a": _snap("a", sequence_number=1), "b": _snap("b", sequence_number=4), "c": _snap("c", sequence_number=7)}
+    updates = product_order._reorder_updates(["c", "a", "b"], by_id)
+    assert [(ref.id, fields["sequence_number"]) for ref, fields in updates] == [("c", 1), ("a", 4), ("b", 7)]
+
+
+def test_reorder_puts_unsequenced_products_last():
+    by_id = {"a": _snap("a", sequence_number=None), "b": _snap("b"), "c": _snap("c", sequence_number=3)}
+    updates = product_order._reorder_updates(["a", "b", "c"], by_id)
+    assert [(ref.id, fields["sequence_number"]) for ref, fields in updates] == [("a", 3), ("c", None)]
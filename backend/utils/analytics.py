@@ -0,0 +1,411 @@
+"""
+Sales analytics rollups.
+
+Every order contributes to one rollup document for its creation day (UTC):
+order, revenue and discount totals plus per-status, per-product and
+per-voucher counters, all in integer paise. Each day is split over SHARDS
+documents so concurrent checkouts do not contend on one. analytics_orders
+remembers what each order last contributed, so syncing an order applies only
+the difference and syncing it twice is a no-op.
+"""
+import hashlib
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from google.cloud import firestore
+
+from clients import get_db
+from utils import metrics
+from utils.order_records import STATUSES
+from utils.pricing import to_paise, from_paise
+from utils.ttl_cache import TTLCache
+
+JOB_KIND = "analytics"
+SHARDS = 8
+MAX_RANGE_DAYS = 366
+DEFAULT_RANGE_DAYS = 30
+SECTIONS = ("statuses", "products", "vouchers")
+
+# Rollups for a date range, briefly, so dashboards answer from memory
+_ranges = TTLCache(maxsize=64, ttl=30)
+
+
+def rollups_collection():
+    return get_db().collection("analytics_daily")
+
+
+def markers_collection():
+    return get_db().collection("analytics_orders")
+
+
+def shard_for(order_id):
+    return int(hashlib.sha1(order_id.encode("utf-8")).hexdigest()[:8], 16) % SHARDS
+
+
+def contribution(order):
+    """What one order adds to its day's rollup, or None if it counts nowhere"""
+    day = ((order or {}).get("created_at") or "")[:10]
+    if not day:
+        return None
+    revenue = to_paise(order.get("total") or 0)
+    status = order.get("status") or "NOT_ENQUIRED"
+    products = {}
+    for item in order.get("items") or []:
+        if not item.get("id"):
+            continue
+        qty = int(item.get("quantity") or 0)
+        if item.get("amount") is not None:
+            amount = to_paise(item["amount"])
+        else:
+            amount = to_paise(item.get("price") or 0) * qty
+        line = products.setdefault(str(item["id"]), {"quantity": 0, "revenue": 0})
+        line["quantity"] += qty
+        line["revenue"] += amount
+    code = order.get("coupon_code")
+    return {
+        "day": day,
+        "shard": shard_for(order["order_id"]),
+        "orders": 1,
+        "revenue": revenue,
+        "discount": to_paise(order.get("discount") or 0),
+        "statuses": {status: {"orders": 1, "revenue": revenue}},
+        "products": products,
+        "vouchers": {code: {"uses": 1, "discount": to_paise(order.get("discount") or 0)}} if code else {},
+    }
+
+
+def _doc_id(day, shard):
+    return f"{day}-{shard}"
+
+
+def _deltas(old, new):
+    """{doc id: (day, counters)} moving an order's contribution from old to new"""
+    out = {}
+    for sign, contrib in ((-1, old), (1, new)):
+        if not contrib:
+            continue
+        _, delta = out.setdefault(_doc_id(contrib["day"], contrib["shard"]), (contrib["day"], {}))
+        for key in ("orders", "revenue", "discount"):
+            delta[key] = delta.get(key, 0) + sign * contrib[key]
+        for section in SECTIONS:
+            for name, counters in contrib[section].items():
+                entry = delta.setdefault(section, {}).setdefault(name, {})
+                for key, value in counters.items():
+                    entry[key] = entry.get(key, 0) + sign * value
+    return out
+
+
+def _increments(counters):
+    """Nested Increment transforms for the non-zero counters, or None"""
+    out = {}
+    for key, value in counters.items():
+        if isinstance(value, dict):
+            value = _increments(value)
+            if value:
+                out[key] = value
+        elif value:
+            out[key] = firestore.Increment(value)
+    return out or None
+
+
+@metrics.timed("firestore")
+def sync_order(order_id, order):
+    """Bring the rollups in line with the order's current state (None once deleted)"""
+    new = contribution(order)
+    marker = markers_collection().document(order_id)
+
+    @firestore.transactional
+    def _txn(transaction):
+        snap = marker.get(transaction=transaction)
+        old = snap.to_dict().get("contribution") if snap.exists else None
+        if old == new:
+            return False
+        for doc_id, (day, counters) in _deltas(old, new).items():
+            fields = _increments(counters)
+            if fields:
+                transaction.set(rollups_collection().document(doc_id), dict(fields, day=day), merge=True)
+        if new is None:
+            transaction.delete(marker)
+        else:
+            transaction.set(marker, {"contribution": new})
+        return True
+
+    changed = _txn(get_db().transaction())
+    if changed:
+        _ranges.clear()
+    return changed
+
+
+def _accumulate(into, data):
+    """Add nested counters from data into `into`"""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            _accumulate(into.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            into[key] = into.get(key, 0) + value
+        else:
+            into.setdefault(key, value)
+    return into
+
+
+def parse_range(date_from=None, date_to=None):
+    """(from, to) ISO days; defaults to the last DEFAULT_RANGE_DAYS days. Raises ValueError."""
+    end = date.fromisoformat(date_to) if date_to else datetime.now(timezone.utc).date()
+    start = date.fromisoformat(date_from) if date_from else end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise ValueError("from must not be after to")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"At most {MAX_RANGE_DAYS} days per request")
+    return start.isoformat(), end.isoformat()
+
+
+def load_days(date_from, date_to):
+    """{day: counters} summed over shards, for days in [date_from, date_to]"""
+    days = _ranges.get((date_from, date_to))
+    if days is None:
+        days = {}
+        with metrics.span("firestore"):
+            docs = rollups_collection().where("day", ">=", date_from).where("day", "<=", date_to).stream()
+            for snap in docs:
+                data = snap.to_dict()
+                _accumulate(days.setdefault(data["day"], {}), data)
+        _ranges.set((date_from, date_to), days)
+    return days
+
+
+def _total(days):
+    total = {}
+    for counters in days.values():
+        _accumulate(total, counters)
+    return total
+
+
+def summary(date_from, date_to):
+    """Totals, status breakdown and a zero-filled daily series for the range"""
+    days = load_days(date_from, date_to)
+    total = _total(days)
+    orders = total.get("orders", 0)
+    series = []
+    day = date.fromisoformat(date_from)
+    while day <= date.fromisoformat(date_to):
+        counters = days.get(day.isoformat(), {})
+        series.append({
+            "day": day.isoformat(),
+            "orders": counters.get("orders", 0),
+            "revenue": from_paise(counters.get("revenue", 0)),
+            "discount": from_paise(counters.get("discount", 0)),
+        })
+        day += timedelta(days=1)
+    statuses = total.get("statuses", {})
+    return {
+        "from": date_from,
+        "to": date_to,
+        "orders": orders,
+        "revenue": from_paise(total.get("revenue", 0)),
+        "discount": from_paise(total.get("discount", 0)),
+        "average_order": from_paise(total.get("revenue", 0) // orders) if orders else 0,
+        "statuses": {
+            s: {
+                "orders": statuses.get(s, {}).get("orders", 0),
+                "revenue": from_paise(statuses.get(s, {}).get("revenue", 0)),
+            }
+            for s in STATUSES
+        },
+        "days": series,
+    }
+
+
+def top_products(date_from, date_to, sort="quantity", limit=20):
+    if sort not in ("quantity", "revenue"):
+        raise ValueError("Invalid sort. Allowed: ['quantity', 'revenue']")
+    products = _total(load_days(date_from, date_to)).get("products", {})
+    ranked = sorted(
+        ((pid, c) for pid, c in products.items() if c.get("quantity")),
+        key=lambda pc: pc[1].get(sort, 0), reverse=True
+    )
+    return [
+        {"id": pid, "quantity": c.get("quantity", 0), "revenue": from_paise(c.get("revenue", 0))}
+        for pid, c in ranked[:limit]
+    ]
+
+
+def voucher_usage(date_from, date_to):
+    vouchers = _total(load_days(date_from, date_to)).get("vouchers", {})
+    ranked = sorted(((code, c) for code, c in vouchers.items() if c.get("uses")),
+                    key=lambda vc: vc[1]["uses"], reverse=True)
+    return [
+        {"code": code, "uses": c["uses"], "discount": from_paise(c.get("discount", 0))}
+        for code, c in ranked
+    ]
+
+
+def recompute(orders):
+    """
+    Rollups rebuilt from raw orders with numpy scatter-adds:
+    {doc id: counters}, in the same shape as the stored documents.
+    """
+    import numpy as np
+
+    buckets, products, vouchers = {}, {}, {}
+    status_pos = {s: i for i, s in enumerate(STATUSES)}
+    o_bucket, o_status, o_revenue, o_discount = [], [], [], []
+    l_bucket, l_product, l_qty, l_revenue = [], [], [], []
+    v_bucket, v_code, v_discount = [], [], []
+    for order in orders:
+        c = contribution(order)
+        if c is None:
+            continue
+        b = buckets.setdefault((c["day"], c["shard"]), len(buckets))
+        (status, _), = c["statuses"].items()
+        # Statuses outside STATUSES (legacy data) get their own columns
+        o_status.append(status_pos.setdefault(status, len(status_pos)))
+        o_bucket.append(b)
+        o_revenue.append(c["revenue"])
+        o_discount.append(c["discount"])
+        for pid, line in c["products"].items():
+            l_bucket.append(b)
+            l_product.append(products.setdefault(pid, len(products)))
+            l_qty.append(line["quantity"])
+            l_revenue.append(line["revenue"])
+        for code, usage in c["vouchers"].items():
+            v_bucket.append(b)
+            v_code.append(vouchers.setdefault(code, len(vouchers)))
+            v_discount.append(usage["discount"])
+
+    def scatter(shape, index, values):
+        out = np.zeros(shape, dtype=np.int64)
+        np.add.at(out, tuple(np.asarray(i, dtype=np.int64) for i in index), np.asarray(values, dtype=np.int64))
+        return out
+
+    nb = len(buckets)
+    status_orders = scatter((nb, len(status_pos)), (o_bucket, o_status), np.ones(len(o_bucket)))
+    status_revenue = scatter((nb, len(status_pos)), (o_bucket, o_status), o_revenue)
+    discount = scatter(nb, (o_bucket,), o_discount)
+    product_qty = scatter((nb, len(products)), (l_bucket, l_product), l_qty)
+    product_revenue = scatter((nb, len(products)), (l_bucket, l_product), l_revenue)
+    voucher_uses = scatter((nb, len(vouchers)), (v_bucket, v_code), np.ones(len(v_bucket)))
+    voucher_discount = scatter((nb, len(vouchers)), (v_bucket, v_code), v_discount)
+
+    status_names, product_ids, codes = list(status_pos), list(products), list(vouchers)
+    out = {}
+    for (day, shard), b in buckets.items():
+        out[_doc_id(day, shard)] = {
+            "day": day,
+            "orders": int(status_orders[b].sum()),
+            "revenue": int(status_revenue[b].sum()),
+            "discount": int(discount[b]),
+            "statuses": {
+                status_names[i]: {"orders": int(status_orders[b, i]), "revenue": int(status_revenue[b, i])}
+                for i in np.flatnonzero(status_orders[b])
+            },
+            "products": {
+                product_ids[i]: {"quantity": int(product_qty[b, i]), "revenue": int(product_revenue[b, i])}
+                for i in np.flatnonzero(product_qty[b] | product_revenue[b])
+            },
+            "vouchers": {
+                codes[i]: {"uses": int(voucher_uses[b, i]), "discount": int(voucher_discount[b, i])}
+                for i in np.flatnonzero(voucher_uses[b])
+            },
+        }
+    return out
+
+
+def _flatten(counters, prefix=""):
+    """{"products.<id>.quantity": n, ...} for the non-zero numeric counters"""
+    out = {}
+    for key, value in counters.items():
+        if isinstance(value, dict):
+            out.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and value:
+            out[f"{prefix}{key}"] = value
+    return out
+
+
+@metrics.timed("firestore")
+def stored_rollups():
+    return {snap.id: snap.to_dict() for snap in rollups_collection().stream()}
+
+
+def verify(orders, max_mismatches=100):
+    """Compare the stored rollups with a recompute from `orders`, per day"""
+    expected = recompute(orders)
+    actual = stored_rollups()
+    by_day = {}
+    for source, docs in (("expected", expected), ("actual", actual)):
+        for doc in docs.values():
+            _accumulate(by_day.setdefault(doc["day"], {}).setdefault(source, {}), doc)
+
+    mismatches = []
+    for day in sorted(by_day):
+        want = _flatten(by_day[day].get("expected", {}))
+        got = _flatten(by_day[day].get("actual", {}))
+        for field in sorted(set(want) | set(got)):
+            if want.get(field, 0) != got.get(field, 0):
+                mismatches.append({"day": day, "field": field, "expected": want.get(field, 0), "actual": got.get(field, 0)})
+    return {
+        "ok": not mismatches,
+        "orders": sum(doc["orders"] for doc in expected.values()),
+        "days": len(by_day),
+        "mismatches": len(mismatches),
+        "details": mismatches[:max_mismatches],
+    }
+
+
+@metrics.timed("firestore")
+def rebuild(orders, batch_size=400):
+    """
+    Replace every rollup and marker with a recompute from `orders`.
+    Run it while no orders are changing, like rebuild_order_index.py.
+    Returns the number of orders counted.
+    """
+    orders = list(orders)
+    docs = recompute(orders)
+    db = get_db()
+    batch, pending = db.batch(), 0
+
+    def write(op, ref, *args):
+        nonlocal batch, pending
+        getattr(batch, op)(ref, *args)
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch, pending = db.batch(), 0
+
+    for collection in (rollups_collection(), markers_collection()):
+        for snap in collection.stream():
+            write("delete", snap.reference)
+    for doc_id, counters in docs.items():
+        write("set", rollups_collection().document(doc_id), counters)
+    counted = 0
+    for order in orders:
+        c = contribution(order)
+        if c is not None:
+            write("set", markers_collection().document(order["order_id"]), {"contribution": c})
+            counted += 1
+    if pending:
+        batch.commit()
+    _ranges.clear()
+    return counted
+
+
+def iter_orders(store):
+    """Every full order in the store, live then archived (unreadable ones are skipped)"""
+    live = set()
+    ids = (s["order_id"] for s in store.iter_summaries())
+    for oid, order, error in store.get_many(ids):
+        if order is not None and error is None:
+            live.add(oid)
+            yield order
+    if store.archive is not None:
+        # An interrupted archive run can leave an order in both places
+        yield from (o for o in store.archive.iter_orders() if o["order_id"] not in live)
+
+
+def enqueue(queue, order_id):
+    # The job re-reads the order, so any number of syncs converge on its latest state
+    return queue.enqueue(JOB_KIND, f"{order_id}:{uuid.uuid4().hex[:12]}", {"order_id": order_id})
+
+
+def register(queue, get_store):
+    """Register the sync job; the store is resolved when a job runs"""
+    queue.register(JOB_KIND, lambda payload: sync_order(payload["order_id"], get_store().get(payload["order_id"])))
@@ -0,0 +1,80 @@
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
+
+from utils import metrics
+
+DEFAULT_WORKERS = 16
+
+
+def share_http_pool(client, pool_size=DEFAULT_WORKERS):
+    """
+    Resize the connection pool of the storage client's HTTP session so that
+    every worker thread reuses a keep-alive connection instead of opening one.
+    """
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    client._http.mount("https://", adapter)
+    client._http.mount("http://", adapter)
+    return client
+
+
+@metrics.timed("gcs")
+def _download(blob):
+    return blob.download_as_bytes()
+
+
+def fetch_blobs(blobs, max_workers=DEFAULT_WORKERS):
+    """
+    Download blobs concurrently on a bounded thread pool.
+    Yields (blob_name, data, error) as each download finishes; at most
+    2 * max_workers downloads are in flight so huge listings stay bounded.
+    """
+    blobs = iter(blobs)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        done_queue = deque()
+
+        def _fill():
+            while len(pending) < max_workers * 2:
+                blob = next(blobs, None)
+                if blob is None:
+                    return
+                pending[pool.submit(_download, blob)] = blob.name
+
+        _fill()
+        while pending or done_queue:
+            if not done_queue:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done_queue.extend(finished)
+            future = done_queue.popleft()
+            name = pending.pop(future)
+            _fill()
+            try:
+                yield name, future.result(), None
+            except Exception as e:
+                yield name, None, e
+
+
+def fetch_orders(bucket, prefix="orders/", blobs=None, max_workers=DEFAULT_WORKERS):
+    """
+    Stream parsed orders out of the bucket.
+    Yields (blob_name, order, error); error is set (and order is None) when the
+    download fails or the blob is not valid JSON.
+    """
+    if blobs is None:
+        blobs = (b for b in bucket.list_blobs(prefix=prefix) if b.name.endswith(".json"))
+    for name, data, error in fetch_blobs(blobs, max_workers=max_workers):
+        if error is not None:
+            yield name, None, error
+            continue
+        try:
+            yield name, json.loads(data), None
+        except json.JSONDecodeError as e:
+            yield name, None, e
+
+
+def fetch_orders_by_id(bucket, order_ids, max_workers=DEFAULT_WORKERS):
+    """Stream parsed orders for a list of order ids"""
+    blobs = (bucket.blob(f"orders/{oid}.json") for oid in order_ids)
+    return fetch_orders(bucket, blobs=blobs, max_workers=max_workers)
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from werkzeug.http import http_date
+
+
+def _json_default(value):
+    # Same rendering Flask's jsonify uses for Firestore timestamps
+    if isinstance(value, datetime):
+        return http_date(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class CatalogSlice:
+    """A serialized product list and its ETag"""
+
+    def __init__(self, products):
+        self.products = products
+        self.body = json.dumps(products, default=_json_default, separators=(",", ":")).encode("utf-8")
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+
+class CatalogCache:
+    """
+    In-memory copy of the active catalog, ordered by sequence_number, with a
+    pre-serialized slice per category. Writes in this process call
+    invalidate(); the TTL bounds staleness for writes made by other workers.
+    """
+
+    def __init__(self, loader, ttl=300):
+        self.loader = loader
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # (loaded_at, whole catalog slice, {category: slice}, {id: product}), swapped atomically
+        self.state = None
+
+    def _load(self):
+        products = self.loader()
+        grouped = {}
+        for p in products:
+            grouped.setdefault(p.get("category"), []).append(p)
+        by_category = {cat: CatalogSlice(items) for cat, items in grouped.items()}
+        by_id = {p["id"]: p for p in products}
+        return time.monotonic(), CatalogSlice(products), by_category, by_id
+
+    def _is_fresh(self, state):
+        return state is not None and time.monotonic() - state[0] <= self.ttl
+
+    def _current(self):
+        state = self.state
+        if not self._is_fresh(state):
+            with self.lock:
+                state = self.state
+                if not self._is_fresh(state):
+                    state = self.state = self._load()
+        return state
+
+    def get(self, category=None):
+        """CatalogSlice for the whole catalog or one category"""
+        _, whole, by_category, _ = self._current()
+        if category is None:
+            return whole
+        return by_category.get(category) or CatalogSlice([])
+
+    def products(self):
+        """Ordered list of active product dicts (shared; do not mutate)"""
+        return self.get().products
+
+    def by_id(self):
+        """Active products keyed by id (shared; do not mutate)"""
+        return self._current()[3]
+
+    def invalidate(self):
+        self.state = None
@@ -1,88 +1,102 @@
-import smtplib
-import base64
+import html
+import threading
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-from config import GMAIL_EMAIL, GMAIL_APP_PASSWORD, ADMIN_EMAIL
+from config import (
+    GMAIL_EMAIL, GMAIL_APP_PASSWORD, ADMIN_EMAIL,
+    SMTP_HOST, SMTP_PORT, SMTP_STARTTLS, SMTP_POOL_SIZE, SMTP_BATCH_SIZE, SMTP_RATE_PER_MINUTE
+)
+from utils.mail_transport import MailTransport
 
-def send_order_pdf_to_admin(order, pdf_bytes, recipient=ADMIN_EMAIL, is_customer=False):
-    """
-    Send order confirmation email with PDF attachment.
-    Works for both admin and customer.
-    """
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = GMAIL_EMAIL
-        msg['To'] = recipient
-        msg['Subject'] = (
-            f"Your AmbuCrackers Order #{order['order_id']}"
-            if is_customer else
-            f"New AmbuCrackers Order #{order['order_id']}"
-        )
+_transport = None
+_transport_lock = threading.Lock()
 
-        # Email body
-        if is_customer:
-            html_content = (
-                f"<p>Dear {order.get('customer_name','')},</p>"
-                f"<p>Thank you for your order of ₹{order.get('total',0)}.</p>"
-                f"<p>Your order details are attached as PDF.</p>"
-            )
-        else:
-            html_content = (
-                f"<p><b>{order.get('customer_name','')}</b> placed an order of "
-                f"₹{order.get('total',0)}. Phone: {order.get('customer_phone','')}</p>"
+
+def get_transport():
+    """Shared pooled SMTP transport for this process"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = MailTransport(
+                SMTP_HOST, SMTP_PORT,
+                username=GMAIL_EMAIL or None,
+                password=GMAIL_APP_PASSWORD,
+                starttls=SMTP_STARTTLS,
+                pool_size=SMTP_POOL_SIZE,
+                batch_size=SMTP_BATCH_SIZE,
+                rate_per_minute=SMTP_RATE_PER_MINUTE,
             )
-        msg.attach(MIMEText(html_content, 'html'))
+        return _transport
+
+
+def build_order_email(order, pdf_bytes, recipient=ADMIN_EMAIL, is_customer=False):
+    """Order confirmation message with the invoice PDF attached"""
+    msg = MIMEMultipart()
+    msg['From'] = GMAIL_EMAIL
+    msg['To'] = recipient
+    msg['Subject'] = (
+        f"Your AmbuCrackers Order #{order['order_id']}"
+        if is_customer else
+        f"New AmbuCrackers Order #{order['order_id']}"
+    )
+
+    # Email body
+    if is_customer:
+        html_content = (
+            f"<p>Dear {order.get('customer_name','')},</p>"
+            f"<p>Thank you for your order of ₹{order.get('total',0)}.</p>"
+            f"<p>Your order details are attached as PDF.</p>"
+        )
+    else:
+        html_content = (
+            f"<p><b>{order.get('customer_name','')}</b> placed an order of "
+            f"₹{order.get('total',0)}. Phone: {order.get('customer_phone','')}</p>"
+        )
+    msg.attach(MIMEText(html_content, 'html'))
 
-        # PDF attachment
-        pdf_data = pdf_bytes.encode('latin1') if isinstance(pdf_bytes, str) else pdf_bytes
-        attachment = MIMEApplication(pdf_data, _subtype='pdf')
-        attachment.add_header('Content-Disposition', 'attachment',
-                              filename=f"order_{order['order_id']}.pdf")
-        msg.attach(attachment)
+    # PDF attachment
+    pdf_data = pdf_bytes.encode('latin1') if isinstance(pdf_bytes, str) else pdf_bytes
+    attachment = MIMEApplication(pdf_data, _subtype='pdf')
+    attachment.add_header('Content-Disposition', 'attachment',
+                          filename=f"order_{order['order_id']}.pdf")
+    msg.attach(attachment)
+    return msg
 
-        # Send email
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(GMAIL_EMAIL, GMAIL_APP_PASSWORD)
-            server.send_message(msg)
 
-        return True
+def submit_order_email(order, pdf_bytes, recipient=ADMIN_EMAIL, is_customer=False):
+    """Queue an order email without waiting; returns the transport's Future"""
+    return get_transport().submit(build_order_email(order, pdf_bytes, recipient, is_customer))
 
-    except Exception as e:
-        print(f"Email sending failed to {recipient}: {e}")
-        return False
 
+def build_enquiry_digest(enquiries):
+    """One message listing a batch of enquiries, oldest first"""
+    msg = MIMEMultipart()
+    msg['From'] = GMAIL_EMAIL
+    msg['To'] = ADMIN_EMAIL
+    msg['Subject'] = (
+        "New AmbuCrackers Enquiry" if len(enquiries) == 1 else
+        f"{len(enquiries)} new AmbuCrackers Enquiries"
+    )
+    rows = "".join(
+        "<tr>" + "".join(
+            f"<td>{html.escape(str(e.get(k) or ''))}</td>"
+            for k in ('created_at', 'name', 'email', 'phone', 'message')
+        ) + "</tr>"
+        for e in enquiries
+    )
+    msg.attach(MIMEText(
+        "<table border='1' cellpadding='4' cellspacing='0'>"
+        "<tr><th>Received (UTC)</th><th>Name</th><th>Email</th><th>Phone</th><th>Message</th></tr>"
+        f"{rows}</table>",
+        'html'
+    ))
+    return msg
 
 
-def send_enquiry_pdf_to_admin(enquiry):
-    if not GMAIL_EMAIL or not GMAIL_APP_PASSWORD or not ADMIN_EMAIL:
-        return {"success": False, "error": "Missing email configuration"}
-    
-    try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = GMAIL_EMAIL
-        msg['To'] = ADMIN_EMAIL
-        msg['Subject'] = "New AmbuCrackers Enquiry"
-        
-        # Email body
-        html_content = (
-            f"<p><b>{enquiry.get('name','')}</b> submitted an enquiry.<br>"
-            f"Email: {enquiry.get('email','')}<br>"
-            f"Phone: {enquiry.get('phone','')}<br>"
-            f"Message: {enquiry.get('message','')}</p>"
-        )
-        msg.attach(MIMEText(html_content, 'html'))
-        
-        # Send email
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(GMAIL_EMAIL, GMAIL_APP_PASSWORD)
-            server.send_message(msg)
-        
-        return {"success": True}
-        
-    except Exception as e:
-        print(f"Email sending failed: {e}")
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+def send_enquiry_digest(enquiries):
+    """Mail a digest to the admin; raises so the digest job retries on failure"""
+    if not GMAIL_EMAIL or not ADMIN_EMAIL:
+        print(f"Enquiry digest skipped ({len(enquiries)} enquiries): missing email configuration")
+        return
+    get_transport().send(build_enquiry_digest(enquiries))
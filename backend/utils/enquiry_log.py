@@ -0,0 +1,415 @@
+"""
+Buffered enquiry ingestion.
+
+Each enquiry is persisted as a pending row (a Firestore document, or a row
+in a local SQLite file in development) before the request is acknowledged.
+Jobs on the shared queue then compact pending rows into NDJSON segments in
+the orders bucket, grouped by hour, and mail the admin one digest per
+window instead of one email per enquiry.
+"""
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from utils import metrics
+from utils.sqlite_utils import connect
+from utils.ttl_cache import TTLCache
+
+FLUSH_JOB, DIGEST_JOB = "enquiry_flush", "enquiry_digest"
+
+SEGMENT_PREFIX = "enquiries/segments/"
+MAX_SEGMENT_ROWS = 1000
+MAX_DIGEST_ROWS = 200
+CLAIM_SECONDS = 300
+MAX_PAGE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS enquiries (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    segment TEXT,
+    flush_until REAL,
+    flushed INTEGER NOT NULL DEFAULT 0,
+    digest TEXT,
+    digest_until REAL,
+    digested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS enquiries_unflushed ON enquiries (flushed, created_at);
+CREATE INDEX IF NOT EXISTS enquiries_undigested ON enquiries (digested, created_at);
+"""
+
+# Segments are immutable once written, so pages can reuse downloads
+_segments = TTLCache(maxsize=256, ttl=3600)
+
+
+def segment_name(created_at):
+    """enquiries/segments/YYYY-MM-DD/HH-<flush ms>-<token>.ndjson; names sort by hour, then flush"""
+    hour = datetime.fromtimestamp(created_at, timezone.utc)
+    return f"{SEGMENT_PREFIX}{hour:%Y-%m-%d}/{hour:%H}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}.ndjson"
+
+
+class EnquiryLog:
+    """
+    Pending enquiries awaiting a segment and a digest. Rows are claimed for a
+    flush or digest with a lease, so a crashed job's rows are picked up
+    again (under the same segment name) by the next one. Backends keep the
+    rows: FirestoreEnquiryLog (shared by every instance) or SQLiteEnquiryLog
+    (one local file, for dev and tests).
+    """
+
+    # Most rows one flush or digest claim takes
+    CLAIM_ROWS = MAX_SEGMENT_ROWS
+
+    def __init__(self, flush_seconds=300, digest_seconds=3600):
+        self.flush_seconds = flush_seconds
+        self.digest_seconds = digest_seconds
+
+    def append(self, enquiry):
+        """Persist one enquiry; appending the same id twice keeps the first"""
+        raise NotImplementedError
+
+    def schedule(self, queue, enquiry_id=None):
+        """
+        Make sure a flush and a digest job are due at the end of the current
+        windows; one job per window, however many enquiries arrive in it.
+        With digest_seconds=0 each enquiry gets its own (still async) email.
+        """
+        now = time.time()
+        window = int(now // self.flush_seconds)
+        queue.enqueue(FLUSH_JOB, f"flush:{window}", {}, delay=(window + 1) * self.flush_seconds - now)
+        if self.digest_seconds > 0:
+            window = int(now // self.digest_seconds)
+            queue.enqueue(DIGEST_JOB, f"digest:{window}", {}, delay=(window + 1) * self.digest_seconds - now)
+        else:
+            queue.enqueue(DIGEST_JOB, f"digest:{enquiry_id or uuid.uuid4()}", {})
+
+    def _claim(self, done_col, claim_col, until_col, limit, name_for):
+        """
+        Lease up to `limit` pending rows: {claim name: [payload]}. Rows of an
+        expired claim keep their name and are re-claimed together, so a retry
+        rewrites the same segment (or digest) rather than a partial one.
+        """
+        raise NotImplementedError
+
+    def _finish(self, claim_col, until_col, done_col, name, ok):
+        """Mark a claim done (dropping rows that are flushed and digested), or release it for a retry"""
+        raise NotImplementedError
+
+    def flush(self, bucket):
+        """Write every unflushed enquiry to an hourly segment; returns how many"""
+        count = 0
+        while True:
+            hours = {}  # one new segment per hour of enquiries in each pass
+
+            def name_for(row):
+                hour = int(row["created_at"] // 3600)
+                if hour not in hours:
+                    hours[hour] = segment_name(row["created_at"])
+                return hours[hour]
+
+            claims = self._claim("flushed", "segment", "flush_until", self.CLAIM_ROWS, name_for)
+            if not claims:
+                return count
+            for name, payloads in claims.items():
+                try:
+                    with metrics.span("gcs"):
+                        bucket.blob(name).upload_from_string(
+                            "".join(p + "\n" for p in payloads), content_type="application/x-ndjson"
+                        )
+                except Exception:
+                    self._finish("segment", "flush_until", "flushed", name, ok=False)
+                    raise
+                self._finish("segment", "flush_until", "flushed", name, ok=True)
+                count += len(payloads)
+
+    def send_digests(self, send):
+        """send(enquiries) for each batch of undigested enquiries; returns how many"""
+        count = 0
+        while True:
+            digest_id = str(uuid.uuid4())
+            claims = self._claim(
+                "digested", "digest", "digest_until", min(MAX_DIGEST_ROWS, self.CLAIM_ROWS), lambda row: digest_id
+            )
+            if not claims:
+                return count
+            for name, payloads in claims.items():
+                try:
+                    send([json.loads(p) for p in payloads])
+                except Exception:
+                    self._finish("digest", "digest_until", "digested", name, ok=False)
+                    raise
+                self._finish("digest", "digest_until", "digested", name, ok=True)
+                count += len(payloads)
+
+    def buffered(self, limit=MAX_PAGE):
+        """Newest enquiries that are not in a segment yet"""
+        raise NotImplementedError
+
+    def stats(self):
+        """{buffered, unflushed, undigested, oldest} over the pending rows"""
+        raise NotImplementedError
+
+
+class SQLiteEnquiryLog(EnquiryLog):
+    """
+    Pending rows in a local SQLite file shared by every worker on the
+    machine. Rows are lost with the file, so use it for dev and tests.
+    """
+
+    def __init__(self, path, flush_seconds=300, digest_seconds=3600):
+        super().__init__(flush_seconds, digest_seconds)
+        self.path = path
+        conn = connect(path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def append(self, enquiry):
+        conn = connect(self.path)
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO enquiries (id, created_at, payload) VALUES (?, ?, ?)",
+                (enquiry["id"], time.time(), json.dumps(enquiry, default=str))
+            )
+        finally:
+            conn.close()
+
+    def _claim(self, done_col, claim_col, until_col, limit, name_for):
+        now = time.time()
+        conn = connect(self.path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    f"SELECT id, created_at, {claim_col} AS claim FROM enquiries "
+                    f"WHERE {done_col} = 0 AND ({claim_col} IS NULL OR {until_col} < ?) "
+                    f"ORDER BY created_at LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                names = set()
+                for row in rows:
+                    name = row["claim"] or name_for(row)
+                    names.add(name)
+                    conn.execute(
+                        f"UPDATE enquiries SET {claim_col} = ?, {until_col} = ? WHERE id = ? OR "
+                        f"({claim_col} = ? AND {done_col} = 0)",
+                        (name, now + CLAIM_SECONDS, row["id"], name)
+                    )
+                claims = {}
+                for name in sorted(names):
+                    claims[name] = [r["payload"] for r in conn.execute(
+                        f"SELECT payload FROM enquiries WHERE {claim_col} = ? AND {done_col} = 0 ORDER BY created_at",
+                        (name,)
+                    )]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return claims
+        finally:
+            conn.close()
+
+    def _finish(self, claim_col, until_col, done_col, name, ok):
+        conn = connect(self.path)
+        try:
+            if ok:
+                conn.execute(f"UPDATE enquiries SET {done_col} = 1 WHERE {claim_col} = ?", (name,))
+                conn.execute("DELETE FROM enquiries WHERE flushed = 1 AND digested = 1")
+            else:
+                # Expire the lease so the next run retries right away, keeping the name
+                conn.execute(f"UPDATE enquiries SET {until_col} = 0 WHERE {claim_col} = ?", (name,))
+        finally:
+            conn.close()
+
+    def buffered(self, limit=MAX_PAGE):
+        conn = connect(self.path)
+        try:
+            rows = conn.execute(
+                "SELECT payload FROM enquiries WHERE flushed = 0 ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+            return [json.loads(r["payload"]) for r in rows]
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = connect(self.path)
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*) AS buffered, COALESCE(SUM(flushed = 0), 0) AS unflushed, "
+                "COALESCE(SUM(digested = 0), 0) AS undigested, MIN(created_at) AS oldest FROM enquiries"
+            ).fetchone()
+            return dict(row)
+        finally:
+            conn.close()
+
+
+class FirestoreEnquiryLog(EnquiryLog):
+    """
+    One document per pending enquiry, so an acknowledged enquiry survives
+    the instance that took it. flush_until and digest_until double as the
+    claim queues: 0 until claimed, the lease expiry while claimed and null
+    once done, so claimable rows come from a single-field range query.
+    Documents are deleted once they are both flushed and digested.
+    """
+
+    # Keeps a claim, plus re-collected rows of an expired one, under Firestore's 500 writes
+    CLAIM_ROWS = 200
+
+    def __init__(self, get_db, flush_seconds=300, digest_seconds=3600, collection="enquiries_pending"):
+        super().__init__(flush_seconds, digest_seconds)
+        self.get_db = get_db
+        self.collection = collection
+
+    def _docs(self):
+        return self.get_db().collection(self.collection)
+
+    def append(self, enquiry):
+        from google.api_core.exceptions import AlreadyExists
+
+        try:
+            with metrics.span("firestore"):
+                self._docs().document(enquiry["id"]).create({
+                    "created_at": time.time(),
+                    "payload": json.dumps(enquiry, default=str),
+                    "segment": None,
+                    "flush_until": 0,
+                    "flushed": False,
+                    "digest": None,
+                    "digest_until": 0,
+                    "digested": False,
+                })
+        except AlreadyExists:
+            pass
+
+    def _claim(self, done_col, claim_col, until_col, limit, name_for):
+        from google.cloud import firestore
+
+        now = time.time()
+
+        @firestore.transactional
+        def _txn(transaction):
+            rows = [
+                snap.to_dict() | {"ref": snap.reference}
+                for snap in self._docs().where(until_col, "<", now).order_by(until_col)
+                .limit(limit).stream(transaction=transaction)
+            ]
+            rows.sort(key=lambda r: r["created_at"])
+            groups, expired = {}, set()
+            for row in rows:
+                if row[claim_col]:
+                    expired.add(row[claim_col])
+                name = row[claim_col] or name_for(row)
+                groups.setdefault(name, {})[row["ref"].id] = row
+            for name in expired:
+                # Rows of the expired claim that the limit left out
+                for snap in self._docs().where(claim_col, "==", name).stream(transaction=transaction):
+                    data = snap.to_dict()
+                    if not data[done_col]:
+                        groups[name].setdefault(snap.id, data | {"ref": snap.reference})
+            claims = {}
+            for name in sorted(groups):
+                members = sorted(groups[name].values(), key=lambda r: r["created_at"])
+                for row in members:
+                    transaction.update(row["ref"], {claim_col: name, until_col: now + CLAIM_SECONDS})
+                claims[name] = [row["payload"] for row in members]
+            return claims
+
+        with metrics.span("firestore"):
+            return _txn(self.get_db().transaction())
+
+    def _finish(self, claim_col, until_col, done_col, name, ok):
+        # Expiring the lease lets the next run retry right away, keeping the name
+        fields = {done_col: True, until_col: None} if ok else {until_col: 0}
+        with metrics.span("firestore"):
+            batch = self.get_db().batch()
+            for snap in self._docs().where(claim_col, "==", name).stream():
+                if not snap.to_dict()[done_col]:
+                    batch.update(snap.reference, fields)
+            batch.commit()
+            if ok:
+                done = self._docs().where("flushed", "==", True).where("digested", "==", True).limit(400).stream()
+                batch = self.get_db().batch()
+                for snap in done:
+                    batch.delete(snap.reference)
+                batch.commit()
+
+    def buffered(self, limit=MAX_PAGE):
+        with metrics.span("firestore"):
+            rows = [snap.to_dict() for snap in self._docs().where("flushed", "==", False).stream()]
+        rows.sort(key=lambda r: r["created_at"], reverse=True)
+        return [json.loads(r["payload"]) for r in rows[:limit]]
+
+    def stats(self):
+        with metrics.span("firestore"):
+            rows = [snap.to_dict() for snap in self._docs().select(["created_at", "flushed", "digested"]).stream()]
+        return {
+            "buffered": len(rows),
+            "unflushed": sum(not r["flushed"] for r in rows),
+            "undigested": sum(not r["digested"] for r in rows),
+            "oldest": min((r["created_at"] for r in rows), default=None),
+        }
+
+
+def _read_segment(bucket, name):
+    lines = _segments.get(name)
+    if lines is None:
+        with metrics.span("gcs"):
+            text = bucket.blob(name).download_as_text()
+        lines = [json.loads(line) for line in text.splitlines() if line.strip()]
+        _segments.set(name, lines)
+    return lines
+
+
+def read_page(bucket, limit=50, cursor=None, days=30, today=None):
+    """
+    Newest-first page of flushed enquiries: (enquiries, next_cursor).
+    Walks day prefixes backwards from the cursor (or today), listing at most
+    one day's segments at a time. The cursor is "<segment>|<lines returned>".
+    """
+    limit = max(1, min(int(limit), MAX_PAGE))
+    after_name, skip = None, 0
+    if cursor:
+        after_name, _, skip = cursor.rpartition("|")
+        skip = int(skip)
+        day = datetime.strptime(after_name[len(SEGMENT_PREFIX):].split("/")[0], "%Y-%m-%d").date()
+    else:
+        day = today or datetime.now(timezone.utc).date()
+
+    out = []
+    for _ in range(days):
+        prefix = f"{SEGMENT_PREFIX}{day:%Y-%m-%d}/"
+        with metrics.span("gcs"):
+            names = sorted((b.name for b in bucket.list_blobs(prefix=prefix)), reverse=True)
+        for name in names:
+            if after_name is not None and name > after_name:
+                continue
+            lines = _read_segment(bucket, name)[::-1]
+            start = skip if name == after_name else 0
+            take = lines[start:start + limit - len(out)]
+            out.extend(take)
+            if len(out) >= limit:
+                used = start + len(take)
+                next_cursor = f"{name}|{used}" if used < len(lines) else _next_after(names, name)
+                return out, next_cursor
+        after_name, skip = None, 0
+        day -= timedelta(days=1)
+    return out, None
+
+
+def _next_after(names, name):
+    """Cursor for the segment after `name` on the same day, or the start of the previous day"""
+    i = names.index(name)
+    if i + 1 < len(names):
+        return f"{names[i + 1]}|0"
+    day = datetime.strptime(name[len(SEGMENT_PREFIX):].split("/")[0], "%Y-%m-%d").date() - timedelta(days=1)
+    # "~" sorts after every segment name, so the whole previous day is included
+    return f"{SEGMENT_PREFIX}{day:%Y-%m-%d}/~|0"
+
+
+def register(queue, log, get_bucket, send_digest):
+    """Register the flush and digest jobs; send_digest(enquiries) raises on failure"""
+    queue.register(FLUSH_JOB, lambda payload: log.flush(get_bucket()))
+    queue.register(DIGEST_JOB, lambda payload: log.send_digests(send_digest))
@@ -0,0 +1,166 @@
+"""
+Idempotency keys for POST endpoints: the first request with a key runs, and
+repeats get its stored response back without redoing any work.
+"""
+import functools
+import hashlib
+import json
+import time
+
+from flask import current_app, jsonify, request
+
+from utils.sqlite_utils import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL,
+    status_code INTEGER,
+    body BLOB,
+    mimetype TEXT,
+    lease_until REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_expiry ON idempotency (expires_at);
+"""
+
+# A key is PENDING while its first request runs, then DONE with the stored response
+PENDING, DONE = "PENDING", "DONE"
+
+# begin() outcomes
+OWNER, REPLAY, MISMATCH, BUSY = "OWNER", "REPLAY", "MISMATCH", "BUSY"
+
+
+class IdempotencyStore:
+    """
+    Responses keyed by idempotency key in a local SQLite file, shared by every
+    worker on the instance. The first request for a key owns it; later ones
+    replay its response, and ones arriving while it runs wait for it.
+    """
+
+    def __init__(self, path, lease_seconds=60, poll_seconds=0.05):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._calls = 0
+        conn = connect(path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _claim(self, conn, key, fingerprint):
+        """Take the key if it is free, expired, or its owner's lease ran out"""
+        now = time.time()
+        cur = conn.execute(
+            "INSERT INTO idempotency (key, fingerprint, status, lease_until, expires_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET fingerprint = excluded.fingerprint, status = excluded.status, "
+            "status_code = NULL, body = NULL, mimetype = NULL, "
+            "lease_until = excluded.lease_until, expires_at = excluded.expires_at "
+            "WHERE idempotency.expires_at < ? OR (idempotency.status = ? AND idempotency.lease_until < ?)",
+            (key, fingerprint, PENDING, now + self.lease_seconds, now + self.lease_seconds, now, PENDING, now)
+        )
+        return cur.rowcount == 1
+
+    def begin(self, key, fingerprint, wait=30):
+        """
+        (outcome, row): OWNER means run the request and call complete() or
+        release(); REPLAY carries the stored response; MISMATCH means the key
+        was used for a different request; BUSY means the owner outlasted `wait`.
+        """
+        deadline = time.monotonic() + wait
+        conn = connect(self.path)
+        try:
+            self._purge(conn)
+            while True:
+                if self._claim(conn, key, fingerprint):
+                    return OWNER, None
+                row = conn.execute(
+                    "SELECT fingerprint, status, status_code, body, mimetype FROM idempotency WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                if row is None:
+                    continue  # released between the two statements
+                if row["fingerprint"] != fingerprint:
+                    return MISMATCH, None
+                if row["status"] == DONE:
+                    return REPLAY, dict(row)
+                if time.monotonic() >= deadline:
+                    return BUSY, None
+                time.sleep(self.poll_seconds)
+        finally:
+            conn.close()
+
+    def complete(self, key, status_code, body, mimetype, ttl):
+        conn = connect(self.path)
+        try:
+            conn.execute(
+                "UPDATE idempotency SET status = ?, status_code = ?, body = ?, mimetype = ?, expires_at = ? "
+                "WHERE key = ?",
+                (DONE, status_code, body, mimetype, time.time() + ttl, key)
+            )
+        finally:
+            conn.close()
+
+    def release(self, key):
+        """Forget a key whose request failed so a retry runs it again"""
+        conn = connect(self.path)
+        try:
+            conn.execute("DELETE FROM idempotency WHERE key = ? AND status = ?", (key, PENDING))
+        finally:
+            conn.close()
+
+    def _purge(self, conn, every=200):
+        self._calls += 1
+        if self._calls % every == 0:
+            conn.execute("DELETE FROM idempotency WHERE expires_at < ? AND status = ?", (time.time(), DONE))
+
+
+def fingerprint(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def idempotent(store, request_key, wait=30):
+    """
+    Make a JSON view idempotent. request_key() -> (key, fingerprint, ttl) for
+    the current request, or None to run it normally. Successful responses
+    are replayed for `ttl` seconds; errors free the key so a corrected retry
+    runs again (validation failures do no I/O, so re-running them is cheap).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            derived = request_key()
+            if derived is None:
+                return view(*args, **kwargs)
+            key, digest, ttl = derived
+            outcome, row = store.begin(key, digest, wait=wait)
+            if outcome == REPLAY:
+                resp = current_app.response_class(row["body"], status=row["status_code"], mimetype=row["mimetype"])
+                resp.headers["Idempotent-Replayed"] = "true"
+                return resp
+            if outcome == MISMATCH:
+                return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+            if outcome == BUSY:
+                return jsonify({"error": "The original request is still being processed"}), 409
+
+            try:
+                resp = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                store.release(key)
+                raise
+            if resp.status_code >= 300 or resp.is_streamed:
+                store.release(key)
+            else:
+                store.complete(key, resp.status_code, resp.get_data(), resp.mimetype, ttl)
+            return resp
+        return wrapper
+    return decorator
+
+
+def header_key():
+    """The client's Idempotency-Key header, if any (trimmed, bounded length)"""
+    key = (request.headers.get("Idempotency-Key") or "").strip()
+    return key[:200] or None
@@ -0,0 +1,115 @@
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing import get_context
+
+from utils.pdf_utils import render_order_pdf
+
+CHUNK_SIZE = 32
+# pypdf keeps every merged page in memory until the end; ZIP output has no cap
+MAX_MERGED_ORDERS = 200
+# Render processes, shared by every export in this process (None = CPU count)
+RENDER_WORKERS = None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _render_pool():
+    """
+    The process pool, started on the first export and kept for the next.
+    spawn, because the app process runs worker threads, which fork does not
+    copy safely; spawned children re-import the entry module, so main.py
+    starts no job worker in them.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(broken):
+    """Drop a pool whose worker died so the next export starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def _render_missing(store, order_ids):
+    """Render PDFs for orders that have no stored invoice, across processes"""
+    orders = []
+    for oid, order, error in store.get_many(order_ids):
+        if order is None:
+            print(f"Invoice export: cannot load order {oid}: {error or 'not found'}")
+            continue
+        orders.append(order)
+    pool = _render_pool()
+    try:
+        pdfs = list(pool.map(render_order_pdf, orders))
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+    return dict(zip((o["order_id"] for o in orders), pdfs))
+
+
+def iter_invoices(store, order_ids):
+    """
+    Yield (order_id, pdf_bytes) in the given order, a chunk at a time.
+    Stored PDFs are fetched concurrently; missing ones are rendered in the
+    shared process pool. Orders that cannot be loaded at all are skipped.
+    """
+    for i in range(0, len(order_ids), CHUNK_SIZE):
+        chunk = order_ids[i:i + CHUNK_SIZE]
+        pdfs = {oid: pdf for oid, pdf in store.get_pdfs(chunk) if pdf is not None}
+        missing = [oid for oid in chunk if oid not in pdfs]
+        if missing:
+            pdfs.update(_render_missing(store, missing))
+        for oid in chunk:
+            if oid in pdfs:
+                yield oid, pdfs.pop(oid)
+
+
+class _StreamBuffer:
+    """Write-only file object that hands written bytes to the response generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(invoices):
+    """Stream a ZIP of invoices; only one PDF is held in memory at a time"""
+    out = _StreamBuffer()
+    with zipfile.ZipFile(out, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        for order_id, pdf in invoices:
+            zf.writestr(f"order_{order_id}.pdf", pdf)
+            yield out.drain()
+    yield out.drain()
+
+
+def stream_merged_pdf(invoices):
+    """Merge invoices into one PDF; bounded by MAX_MERGED_ORDERS upstream"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _, pdf in invoices:
+        writer.append(BytesIO(pdf))
+    buf = BytesIO()
+    writer.write(buf)
+    yield buf.getvalue()
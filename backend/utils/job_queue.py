@@ -0,0 +1,374 @@
+import json
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+from utils import metrics
+from utils.sqlite_utils import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'PENDING',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (kind, key)
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after);
+"""
+
+# PENDING -> RUNNING -> DONE, or back to PENDING with a backoff until
+# max_attempts is reached, then FAILED.
+PENDING, RUNNING, DONE, FAILED = "PENDING", "RUNNING", "DONE", "FAILED"
+
+JOB_FIELDS = ("status", "attempts", "last_error", "created_at", "updated_at")
+
+# Set by use_native_threads() when gevent has patched threading
+_native_pool = None
+
+
+def use_native_threads():
+    """
+    Run job workers (and run_blocking calls) on native threads. Under gevent
+    monkey-patching threading.Thread is a greenlet, so sqlite, PDF rendering
+    and image resizing in handlers would stall every request on the process.
+    Call after monkey.patch_all() and before any worker starts.
+    """
+    global _native_pool
+    from gevent.threadpool import ThreadPool
+
+    # One thread for the worker loop, one for run_blocking callers (the cron route)
+    _native_pool = ThreadPool(2)
+
+
+def run_blocking(fn, *args, **kwargs):
+    """fn(*args, **kwargs), off the event loop when use_native_threads() is on"""
+    if _native_pool is None:
+        return fn(*args, **kwargs)
+    return _native_pool.apply(fn, args, kwargs)
+
+
+class JobQueue:
+    """
+    Job queue with retries and leases. Jobs are unique per (kind, key), so
+    enqueueing the same key twice is a no-op; handlers must be safe to re-run
+    after a crash mid-job. Backends keep the jobs: FirestoreJobQueue (shared
+    by every instance) or SQLiteJobQueue (one local file, for dev and tests).
+    """
+
+    # Idle wait between polls; enqueueing on this process wakes the worker early
+    POLL_SECONDS = 1.0
+
+    def __init__(self, lease_seconds=300, backoff_seconds=5):
+        self.lease_seconds = lease_seconds
+        self.backoff_seconds = backoff_seconds
+        self.handlers = {}
+        self._worker = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def register(self, kind, handler, on_failure=None):
+        """handler(payload) runs the job; on_failure(payload, error) runs once retries are exhausted"""
+        self.handlers[kind] = (handler, on_failure)
+
+    def enqueue(self, kind, key, payload, max_attempts=5, delay=0):
+        """Add a job; returns False when a job with this key already exists"""
+        added = self._insert(kind, key, payload, max_attempts, delay)
+        if added and delay <= 0:
+            self._wake.set()
+        return added
+
+    def get(self, kind, key):
+        """{status, attempts, last_error, created_at, updated_at} of a job, or None"""
+        raise NotImplementedError
+
+    def _insert(self, kind, key, payload, max_attempts, delay):
+        raise NotImplementedError
+
+    def _claim(self):
+        """
+        Lease one ready job: a dict with kind, key, payload, attempts (counting
+        this one) and max_attempts, or None when nothing is ready
+        """
+        raise NotImplementedError
+
+    def _finish(self, job, status, run_after=None, error=None):
+        """Record the outcome of a claimed job; run_after is set when it goes back to PENDING"""
+        raise NotImplementedError
+
+    def run_once(self):
+        """Claim and run one ready job. Returns False when nothing was ready."""
+        job = self._claim()
+        if job is None:
+            return False
+        handler, on_failure = self.handlers.get(job["kind"], (None, None))
+        attempts = job["attempts"]
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job kind {job['kind']}")
+            handler(job["payload"])
+            self._finish(job, DONE)
+        except Exception as e:
+            print(f"Job {job['kind']}:{job['key']} failed (attempt {attempts}): {e}")
+            traceback.print_exc()
+            exhausted = attempts >= job["max_attempts"]
+            self._finish(
+                job,
+                FAILED if exhausted else PENDING,
+                run_after=time.time() + self.backoff_seconds * 2 ** (attempts - 1),
+                error=e
+            )
+            if exhausted and on_failure:
+                on_failure(job["payload"], e)
+        return True
+
+    def run_pending(self, deadline=None):
+        """
+        Drain ready jobs synchronously, stopping after time.monotonic() passes
+        `deadline` if one is given; useful offline, in scripts and from cron
+        """
+        count = 0
+        while (deadline is None or time.monotonic() < deadline) and self.run_once():
+            count += 1
+        return count
+
+    def start_worker(self, poll_interval=None):
+        """Process jobs on a daemon thread in this process (a native one under use_native_threads)"""
+        if self._worker and (self._worker.is_alive() if _native_pool is None else not self._worker.ready()):
+            return
+        poll_interval = poll_interval or self.POLL_SECONDS
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.is_set():
+                try:
+                    self._wake.clear()
+                    if not self.run_once():
+                        self._wake.wait(poll_interval)
+                except Exception as e:
+                    print(f"Job worker error: {e}")
+                    self._stop.wait(poll_interval)
+
+        if _native_pool is not None:
+            self._worker = _native_pool.spawn(_loop)
+            return
+        self._worker = threading.Thread(target=_loop, name="job-queue-worker", daemon=True)
+        self._worker.start()
+
+    def stop_worker(self):
+        self._stop.set()
+        self._wake.set()
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Jobs in a local SQLite file shared by the workers of one machine. Jobs
+    are lost with the file, so use it for development, scripts and tests.
+    """
+
+    def __init__(self, path, lease_seconds=300, backoff_seconds=5):
+        super().__init__(lease_seconds, backoff_seconds)
+        self.path = path
+        conn = connect(path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _insert(self, kind, key, payload, max_attempts, delay):
+        now = time.time()
+        conn = connect(self.path)
+        try:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, key, payload, max_attempts, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, key, json.dumps(payload), max_attempts, now + delay, now, now)
+            )
+            return cur.rowcount == 1
+        finally:
+            conn.close()
+
+    def get(self, kind, key):
+        conn = connect(self.path)
+        try:
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def _claim(self):
+        now = time.time()
+        conn = connect(self.path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE (status = ? AND run_after <= ?) "
+                    "OR (status = ? AND locked_until < ?) ORDER BY run_after LIMIT 1",
+                    (PENDING, now, RUNNING, now)
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, locked_until = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, now + self.lease_seconds, now, row["id"])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "key": row["key"],
+            "payload": json.loads(row["payload"]),
+            "attempts": row["attempts"] + 1,
+            "max_attempts": row["max_attempts"],
+        }
+
+    def _finish(self, job, status, run_after=None, error=None):
+        conn = connect(self.path)
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, run_after = COALESCE(?, run_after), locked_until = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (status, run_after, str(error) if error else None, time.time(), job["id"])
+            )
+        finally:
+            conn.close()
+
+
+class FirestoreJobQueue(JobQueue):
+    """
+    Jobs as documents in a Firestore collection. Any instance can run them,
+    so a job outlives the instance that queued it. `due` is when a job may
+    next be claimed: its run_after while PENDING, the lease expiry while
+    RUNNING, and null once DONE or FAILED, so ready jobs come from a single
+    range query on one field. Claims and results are transactions, and a
+    result is only recorded by the holder of the current lease.
+    """
+
+    POLL_SECONDS = 5.0
+    # Ready jobs fetched per claim; losing a race moves on to the next one
+    CLAIM_CANDIDATES = 10
+
+    def __init__(self, get_db, collection="jobs", lease_seconds=300, backoff_seconds=5, keep_days=30):
+        super().__init__(lease_seconds, backoff_seconds)
+        self.get_db = get_db
+        self.collection = collection
+        # Finished jobs get an expire_at this far out, for a Firestore TTL policy
+        self.keep_days = keep_days
+
+    def _jobs(self):
+        return self.get_db().collection(self.collection)
+
+    def _ref(self, kind, key):
+        return self._jobs().document(quote(f"{kind}:{key}", safe=":"))
+
+    def _insert(self, kind, key, payload, max_attempts, delay):
+        from google.api_core.exceptions import AlreadyExists
+
+        now = time.time()
+        try:
+            with metrics.span("firestore"):
+                self._ref(kind, key).create({
+                    "kind": kind,
+                    "key": key,
+                    "payload": payload,
+                    "status": PENDING,
+                    "attempts": 0,
+                    "max_attempts": max_attempts,
+                    "due": now + delay,
+                    "lease": None,
+                    "last_error": None,
+                    "created_at": now,
+                    "updated_at": now,
+                })
+            return True
+        except AlreadyExists:
+            return False
+
+    def get(self, kind, key):
+        with metrics.span("firestore"):
+            snap = self._ref(kind, key).get()
+        if not snap.exists:
+            return None
+        data = snap.to_dict()
+        return {k: data.get(k) for k in JOB_FIELDS}
+
+    def _claim(self):
+        from google.cloud import firestore
+
+        now = time.time()
+        with metrics.span("firestore"):
+            ready = list(
+                self._jobs().where("due", "<=", now).order_by("due").limit(self.CLAIM_CANDIDATES).stream()
+            )
+        for snap in ready:
+            ref, lease = snap.reference, uuid.uuid4().hex
+
+            @firestore.transactional
+            def _txn(transaction):
+                current = ref.get(transaction=transaction)
+                data = current.to_dict() if current.exists else None
+                # Another worker may have claimed or finished it since the query
+                if not data or data.get("due") is None or data["due"] > now:
+                    return None
+                attempts = data["attempts"] + 1
+                transaction.update(ref, {
+                    "status": RUNNING,
+                    "attempts": attempts,
+                    "due": now + self.lease_seconds,
+                    "lease": lease,
+                    "updated_at": now,
+                })
+                return dict(data, id=ref.id, attempts=attempts, lease=lease)
+
+            with metrics.span("firestore"):
+                job = _txn(self.get_db().transaction())
+            if job is not None:
+                return job
+        return None
+
+    def _finish(self, job, status, run_after=None, error=None):
+        from google.cloud import firestore
+
+        ref = self._jobs().document(job["id"])
+        fields = {
+            "status": status,
+            "due": run_after if status == PENDING else None,
+            "lease": None,
+            "last_error": str(error) if error else None,
+            "updated_at": time.time(),
+        }
+        if status in (DONE, FAILED):
+            fields["expire_at"] = datetime.now(timezone.utc) + timedelta(days=self.keep_days)
+
+        @firestore.transactional
+        def _txn(transaction):
+            current = ref.get(transaction=transaction)
+            if not current.exists or (current.to_dict() or {}).get("lease") != job["lease"]:
+                return False
+            transaction.update(ref, fields)
+            return True
+
+        with metrics.span("firestore"):
+            recorded = _txn(self.get_db().transaction())
+        if not recorded:
+            print(f"Job {job['kind']}:{job['key']} lost its lease; another worker owns it now")
@@ -0,0 +1,170 @@
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from utils import metrics
+from utils.rate_limit import TokenBucket
+
+# Errors after which the connection is thrown away and the message retried once
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+def wait_or_cancel(future, timeout):
+    """
+    Wait up to `timeout` for a submitted message. One still queued by then is
+    cancelled, so a caller that retries later cannot deliver it twice; one
+    already being sent is waited out, which the SMTP timeout bounds.
+    """
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        if future.cancel():
+            raise
+        return future.result()
+
+
+class SMTPConnection:
+    """One authenticated SMTP session, reopened when it goes stale"""
+
+    def __init__(self, host, port, username=None, password=None, starttls=True, max_idle=60, timeout=30,
+                 on_reconnect=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.server = None
+        self.last_used = 0
+        self.on_reconnect = on_reconnect
+
+    def open(self):
+        if self.last_used and self.on_reconnect:
+            self.on_reconnect()
+        self.close()
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        self.server = server
+        self.last_used = time.monotonic()
+
+    def ensure_open(self):
+        if self.server is None:
+            self.open()
+        elif time.monotonic() - self.last_used > self.max_idle:
+            # Providers drop idle sessions; probe before reusing
+            try:
+                if self.server.noop()[0] != 250:
+                    self.open()
+            except CONNECTION_ERRORS:
+                self.open()
+
+    @metrics.timed("smtp")
+    def send(self, msg):
+        self.ensure_open()
+        self.server.send_message(msg)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+
+class MailTransport:
+    """
+    Queue of outgoing messages drained in batches by `pool_size` worker
+    threads, each holding a persistent SMTP connection. Sends are rate
+    limited across the pool to stay under provider quotas.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 pool_size=2, batch_size=20, rate_per_minute=60, max_idle=60):
+        self.connection_args = dict(
+            host=host, port=port, username=username, password=password,
+            starttls=starttls, max_idle=max_idle
+        )
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.limiter = TokenBucket(rate_per_minute / 60.0, burst=max(batch_size, 1))
+        self.queue = queue.Queue()
+        self.counters = {"sent": 0, "failed": 0, "retried": 0, "reconnects": 0, "cancelled": 0}
+        self.counter_lock = threading.Lock()
+        self.workers = []
+        self.start_lock = threading.Lock()
+
+    def _count(self, name):
+        with self.counter_lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.counter_lock:
+            return dict(self.counters, queued=self.queue.qsize())
+
+    def _start(self):
+        with self.start_lock:
+            if self.workers:
+                return
+            for i in range(self.pool_size):
+                t = threading.Thread(target=self._drain, name=f"smtp-worker-{i}", daemon=True)
+                t.start()
+                self.workers.append(t)
+
+    def submit(self, msg):
+        """
+        Queue a message; returns a Future resolving to True or raising the
+        send error. Cancelling the Future before a worker takes it skips it.
+        """
+        self._start()
+        future = Future()
+        self.queue.put((msg, future))
+        return future
+
+    def send(self, msg, timeout=120):
+        """Queue a message and wait for it to be delivered"""
+        return wait_or_cancel(self.submit(msg), timeout)
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        # Take at most a fair share of the backlog so a couple of queued
+        # messages go out on different connections in parallel
+        limit = min(self.batch_size, 1 + self.queue.qsize() // self.pool_size)
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _deliver(self, conn, msg):
+        try:
+            conn.send(msg)
+        except CONNECTION_ERRORS:
+            self._count("retried")
+            conn.open()
+            conn.send(msg)
+
+    def _drain(self):
+        conn = SMTPConnection(**self.connection_args, on_reconnect=lambda: self._count("reconnects"))
+        while True:
+            for msg, future in self._next_batch():
+                if not future.set_running_or_notify_cancel():
+                    self._count("cancelled")
+                    continue
+                self.limiter.acquire()
+                try:
+                    self._deliver(conn, msg)
+                    self._count("sent")
+                    future.set_result(True)
+                except Exception as e:
+                    self._count("failed")
+                    conn.close()
+                    future.set_exception(e)
@@ -0,0 +1,182 @@
+"""
+Request and dependency latency metrics in Prometheus text format.
+
+Histograms are fixed-bucket counters, so recording a sample is a bisect and
+two additions under a per-series lock. Dependency spans (firestore, gcs, pdf,
+smtp) go to a histogram and, inside a request, to that request's breakdown,
+which becomes its Server-Timing header and the slow-request log line.
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+logger = logging.getLogger("ambu.metrics")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_METRIC = "ambu_http_request_duration_seconds"
+DEPENDENCY_METRIC = "ambu_dependency_duration_seconds"
+
+HELP = {
+    REQUEST_METRIC: "Time to response headers per route",
+    DEPENDENCY_METRIC: "Time spent in calls to external dependencies",
+}
+
+# Per-request {dependency: seconds}; a context variable so worker threads and
+# greenlets outside a request simply have none
+_spans = contextvars.ContextVar("metrics_spans", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None:
+            with self.lock:
+                hist = self.histograms.setdefault(key, Histogram())
+        return hist
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).observe(seconds)
+
+    def add_collector(self, fn, name=None, help=None, kind="gauge"):
+        """fn() -> [(labels dict, value)], sampled on every scrape"""
+        self.collectors.append((name, help, kind, fn))
+
+    def render(self):
+        lines = []
+        with self.lock:
+            series = sorted(self.histograms.items())
+        current = None
+        for (name, labels), hist in series:
+            if name != current:
+                current = name
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            counts, total = hist.snapshot()
+            cumulative = 0
+            for bound, count in zip(hist.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        for name, help, kind, fn in self.collectors:
+            try:
+                samples = fn()
+            except Exception:
+                logger.exception("metrics collector %s failed", name)
+                continue
+            lines.append(f"# HELP {name} {help or name}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+registry = Registry()
+
+
+@contextmanager
+def span(dependency):
+    """Time a call to an external dependency"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        registry.observe(DEPENDENCY_METRIC, elapsed, dependency=dependency)
+        spans = _spans.get()
+        if spans is not None:
+            spans[dependency] = spans.get(dependency, 0.0) + elapsed
+
+
+def timed(dependency):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(dependency):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_app(app, slow_ms=1000):
+    """
+    Time every request. Streaming responses are measured to their headers;
+    the body is sent after the response leaves Flask.
+    """
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _spans.set({})
+
+    @app.after_request
+    def _record(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        registry.observe(
+            REQUEST_METRIC, elapsed,
+            route=route, method=request.method, status=str(response.status_code)
+        )
+        spans = _spans.get() or {}
+        timing = [f"{dep};dur={secs * 1000:.1f}" for dep, secs in spans.items()]
+        timing.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(timing)
+        if elapsed * 1000 >= slow_ms:
+            breakdown = " ".join(f"{dep}={secs * 1000:.0f}ms" for dep, secs in spans.items())
+            logger.warning(
+                "slow request %s %s -> %s in %.0fms (%s)",
+                request.method, route, response.status_code, elapsed * 1000, breakdown or "no dependency calls"
+            )
+        return response
+
+    @app.teardown_request
+    def _reset(_exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            _spans.reset(token)
@@ -0,0 +1,293 @@
+"""
+Archive of closed orders in compressed segment files.
+
+A segment holds zlib-compressed order JSON records, then a columnar index
+(order ids, byte offsets and lengths, plus the summary fields listings
+need), then a fixed trailer pointing at that index:
+
+    [record]...[record][index][MAGIC | index offset | index length]
+
+Readers load only the trailer and index of each segment, once per process.
+A single order is then one range read (GCS) or an mmap slice (local files),
+and archived listings are answered from the indexes in memory.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from utils import metrics
+from utils.order_records import order_summary, check_filters
+
+JOB_KIND = "order_archive"
+
+MAGIC = b"AMBUARC1"
+TRAILER = struct.Struct(">8sQQ")
+CLOSED_STATUSES = ("DELIVERED", "ABORTED")
+MAX_SEGMENT_ORDERS = 5000
+
+
+def build_segment(orders):
+    """Segment bytes for a list of full orders"""
+    parts, offset = [], 0
+    columns = {"offset": [], "length": []}
+    for order in orders:
+        record = zlib.compress(json.dumps(order, separators=(",", ":")).encode("utf-8"), 6)
+        parts.append(record)
+        columns["offset"].append(offset)
+        columns["length"].append(len(record))
+        offset += len(record)
+        for key, value in order_summary(order).items():
+            columns.setdefault(key, []).append(value)
+    index = zlib.compress(json.dumps(columns, separators=(",", ":")).encode("utf-8"), 6)
+    parts.append(index)
+    parts.append(TRAILER.pack(MAGIC, offset, len(index)))
+    return b"".join(parts)
+
+
+def decode_record(data):
+    return json.loads(zlib.decompress(data))
+
+
+def read_index(read, size):
+    """Columns of a segment, given read(offset, length) and its size in bytes"""
+    magic, offset, length = TRAILER.unpack(read(size - TRAILER.size, TRAILER.size))
+    if magic != MAGIC:
+        raise ValueError("Not an order archive segment")
+    return json.loads(zlib.decompress(read(offset, length)))
+
+
+class GCSSegments:
+    """Segments as blobs under `prefix` in the orders bucket; reads are ranged"""
+
+    def __init__(self, get_bucket, prefix="order-archive/"):
+        self.get_bucket = get_bucket
+        self.prefix = prefix
+        self.key = ("gcs", prefix)
+
+    def list(self):
+        with metrics.span("gcs"):
+            return {
+                b.name[len(self.prefix):]: b.size
+                for b in self.get_bucket().list_blobs(prefix=self.prefix) if b.name.endswith(".seg")
+            }
+
+    def write(self, name, data):
+        with metrics.span("gcs"):
+            self.get_bucket().blob(self.prefix + name).upload_from_string(
+                data, content_type="application/octet-stream"
+            )
+
+    def read(self, name, offset, length):
+        with metrics.span("gcs"):
+            return self.get_bucket().blob(self.prefix + name).download_as_bytes(
+                start=offset, end=offset + length - 1
+            )
+
+    def read_all(self, name):
+        with metrics.span("gcs"):
+            return self.get_bucket().blob(self.prefix + name).download_as_bytes()
+
+
+class LocalSegments:
+    """Segments as files in a directory, read through shared mmaps"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.key = ("local", os.path.abspath(directory))
+        self._maps = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def list(self):
+        return {
+            name: os.path.getsize(os.path.join(self.directory, name))
+            for name in os.listdir(self.directory) if name.endswith(".seg")
+        }
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _map(self, name):
+        with self._lock:
+            m = self._maps.get(name)
+            if m is None:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    m = self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return m
+
+    def read(self, name, offset, length):
+        return self._map(name)[offset:offset + length]
+
+    def read_all(self, name):
+        return self._map(name)[:]
+
+
+class OrderArchive:
+    """
+    Lookup and listing over every segment. Segments are immutable; new ones
+    are picked up on the next refresh. If an order appears in several
+    segments (an interrupted archive run), the newest segment wins.
+    """
+
+    def __init__(self, segments, refresh_seconds=60):
+        self.segments = segments
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        self.loaded = []       # segment names, oldest first
+        self.entries = {}      # order_id -> (segment, offset, length, summary)
+        self.checked = None    # monotonic time of the last listing
+
+    def refresh(self, force=False, min_interval=5):
+        now = time.monotonic()
+        with self.lock:
+            if self.checked is not None:
+                age = now - self.checked
+                if age < (min_interval if force else self.refresh_seconds):
+                    return
+            self.checked = now
+            sizes = self.segments.list()
+            for name in sorted(set(sizes) - set(self.loaded)):
+                columns = read_index(lambda o, n: self.segments.read(name, o, n), sizes[name])
+                keys = [k for k in columns if k not in ("offset", "length")]
+                for i, oid in enumerate(columns["order_id"]):
+                    summary = {k: columns[k][i] for k in keys}
+                    self.entries[oid] = (name, columns["offset"][i], columns["length"][i], summary)
+                self.loaded.append(name)
+
+    def _locate(self, order_id):
+        self.refresh()
+        entry = self.entries.get(order_id)
+        if entry is None:
+            # It may have been archived by another instance since the last listing
+            self.refresh(force=True)
+            entry = self.entries.get(order_id)
+        return entry
+
+    def contains(self, order_id):
+        return self._locate(order_id) is not None
+
+    def get(self, order_id):
+        entry = self._locate(order_id)
+        if entry is None:
+            return None
+        name, offset, length, _ = entry
+        return decode_record(self.segments.read(name, offset, length))
+
+    def query(self, status=None, date_from=None, date_to=None, sort="created_at",
+              direction="desc", limit=50, cursor=None):
+        """Page of archived order summaries: (orders, next_cursor); same filters as OrderStore.query"""
+        check_filters(sort, date_from, date_to)
+        self.refresh()
+        rows = [
+            s for _, _, _, s in self.entries.values()
+            if (not status or s["status"] == status)
+            and (not date_from or s["created_at"] >= date_from)
+            and (not date_to or s["created_at"] < date_to)
+        ]
+        rows.sort(key=lambda s: (s[sort], s["order_id"]), reverse=direction != "asc")
+        start = int(cursor or 0)
+        page = rows[start:start + limit]
+        return page, (str(start + limit) if start + limit < len(rows) else None)
+
+    def iter_orders(self):
+        """Every archived order, one segment download at a time"""
+        self.refresh()
+        with self.lock:
+            current = {oid: entry[0] for oid, entry in self.entries.items()}
+            names = list(self.loaded)
+        for name in names:
+            data = self.segments.read_all(name)
+            columns = read_index(lambda o, n: data[o:o + n], len(data))
+            for oid, offset, length in zip(columns["order_id"], columns["offset"], columns["length"]):
+                if current.get(oid) == name:
+                    yield decode_record(data[offset:offset + length])
+
+    def write(self, orders):
+        """Store orders as a new segment; returns its name"""
+        # Names sort by creation time, which decides the winner for duplicates
+        now = time.time()
+        name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}.seg"
+        self.segments.write(name, build_segment(orders))
+        self.refresh(force=True, min_interval=0)
+        return name
+
+    def stats(self):
+        self.refresh()
+        with self.lock:
+            return {"segments": len(self.loaded), "orders": len(self.entries)}
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def archive_for(segments):
+    """One OrderArchive per segment location, shared by every store instance in the process"""
+    with _archives_lock:
+        if segments.key not in _archives:
+            _archives[segments.key] = OrderArchive(segments)
+        return _archives[segments.key]
+
+
+def archive_closed(store, older_than_days, statuses=CLOSED_STATUSES, dry_run=False):
+    """
+    Move closed orders created more than `older_than_days` ago into archive
+    segments of up to MAX_SEGMENT_ORDERS each, then drop their live copies
+    (PDFs are kept). Returns a report of what was (or would be) moved.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).strftime("%Y-%m-%dT%H:%M:%S")
+    ids = [s["order_id"] for status in statuses for s in store.iter_summaries(status=status, date_to=cutoff)]
+    report = {"cutoff": cutoff, "candidates": len(ids), "archived": 0, "segments": [], "dry_run": dry_run}
+    if dry_run:
+        return report
+
+    archive = store.archive
+    # Left live by an interrupted run: already safe in a segment
+    done = {oid for oid in ids if archive.contains(oid)}
+    for oid in done:
+        store.remove_live(oid)
+    ids = [oid for oid in ids if oid not in done]
+
+    for i in range(0, len(ids), MAX_SEGMENT_ORDERS):
+        chunk = ids[i:i + MAX_SEGMENT_ORDERS]
+        orders = [
+            order for _, order, error in store.get_many(chunk)
+            # Skip anything reopened since it was listed
+            if order is not None and error is None and order.get("status") in statuses
+        ]
+        if not orders:
+            continue
+        report["segments"].append(archive.write(orders))
+        for order in orders:
+            store.remove_live(order["order_id"])
+        report["archived"] += len(orders)
+    report["already_archived"] = len(done)
+    return report
+
+
+
+def register(queue, get_store):
+    def handle(payload):
+        report = archive_closed(get_store(), payload["older_than_days"])
+        print(f"Order archive: {report['archived']} archived into {report['segments']} "
+              f"({report['already_archived']} already archived, cutoff {report['cutoff']})")
+
+    queue.register(JOB_KIND, handle)
+
+
+def enqueue(queue, older_than_days):
+    """Queue an archive run; returns its job key"""
+    key = f"{older_than_days}:{uuid.uuid4().hex[:12]}"
+    queue.enqueue(JOB_KIND, key, {"older_than_days": older_than_days}, max_attempts=3)
+    return key
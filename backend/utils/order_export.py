@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import zlib
+
+from utils.order_records import order_summary, CHECKOUT_FIELDS
+
+SUMMARY_FIELDS = tuple(order_summary({"order_id": ""}))
+# Everything an export may ask for: summary fields, then what only full orders hold
+EXPORT_FIELDS = tuple(dict.fromkeys(SUMMARY_FIELDS + CHECKOUT_FIELDS + (
+    "items", "subtotal", "discount", "discount_type", "discount_value", "coupon_code",
+    "order_pdf", "pipeline_status", "emailed_admin", "emailed_customer",
+)))
+DEFAULT_FIELDS = ("order_id", "created_at", "status", "total", "customer_name", "customer_phone")
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+CHUNK_ORDERS = 64
+FLUSH_BYTES = 64 * 1024
+
+
+def parse_fields(value):
+    """Field list from a comma-separated fields= parameter; raises ValueError on unknown names"""
+    fields = [f.strip() for f in (value or "").split(",") if f.strip()] or list(DEFAULT_FIELDS)
+    unknown = [f for f in fields if f not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {list(EXPORT_FIELDS)}")
+    return fields
+
+
+def iter_orders(store, fields, **filters):
+    """
+    Yield orders matching the filters, newest first. Served from the order
+    summaries alone when every requested field is in them; otherwise full
+    orders are fetched a chunk at a time.
+    """
+    summaries = store.iter_summaries(**filters)
+    if set(fields) <= set(SUMMARY_FIELDS):
+        yield from summaries
+        return
+    chunk = []
+    for summary in summaries:
+        chunk.append(summary)
+        if len(chunk) >= CHUNK_ORDERS:
+            yield from _fetch_chunk(store, chunk)
+            chunk = []
+    if chunk:
+        yield from _fetch_chunk(store, chunk)
+
+
+def _fetch_chunk(store, summaries):
+    full = {
+        oid: order
+        for oid, order, _ in store.get_many([s["order_id"] for s in summaries])
+        if order is not None
+    }
+    for s in summaries:
+        # Fall back to the summary if the full order is gone or unreadable
+        yield full.get(s["order_id"], s)
+
+
+def _ndjson_lines(orders, fields):
+    for order in orders:
+        yield json.dumps({f: order.get(f) for f in fields}, default=str) + "\n"
+
+
+def _csv_lines(orders, fields):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    for order in orders:
+        writer.writerow([
+            json.dumps(v, default=str) if isinstance(v, (list, dict)) else v
+            for v in (order.get(f) for f in fields)
+        ])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def stream_export(store, fmt, fields, compress=False, **filters):
+    """Generator of encoded (optionally gzipped) export chunks of ~64 KiB"""
+    lines = (_ndjson_lines if fmt == "ndjson" else _csv_lines)(iter_orders(store, fields, **filters), fields)
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        if gz:
+            data = gz.compress(data)
+        if data:
+            pending.append(data)
+            size += len(data)
+        if size >= FLUSH_BYTES:
+            yield b"".join(pending)
+            pending, size = [], 0
+    if gz:
+        pending.append(gz.flush())
+    if pending:
+        yield b"".join(pending)
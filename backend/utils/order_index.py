@@ -0,0 +1,105 @@
+from google.cloud import firestore
+
+from clients import get_db
+from utils import metrics
+from utils.blob_fetch import fetch_orders, DEFAULT_WORKERS
+from utils.order_records import order_summary, check_filters
+
+
+def index_collection():
+    return get_db().collection("order_index")
+
+
+@metrics.timed("firestore")
+def index_order(order):
+    """Insert or replace the index record for an order"""
+    index_collection().document(order["order_id"]).set(order_summary(order))
+
+
+@metrics.timed("firestore")
+def index_orders(orders, batch_size=400):
+    """Replace the index records for many orders in batched writes"""
+    batch, pending = get_db().batch(), 0
+    for order in orders:
+        batch.set(index_collection().document(order["order_id"]), order_summary(order))
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch, pending = get_db().batch(), 0
+    if pending:
+        batch.commit()
+
+
+@metrics.timed("firestore")
+def remove_order(order_id):
+    index_collection().document(order_id).delete()
+
+
+@metrics.timed("firestore")
+def query_orders(status=None, date_from=None, date_to=None, sort="created_at",
+                 direction="desc", limit=50, cursor=None):
+    """
+    Page through indexed orders.
+    Returns (orders, next_cursor); next_cursor is the order_id to pass back
+    for the following page, or None on the last page. A cursor whose order
+    has since been deleted raises ValueError.
+    """
+    check_filters(sort, date_from, date_to)
+    q = index_collection()
+    if status:
+        q = q.where("status", "==", status)
+    if date_from:
+        q = q.where("created_at", ">=", date_from)
+    if date_to:
+        q = q.where("created_at", "<", date_to)
+    q = q.order_by(
+        sort,
+        direction=firestore.Query.ASCENDING if direction == "asc" else firestore.Query.DESCENDING
+    )
+    if cursor:
+        snap = index_collection().document(cursor).get()
+        if not snap.exists:
+            # Starting over would silently repeat the first page
+            raise ValueError("Invalid cursor: that order no longer exists")
+        q = q.start_after(snap)
+    docs = list(q.limit(limit + 1).stream())
+    orders = [d.to_dict() for d in docs[:limit]]
+    next_cursor = docs[limit - 1].id if len(docs) > limit else None
+    return orders, next_cursor
+
+
+def iter_orders(page_size=500, **filters):
+    """Yield every indexed order matching the filters, one page at a time"""
+    cursor = None
+    while True:
+        orders, cursor = query_orders(limit=page_size, cursor=cursor, **filters)
+        yield from orders
+        if not cursor:
+            return
+
+
+def rebuild_index(bucket, batch_size=400, max_workers=DEFAULT_WORKERS):
+    """
+    Backfill the index from every orders/*.json blob in the bucket.
+    Returns (indexed_count, errors) where errors maps blob name to message.
+    """
+    indexed = 0
+    errors = {}
+    batch = get_db().batch()
+    pending = 0
+    for name, order, error in fetch_orders(bucket, max_workers=max_workers):
+        if error is not None:
+            errors[name] = str(error)
+            continue
+        if not order.get("order_id"):
+            order["order_id"] = name[len("orders/"):-len(".json")]
+        batch.set(index_collection().document(order["order_id"]), order_summary(order))
+        pending += 1
+        indexed += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = get_db().batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return indexed, errors
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.pdf_utils import render_order_pdf
+from utils.email_utils import submit_order_email
+from utils.mail_transport import wait_or_cancel
+
+# Seconds to wait for the SMTP transport to deliver an order email
+EMAIL_TIMEOUT = 120
+
+JOB_KIND = "order_pipeline"
+
+# Order pipeline_status values, polled by the frontend
+QUEUED, DONE, FAILED = "QUEUED", "DONE", "FAILED"
+
+
+def process_order(store, order_id):
+    """
+    Render, upload and email the invoice for a stored order.
+    Each step records its result on the order so a retried job skips
+    the steps that already succeeded. Independent I/O overlaps: the order
+    update goes out while the PDF renders, and both emails send at once.
+    Results are patched onto the stored order with update_fields, never
+    written back whole, so admin status changes made meanwhile survive.
+    """
+    order = store.get(order_id)
+    if order is None:
+        raise LookupError(f"Order {order_id} not found")
+    if order.get("pipeline_status") == DONE:
+        return
+
+    pdf = store.get_pdf(order_id) if order.get("order_pdf") else None
+    if pdf is None:
+        # The URL is known before upload, so the order write runs alongside rendering;
+        # a retry re-renders if the PDF upload did not finish
+        order["order_pdf"] = store.pdf_url(order_id)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            saved = pool.submit(store.update_fields, order_id, {"order_pdf": order["order_pdf"]})
+            pdf = render_order_pdf(order)
+            store.put_pdf(order_id, pdf)
+            saved.result()
+
+    sends = {}
+    if not order.get("emailed_admin"):
+        sends["emailed_admin"] = submit_order_email(order, pdf)
+    if order.get("customer_email") and not order.get("emailed_customer"):
+        sends["emailed_customer"] = submit_order_email(
+            order, pdf, recipient=order["customer_email"], is_customer=True
+        )
+    sent, failed = {}, []
+    for flag, future in sends.items():
+        try:
+            # A timed-out email still queued is withdrawn, so the job retry is its only copy
+            wait_or_cancel(future, EMAIL_TIMEOUT)
+            sent[flag] = True
+        except Exception as e:
+            print(f"Order {order_id} {flag} failed: {e}")
+            failed.append(flag)
+    if failed:
+        # Record the email that did go out so the retry only resends the other
+        if sent:
+            store.update_fields(order_id, sent)
+        raise RuntimeError(f"Email failed: {', '.join(failed)}")
+
+    store.update_fields(order_id, {**sent, "pipeline_status": DONE})
+
+
+def mark_failed(store, order_id, error):
+    store.update_fields(order_id, {"pipeline_status": FAILED, "pipeline_error": str(error)})
+
+
+def register(queue, get_store):
+    """Register the pipeline handler; the store is resolved when a job runs"""
+    queue.register(
+        JOB_KIND,
+        lambda payload: process_order(get_store(), payload["order_id"]),
+        on_failure=lambda payload, error: mark_failed(get_store(), payload["order_id"], error)
+    )
+
+
+def enqueue(queue, order_id):
+    return queue.enqueue(JOB_KIND, order_id, {"order_id": order_id})
@@ -0,0 +1,73 @@
+"""Order record helpers shared by every order store backend"""
+
+STATUSES = ("NOT_ENQUIRED", "IN_PROGRESS", "DELIVERED", "ABORTED")
+SORT_FIELDS = ("created_at", "total")
+SUMMARY_ITEM_FIELDS = ("id", "name", "mrp", "price", "quantity")
+# The only order fields a checkout takes from the client; pricing and
+# pipeline state are always set by the server
+CHECKOUT_FIELDS = ("customer_name", "customer_email", "customer_phone", "customer_address")
+MAX_BULK_STATUS = 1000
+
+# Allowed status changes. DELIVERED -> IN_PROGRESS and ABORTED -> NOT_ENQUIRED
+# undo a mistaken update; setting the current status again is always a no-op.
+TRANSITIONS = {
+    "NOT_ENQUIRED": ("IN_PROGRESS", "DELIVERED", "ABORTED"),
+    "IN_PROGRESS": ("NOT_ENQUIRED", "DELIVERED", "ABORTED"),
+    "DELIVERED": ("IN_PROGRESS",),
+    "ABORTED": ("NOT_ENQUIRED",),
+}
+
+
+class StatusConflict(Exception):
+    """A status change not allowed from the order's current status"""
+
+    def __init__(self, order_id, current, requested):
+        super().__init__(f"Order {order_id} is {current}; cannot move to {requested}")
+        self.order_id = order_id
+        self.current = current
+        self.requested = requested
+
+
+def check_transition(order_id, current, new_status, expected=None):
+    """
+    Raise StatusConflict unless current -> new_status is allowed (and, when
+    `expected` is given, the order is still in that status)
+    """
+    current = current or "NOT_ENQUIRED"
+    if expected and current != expected:
+        raise StatusConflict(order_id, current, new_status)
+    if current != new_status and new_status not in TRANSITIONS.get(current, ()):
+        raise StatusConflict(order_id, current, new_status)
+
+
+def allowed_from(new_status):
+    """Statuses an order may be in for new_status to be applied"""
+    return [s for s in STATUSES if s == new_status or new_status in TRANSITIONS[s]]
+
+
+def order_summary(order):
+    """Build the compact index record for an order"""
+    return {
+        "order_id": order["order_id"],
+        "created_at": order.get("created_at", ""),
+        "status": order.get("status") or "NOT_ENQUIRED",
+        "total": float(order.get("total") or 0),
+        "customer_name": order.get("customer_name", ""),
+        "customer_phone": order.get("customer_phone", ""),
+        "customer_email": order.get("customer_email", ""),
+        "customer_address": order.get("customer_address", ""),
+        "order_pdf": order.get("order_pdf"),
+        "items": [
+            {k: item.get(k) for k in SUMMARY_ITEM_FIELDS}
+            for item in order.get("items") or []
+        ],
+    }
+
+
+def check_filters(sort="created_at", date_from=None, date_to=None):
+    """Raise ValueError for filter combinations the index cannot serve"""
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Invalid sort. Allowed: {list(SORT_FIELDS)}")
+    # Firestore requires the first order_by to match a range filter field
+    if (date_from or date_to) and sort != "created_at":
+        raise ValueError("Date filters can only be combined with sort=created_at")
@@ -0,0 +1,440 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.order_records import order_summary, check_filters, check_transition, allowed_from, StatusConflict
+from utils.sqlite_utils import connect
+from utils import metrics
+from utils.blob_fetch import DEFAULT_WORKERS
+from utils.order_archive import archive_for, GCSSegments, LocalSegments
+
+# Fields update_fields may not set: identity, listing keys, and the status state machine
+FIXED_FIELDS = ("order_id", "created_at", "status", "total")
+
+
+def _check_patch(fields):
+    fixed = [k for k in FIXED_FIELDS if k in fields]
+    if fixed:
+        raise ValueError(f"update_fields cannot change {fixed}")
+
+
+class OrderStore:
+    """
+    Where orders and their invoice PDFs live. Listing returns the compact
+    summaries from utils.order_records; get/get_many return full orders,
+    falling back to the read-only archive (utils.order_archive).
+    """
+
+    archive = None
+
+    def put(self, order):
+        """Create or replace an order (and its listing entry)"""
+        raise NotImplementedError
+
+    def get(self, order_id):
+        """The full order, or None"""
+        raise NotImplementedError
+
+    def get_many(self, order_ids):
+        """Yield (order_id, order, error) for each id; order is None when missing"""
+        for oid in order_ids:
+            try:
+                yield oid, self.get(oid), None
+            except Exception as e:
+                yield oid, None, e
+
+    def delete(self, order_id):
+        """Delete an order; returns False if it did not exist"""
+        raise NotImplementedError
+
+    def remove_live(self, order_id):
+        """Drop the live record and listing entry of an archived order, keeping its PDF"""
+        raise NotImplementedError
+
+    def is_archived(self, order_id):
+        return self.archive is not None and self.archive.contains(order_id)
+
+    def query_archived(self, **kwargs):
+        """Page of archived order summaries, with the same filters as query()"""
+        return self.archive.query(**kwargs)
+
+    def update_status(self, order_id, status, expected=None):
+        """
+        Move an order to `status` with a single conditional write. Returns the
+        updated order, or None if it does not exist. Raises StatusConflict if
+        the transition is not allowed or the order is no longer in `expected`.
+        """
+        raise NotImplementedError
+
+    def update_fields(self, order_id, fields):
+        """
+        Set `fields` on the stored order without touching anything else, with
+        the same conditional write as update_status. For background writers
+        (the invoice pipeline) that must not put back a stale status.
+        Returns the updated order, or None if there is no live order.
+        """
+        raise NotImplementedError
+
+    def update_statuses(self, order_ids, status, expected=None):
+        """update_status for many orders: a list of (order_id, order, error)"""
+        results = []
+        for oid in order_ids:
+            try:
+                results.append((oid, self.update_status(oid, status, expected), None))
+            except Exception as e:
+                results.append((oid, None, e))
+        return results
+
+    def query(self, status=None, date_from=None, date_to=None, sort="created_at",
+              direction="desc", limit=50, cursor=None):
+        """Page of order summaries: (orders, next_cursor)"""
+        raise NotImplementedError
+
+    def iter_summaries(self, page_size=500, **filters):
+        cursor = None
+        while True:
+            orders, cursor = self.query(limit=page_size, cursor=cursor, **filters)
+            yield from orders
+            if not cursor:
+                return
+
+    def pdf_url(self, order_id):
+        """URL the order's invoice PDF will be served from, without any I/O"""
+        raise NotImplementedError
+
+    def put_pdf(self, order_id, pdf):
+        """Store an invoice PDF; returns pdf_url(order_id)"""
+        raise NotImplementedError
+
+    def get_pdf(self, order_id):
+        """Invoice PDF bytes, or None"""
+        raise NotImplementedError
+
+    def get_pdfs(self, order_ids):
+        """Yield (order_id, pdf_bytes or None)"""
+        for oid in order_ids:
+            yield oid, self.get_pdf(oid)
+
+
+class GCSOrderStore(OrderStore):
+    """orders/{id}.json and pdf/{id}.pdf blobs, listed through the Firestore order index"""
+
+    # Re-reads allowed when another writer changes the order between our read and write
+    WRITE_ATTEMPTS = 5
+
+    def __init__(self, get_bucket):
+        self.get_bucket = get_bucket
+        self.archive = archive_for(GCSSegments(get_bucket))
+
+    def _blob(self, order_id):
+        return self.get_bucket().blob(f"orders/{order_id}.json")
+
+    def put(self, order):
+        from utils import order_index
+
+        with metrics.span("gcs"):
+            self._blob(order["order_id"]).upload_from_string(
+                json.dumps(order),
+                content_type='application/json'
+            )
+        order_index.index_order(order)
+
+    def get(self, order_id):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            with metrics.span("gcs"):
+                return json.loads(self._blob(order_id).download_as_bytes())
+        except NotFound:
+            return self.archive.get(order_id)
+
+    def get_many(self, order_ids):
+        from google.api_core.exceptions import NotFound
+        from utils.blob_fetch import fetch_orders_by_id
+
+        for name, order, error in fetch_orders_by_id(self.get_bucket(), order_ids):
+            oid = name[len("orders/"):-len(".json")]
+            if isinstance(error, NotFound):
+                yield oid, self.archive.get(oid), None
+            else:
+                yield oid, order, error
+
+    def delete(self, order_id):
+        from utils import order_index
+
+        blob = self._blob(order_id)
+        with metrics.span("gcs"):
+            if not blob.exists():
+                return False
+            blob.delete()
+        order_index.remove_order(order_id)
+        return True
+
+    def remove_live(self, order_id):
+        from google.api_core.exceptions import NotFound
+        from utils import order_index
+
+        try:
+            with metrics.span("gcs"):
+                self._blob(order_id).delete()
+        except NotFound:
+            pass
+        order_index.remove_order(order_id)
+
+    def _rewrite(self, order_id, change):
+        """
+        Apply change(order) -> bool and rewrite the order JSON only if its
+        generation is unchanged since we read it; on a conflict, re-read and
+        apply again. Returns (order, changed); the index is left to the caller.
+        """
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        for _ in range(self.WRITE_ATTEMPTS):
+            blob = self._blob(order_id)
+            try:
+                # The download response carries the generation we condition on
+                with metrics.span("gcs"):
+                    order = json.loads(blob.download_as_bytes())
+            except NotFound:
+                return None, False
+            if not change(order):
+                return order, False
+            try:
+                with metrics.span("gcs"):
+                    blob.upload_from_string(
+                        json.dumps(order),
+                        content_type='application/json',
+                        if_generation_match=blob.generation
+                    )
+            except PreconditionFailed:
+                continue
+            return order, True
+        raise RuntimeError(f"Order {order_id} kept changing; gave up after {self.WRITE_ATTEMPTS} attempts")
+
+    def _set_status(self, order_id, status, expected):
+        def change(order):
+            check_transition(order_id, order.get("status"), status, expected)
+            if order.get("status") == status:
+                return False
+            order["status"] = status
+            return True
+
+        return self._rewrite(order_id, change)
+
+    def update_fields(self, order_id, fields):
+        from utils import order_index
+
+        _check_patch(fields)
+
+        def change(order):
+            if all(order.get(k) == v for k, v in fields.items()):
+                return False
+            order.update(fields)
+            return True
+
+        order, changed = self._rewrite(order_id, change)
+        if changed and not fields.keys().isdisjoint(order_summary(order)):
+            order_index.index_order(order)
+        return order
+
+    def update_status(self, order_id, status, expected=None):
+        from utils import order_index
+
+        order, changed = self._set_status(order_id, status, expected)
+        if changed:
+            order_index.index_order(order)
+        return order
+
+    def update_statuses(self, order_ids, status, expected=None, max_workers=DEFAULT_WORKERS):
+        from utils import order_index
+
+        def _one(oid):
+            try:
+                return (oid, *self._set_status(oid, status, expected)), None
+            except Exception as e:
+                return (oid, None, False), e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            outcomes = list(pool.map(_one, order_ids))
+        order_index.index_orders(order for (_, order, changed), _ in outcomes if changed)
+        return [(oid, order, error) for (oid, order, _), error in outcomes]
+
+    def query(self, **kwargs):
+        from utils import order_index
+
+        return order_index.query_orders(**kwargs)
+
+    def pdf_url(self, order_id):
+        return self.get_bucket().blob(f"pdf/{order_id}.pdf").public_url
+
+    def put_pdf(self, order_id, pdf):
+        blob = self.get_bucket().blob(f"pdf/{order_id}.pdf")
+        with metrics.span("gcs"):
+            blob.upload_from_string(pdf, content_type="application/pdf")
+        return blob.public_url
+
+    def get_pdf(self, order_id):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            with metrics.span("gcs"):
+                return self.get_bucket().blob(f"pdf/{order_id}.pdf").download_as_bytes()
+        except NotFound:
+            return None
+
+    def get_pdfs(self, order_ids):
+        from utils.blob_fetch import fetch_blobs
+
+        blobs = [self.get_bucket().blob(f"pdf/{oid}.pdf") for oid in order_ids]
+        for name, data, error in fetch_blobs(blobs):
+            yield name[len("pdf/"):-len(".pdf")], (data if error is None else None)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_created ON orders (created_at, order_id);
+CREATE INDEX IF NOT EXISTS orders_status_created ON orders (status, created_at, order_id);
+CREATE INDEX IF NOT EXISTS orders_total ON orders (total, order_id);
+"""
+
+
+class SQLiteOrderStore(OrderStore):
+    """
+    Orders in one SQLite file (WAL mode) with indexes for status/date/total
+    queries; PDFs as files in pdf_dir. For offline load tests and small
+    single-instance deployments.
+    """
+
+    def __init__(self, path, pdf_dir, archive_dir, pdf_url_prefix="/api/admin/orders"):
+        self.path = path
+        self.pdf_dir = pdf_dir
+        self.archive = archive_for(LocalSegments(archive_dir))
+        self.pdf_url_prefix = pdf_url_prefix
+        self.local = threading.local()
+        os.makedirs(pdf_dir, exist_ok=True)
+        self._conn().executescript(SQLITE_SCHEMA)
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections are not thread-safe
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = connect(self.path)
+        return conn
+
+    def put(self, order):
+        s = order_summary(order)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO orders (order_id, created_at, status, total, data) VALUES (?, ?, ?, ?, ?)",
+            (s["order_id"], s["created_at"], s["status"], s["total"], json.dumps(order))
+        )
+
+    def get(self, order_id):
+        row = self._conn().execute("SELECT data FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        return json.loads(row["data"]) if row else self.archive.get(order_id)
+
+    def delete(self, order_id):
+        cur = self._conn().execute("DELETE FROM orders WHERE order_id = ?", (order_id,))
+        try:
+            os.remove(self._pdf_path(order_id))
+        except FileNotFoundError:
+            pass
+        return cur.rowcount == 1
+
+    def remove_live(self, order_id):
+        self._conn().execute("DELETE FROM orders WHERE order_id = ?", (order_id,))
+
+    def update_status(self, order_id, status, expected=None):
+        conn = self._conn()
+        allowed = [s for s in allowed_from(status) if not expected or s == expected]
+        if allowed:
+            # Check-and-set in one statement: the WHERE clause is the state machine
+            row = conn.execute(
+                "UPDATE orders SET status = ?, data = json_set(data, '$.status', ?) "
+                f"WHERE order_id = ? AND status IN ({', '.join('?' * len(allowed))}) RETURNING data",
+                [status, status, order_id, *allowed]
+            ).fetchone()
+            if row:
+                return json.loads(row["data"])
+        row = conn.execute("SELECT status FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        if row is None:
+            return None
+        raise StatusConflict(order_id, row["status"], status)
+
+    def update_fields(self, order_id, fields):
+        _check_patch(fields)
+        # One statement: the rest of the row is never rewritten from a stale copy
+        paths = ", ".join("?, json(?)" for _ in fields)
+        params = [p for k, v in fields.items() for p in (f'$."{k}"', json.dumps(v))]
+        row = self._conn().execute(
+            f"UPDATE orders SET data = json_set(data, {paths}) WHERE order_id = ? RETURNING data",
+            params + [order_id]
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def update_statuses(self, order_ids, status, expected=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = super().update_statuses(order_ids, status, expected)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return results
+
+    def query(self, status=None, date_from=None, date_to=None, sort="created_at",
+              direction="desc", limit=50, cursor=None):
+        check_filters(sort, date_from, date_to)
+        where, params = [], []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if date_from:
+            where.append("created_at >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("created_at < ?")
+            params.append(date_to)
+        op, order = (">", "ASC") if direction == "asc" else ("<", "DESC")
+        if cursor:
+            row = self._conn().execute(f"SELECT {sort} FROM orders WHERE order_id = ?", (cursor,)).fetchone()
+            if not row:
+                raise ValueError("Invalid cursor: that order no longer exists")
+            # Keyset pagination on (sort value, order_id)
+            where.append(f"({sort}, order_id) {op} (?, ?)")
+            params.extend([row[0], cursor])
+        sql = "SELECT data FROM orders"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {sort} {order}, order_id {order} LIMIT ?"
+        rows = self._conn().execute(sql, params + [limit + 1]).fetchall()
+        orders = [order_summary(json.loads(r["data"])) for r in rows[:limit]]
+        next_cursor = orders[-1]["order_id"] if len(rows) > limit else None
+        return orders, next_cursor
+
+    def _pdf_path(self, order_id):
+        return os.path.join(self.pdf_dir, f"{os.path.basename(order_id)}.pdf")
+
+    def put_pdf(self, order_id, pdf):
+        tmp = self._pdf_path(order_id) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, self._pdf_path(order_id))
+        return self.pdf_url(order_id)
+
+    def pdf_url(self, order_id):
+        return f"{self.pdf_url_prefix}/{order_id}/invoice.pdf"
+
+    def get_pdf(self, order_id):
+        try:
+            with open(self._pdf_path(order_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
@@ -1,14 +1,62 @@
+import threading
+import time
 
-from db import db
+from clients import get_db
+from config import VOUCHER_CACHE_TTL
+from utils import metrics
+from utils.pricing import voucher_terms
+
+
+def voucher_collection():
+    return get_db().collection("voucher")
+
+
+class VoucherTable:
+    """
+    All vouchers held in memory, loaded with one bulk read. A missing code
+    is answered from the table too, so invalid guesses never reach Firestore.
+    Refreshed on voucher create/delete in this process, or after the TTL.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.vouchers = None
+        self.loaded_at = 0
+
+    def _stale(self):
+        return self.vouchers is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def _load(self):
+        try:
+            with metrics.span("firestore"):
+                self.vouchers = {doc.id: doc.to_dict() for doc in voucher_collection().stream()}
+            self.loaded_at = time.monotonic()
+        except Exception as e:
+            if self.vouchers is None:
+                raise
+            # Keep serving the previous table; retry on the next TTL expiry
+            print(f"Voucher refresh failed, serving cached table: {e}")
+            self.loaded_at = time.monotonic()
+
+    def get(self, code):
+        if self._stale():
+            with self.lock:
+                if self._stale():
+                    self._load()
+        return self.vouchers.get(code)
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = 0
+
+
+voucher_table = VoucherTable(ttl=VOUCHER_CACHE_TTL)
 
-voucher_collection = db.collection("voucher")
 
 def get_voucher_by_code(code: str):
-    """Fetch a voucher from Firestore by its code"""
-    doc_ref = voucher_collection.document(code).get()
-    if doc_ref.exists:
-        return doc_ref.to_dict()
-    return None
+    """Look up a voucher by its code in the in-memory voucher table"""
+    return voucher_table.get(code)
 
 def validate_coupon(coupon_code):
     coupon_code = coupon_code.strip()
@@ -16,9 +64,12 @@ def validate_coupon(coupon_code):
     voucher = get_voucher_by_code(coupon_code)
 
     if voucher:
+        # The cart needs the type to preview the same discount checkout applies
+        discount_type, discount_value = voucher_terms(voucher)
         return {
             "valid": True,
-            "discount_value": voucher["discount_value"]
+            "discount_type": discount_type,
+            "discount_value": discount_value
         }
     else:
-        return {"valid": False, "error": "Invalid coupon code"}
\ No newline at end of file
+        return {"valid": False, "error": "Invalid coupon code"}
@@ -1,18 +1,136 @@
+import functools
+import hashlib
+import json
 from io import BytesIO
 from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 
-def render_order_pdf(order):
-    buf = BytesIO()
-    p = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
-    y = h - 40
-    
+from utils import metrics
+from utils.ttl_cache import TTLCache
+
+W, H = A4
+LEFT, RIGHT = 40, 550
+ROW_HEIGHT = 14
+BOTTOM_MARGIN = 120  # Leave space for the totals section
+
+# Item columns: (x, right aligned)
+COL_NAME, COL_QTY, COL_MRP, COL_PRICE, COL_AMOUNT = 40, 330, 400, 480, 550
+
+# Static table header, laid out once at import: (font, size, x, text)
+TABLE_HEADER = [
+    ("Helvetica-Bold", 11, 40, "Product"),
+    ("Helvetica-Bold", 11, 300, "Qty"),
+    ("Helvetica-Bold", 11, 350, "MRP"),
+    ("Helvetica-Bold", 11, 430, "Ambu Price"),
+    ("Helvetica-Bold", 11, 510, "Amount"),
+]
+TABLE_HEADER_HEIGHT = 26
+TABLE_HEADER_FORM = "table_header"
+
+# Fields that change the rendered invoice; anything else is ignored by the cache key
+RENDER_FIELDS = (
+    "order_id", "customer_name", "customer_email", "customer_phone",
+    "customer_address", "items", "total", "coupon_code",
+    "subtotal", "discount", "discount_type", "discount_value",
+)
+
+pdf_cache = TTLCache(maxsize=256, ttl=3600)
+
+
+def order_render_key(order):
+    """Content hash of everything that affects the rendered PDF"""
+    payload = json.dumps({k: order.get(k) for k in RENDER_FIELDS}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _table_header_ops():
+    """PDF operators for the table header, built once per process"""
+    scratch = canvas.Canvas(BytesIO(), pagesize=A4)
+    text = scratch.beginText()
+    for font, size, x, label in TABLE_HEADER:
+        text.setFont(font, size)
+        text.setTextOrigin(x, TABLE_HEADER_HEIGHT - 11)
+        text.textOut(label)
+    return f"{text.getCode()} {LEFT} 3 m {RIGHT} 3 l S"
+
+
+def _define_template(p):
+    """
+    Table header as a form XObject: written once per PDF, referenced on every
+    page. Form objects belong to a single document, so each canvas gets its
+    own copy of the cached operators.
+    """
+    p.beginForm(TABLE_HEADER_FORM)
+    # Register the header fonts in the same order as the scratch canvas so
+    # the cached /F<n> resource names resolve; must run before other drawing
+    for font, size, _, _ in TABLE_HEADER:
+        p.setFont(font, size)
+    p.addLiteral(_table_header_ops())
+    p.endForm()
+
+
+def _draw_table_header(p, y):
+    p.saveState()
+    p.translate(0, y - TABLE_HEADER_HEIGHT + 11)
+    p.doForm(TABLE_HEADER_FORM)
+    p.restoreState()
+    return y - TABLE_HEADER_HEIGHT
+
+
+@functools.lru_cache(maxsize=4096)
+def _row_width(text):
+    # Amount/price strings repeat across rows and orders; measure each once
+    return stringWidth(text, "Helvetica", 10)
+
+
+def _right(text, x):
+    return x - _row_width(text), text
+
+
+def _draw_rows(p, items, y):
+    """
+    Draw item rows, repeating the table header after each page break.
+    Returns (subtotal, y).
+    """
+    subtotal = 0
+    p.setFont("Helvetica", 10)
+    for i, item in enumerate(items):
+        # Break before a row rather than after one, so a full last page
+        # doesn't leave an empty header page behind it
+        if i and y < BOTTOM_MARGIN:
+            p.showPage()
+            y = _draw_table_header(p, H - 40)
+            p.setFont("Helvetica", 10)
+
+        qty = int(item.get("quantity", 1))
+        mrp = float(item.get("mrp", 0))
+        price = float(item.get("price", 0))
+        amt = qty * price
+        subtotal += amt
+
+        cells = [
+            (COL_NAME, str(item.get("name", "Item"))[:38]),
+            _right(str(qty), COL_QTY),
+            _right(f"Rs.{mrp:.2f}", COL_MRP),
+            _right(f"Rs.{price:.2f}", COL_PRICE),
+            _right(f"Rs.{amt:.2f}", COL_AMOUNT),
+        ]
+        for x, text in cells:
+            p.drawString(x, y, text)
+        y -= ROW_HEIGHT
+    return subtotal, y
+
+
+def _draw_order(p, order):
+    y = H - 40
+
     # Header
     p.setFont("Helvetica-Bold", 16)
     p.drawString(40, y, f"AmbuCrackers Invoice #{order.get('order_id', 'N/A')}")
     y -= 22
-    
+
     # Customer Info
     p.setFont("Helvetica", 10)
     p.drawString(40, y, f"Name: {order.get('customer_name', 'N/A')}")
@@ -21,81 +139,88 @@ def render_order_pdf(order):
     y -= 14
     p.drawString(40, y, f"Address: {order.get('customer_address', 'N/A')}")
     y -= 20
-    
-    # Table Header
-    p.setFont("Helvetica-Bold", 11)
-    p.drawString(40, y, "Product")
-    p.drawString(300, y, "Qty")
-    p.drawString(350, y, "MRP")
-    p.drawString(430, y, "Ambu Price")
-    p.drawString(510, y, "Amount")
-    y -= 12
-    p.line(40, y, 550, y)
-    y -= 14
-    
-    # Items
-    p.setFont("Helvetica", 10)
-    subtotal = 0
-    for item in order.get("items", []):
-        qty = int(item.get("quantity", 1))
-        mrp = float(item.get("mrp", 0))
-        price = float(item.get("price", 0))
-        amt = qty * price
-        subtotal += amt
-        
-        p.drawString(40, y, item.get("name", "Item")[:38])
-        p.drawRightString(330, y, str(qty))
-        p.drawRightString(400, y, f"Rs.{mrp:.2f}")
-        p.drawRightString(480, y, f"Rs.{price:.2f}")
-        p.drawRightString(550, y, f"Rs.{amt:.2f}")
-        y -= 14
-        
-        if y < 120:  # Leave more space for totals section
-            p.showPage()
-            y = h - 60
-    
+
+    y = _draw_table_header(p, y)
+    subtotal, y = _draw_rows(p, order.get("items", []), y)
+
     # Totals section
     y -= 6
     p.line(40, y, 550, y)
     y -= 18
-    
+
+    # Orders priced on the server carry their own discount breakdown;
+    # older orders only have the discounted total
+    if "discount" in order:
+        final_total = float(order["total"])
+        discount_amount = float(order["discount"])
+        subtotal = float(order.get("subtotal", subtotal))
+        if order.get("discount_type") == "flat":
+            discount_label = "Discount (flat):"
+        else:
+            discount_label = f"Discount ({float(order.get('discount_value') or 0):.0f}% off):"
+    else:
+        final_total = float(order.get('total', subtotal))
+        discount_amount = max(subtotal - final_total, 0)
+        discount_percentage = (discount_amount / subtotal) * 100 if subtotal > 0 else 0
+        discount_label = f"Discount ({discount_percentage:.0f}% off):"
+
     # Show subtotal
     p.setFont("Helvetica", 11)
     p.drawRightString(480, y, "Subtotal:")
     p.drawRightString(550, y, f"Rs.{subtotal:.2f}")
     y -= 16
-    
-    # Get the final total from order (which includes discount)
-    final_total = float(order.get('total', subtotal))
-    
+
     # Show discount if applicable (when coupon was applied)
-    if final_total < subtotal:
-        discount_amount = subtotal - final_total
-        discount_percentage = (discount_amount / subtotal) * 100 if subtotal > 0 else 0
-        
+    if discount_amount > 0:
         p.setFont("Helvetica", 10)
-        p.drawRightString(480, y, f"Discount ({discount_percentage:.0f}% off):")
+        p.drawRightString(480, y, discount_label)
         p.drawRightString(550, y, f"-Rs.{discount_amount:.2f}")
         y -= 16
-        
+
         # Show coupon code if available
         coupon_code = order.get('coupon_code')
         if coupon_code and coupon_code.strip():
             p.setFont("Helvetica", 9)
             p.drawRightString(480, y, f"Coupon: {coupon_code}")
             y -= 14
-    
+
     # Final total
     p.setFont("Helvetica-Bold", 12)
     p.drawRightString(480, y, "Total:")
     p.drawRightString(550, y, f"Rs.{final_total:.2f}")
-    
+
     # Add a note if discount was applied
-    if final_total < subtotal:
+    if discount_amount > 0:
         y -= 20
         p.setFont("Helvetica", 9)
-        p.drawString(40, y, f"You saved Rs.{subtotal - final_total:.2f} with your coupon!")
-    
+        p.drawString(40, y, f"You saved Rs.{discount_amount:.2f} with your coupon!")
+
     p.showPage()
-    p.save()
-    return buf.getvalue()
\ No newline at end of file
+
+
+def render_order_pdf(order, out=None, use_cache=True):
+    """
+    Render the invoice PDF for an order.
+    Returns the PDF bytes, or writes them to `out` (a binary file-like) when
+    given. Unchanged orders are served from an in-memory cache keyed by
+    content hash.
+    """
+    key = order_render_key(order) if use_cache else None
+    pdf = pdf_cache.get(key) if key else None
+    if pdf is None:
+        buf = out if (out is not None and not use_cache) else BytesIO()
+        # invariant=1 drops timestamps/ids so identical orders give identical bytes
+        with metrics.span("pdf"):
+            p = canvas.Canvas(buf, pagesize=A4, invariant=1)
+            _define_template(p)
+            _draw_order(p, order)
+            p.save()
+        if buf is out:
+            return None
+        pdf = buf.getvalue()
+        if key:
+            pdf_cache.set(key, pdf)
+    if out is not None:
+        out.write(pdf)
+        return None
+    return pdf
@@ -0,0 +1,140 @@
+"""
+Server-side order pricing.
+
+All arithmetic is done in integer paise so the single-order path and the
+vectorised batch path produce identical totals:
+  line amount = price_paise * quantity
+  percentage  = floor(subtotal * value / 100 + 0.5)   (round half up)
+  flat        = min(value_paise, subtotal)
+"""
+import math
+
+
+class PricingError(ValueError):
+    pass
+
+
+def to_paise(amount):
+    return int(math.floor(float(amount) * 100 + 0.5))
+
+
+def from_paise(paise):
+    return round(paise / 100, 2)
+
+
+def voucher_terms(voucher):
+    """(discount_type, discount_value) for a voucher dict, or (None, 0)"""
+    if not voucher:
+        return None, 0
+    # Vouchers created before discount_type existed were always percentages
+    return voucher.get("discount_type") or "percentage", float(voucher.get("discount_value") or 0)
+
+
+def discount_paise(subtotal, discount_type, discount_value):
+    if discount_type == "percentage":
+        return min(int(math.floor(subtotal * discount_value / 100 + 0.5)), subtotal)
+    if discount_type == "flat":
+        return min(to_paise(discount_value), subtotal)
+    return 0
+
+
+def price_order(items, catalog, voucher=None, coupon_code=None):
+    """
+    Price a cart from catalog prices, ignoring client-sent prices and totals.
+    `catalog` maps product id -> product dict. Raises PricingError for unknown
+    products or bad quantities.
+    """
+    if not items:
+        raise PricingError("Order has no items")
+    if not isinstance(items, list) or not all(isinstance(i, dict) and isinstance(i.get("id"), str) for i in items):
+        raise PricingError("items must be a list of {id, quantity} objects")
+    lines = []
+    subtotal = 0
+    unknown = []
+    for item in items:
+        product = catalog.get(item.get("id"))
+        if product is None:
+            unknown.append(str(item.get("id")))
+            continue
+        try:
+            qty = int(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            raise PricingError(f"Invalid quantity for {item.get('id')}")
+        if qty < 1:
+            raise PricingError(f"Invalid quantity for {item.get('id')}")
+        price = to_paise(product.get("price") or 0)
+        amount = price * qty
+        subtotal += amount
+        lines.append({
+            "id": item["id"],
+            "name": product.get("name", ""),
+            "mrp": float(product.get("mrp") or 0),
+            "price": from_paise(price),
+            "quantity": qty,
+            "amount": from_paise(amount),
+        })
+    if unknown:
+        raise PricingError(f"Unknown or inactive products: {', '.join(unknown)}")
+
+    discount_type, discount_value = voucher_terms(voucher)
+    discount = discount_paise(subtotal, discount_type, discount_value)
+    return {
+        "items": lines,
+        "subtotal": from_paise(subtotal),
+        "discount": from_paise(discount),
+        "discount_type": discount_type,
+        "discount_value": discount_value,
+        "coupon_code": coupon_code if voucher else None,
+        "total": from_paise(subtotal - discount),
+    }
+
+
+def price_batch(carts, catalog, vouchers=None):
+    """
+    Reprice many carts at once, for reports and audits.
+    carts: [{"items": [{"id", "quantity"}], "coupon_code": str|None}]
+    vouchers: code -> voucher dict. Unknown products price at 0.
+    Returns numpy float arrays {"subtotal", "discount", "total"} in rupees,
+    one entry per cart.
+    """
+    import numpy as np
+
+    vouchers = vouchers or {}
+    product_ids = list(catalog)
+    id_pos = {pid: i for i, pid in enumerate(product_ids)}
+    # Index 0 is a sentinel price for unknown products
+    price_table = np.zeros(len(product_ids) + 1, dtype=np.int64)
+    for pid, i in id_pos.items():
+        price_table[i + 1] = to_paise(catalog[pid].get("price") or 0)
+
+    cart_idx, prod_idx, qty = [], [], []
+    pct = np.zeros(len(carts), dtype=np.float64)
+    flat = np.zeros(len(carts), dtype=np.int64)
+    is_pct = np.zeros(len(carts), dtype=bool)
+    is_flat = np.zeros(len(carts), dtype=bool)
+    for c, cart in enumerate(carts):
+        for item in cart.get("items") or []:
+            cart_idx.append(c)
+            prod_idx.append(id_pos.get(item.get("id"), -1) + 1)
+            qty.append(int(item.get("quantity", 1)))
+        code = (cart.get("coupon_code") or "").strip()
+        discount_type, discount_value = voucher_terms(vouchers.get(code)) if code else (None, 0)
+        if discount_type == "percentage":
+            is_pct[c], pct[c] = True, discount_value
+        elif discount_type == "flat":
+            is_flat[c], flat[c] = True, to_paise(discount_value)
+
+    amounts = price_table[np.asarray(prod_idx, dtype=np.int64)] * np.asarray(qty, dtype=np.int64)
+    subtotal = np.zeros(len(carts), dtype=np.int64)
+    np.add.at(subtotal, np.asarray(cart_idx, dtype=np.int64), amounts)
+
+    discount = np.zeros(len(carts), dtype=np.int64)
+    pct_discount = np.floor(subtotal * pct / 100 + 0.5).astype(np.int64)
+    discount[is_pct] = np.minimum(pct_discount, subtotal)[is_pct]
+    discount[is_flat] = np.minimum(flat, subtotal)[is_flat]
+
+    return {
+        "subtotal": np.round(subtotal / 100, 2),
+        "discount": np.round(discount / 100, 2),
+        "total": np.round((subtotal - discount) / 100, 2),
+    }
@@ -0,0 +1,205 @@
+"""
+Product image uploads and resized variants.
+
+Browsers PUT originals straight to the products bucket through a V4 signed
+URL; a job then renders each variant in VARIANTS as WebP and JPEG and records
+their URLs on the product as image_variants.
+"""
+import hashlib
+import os
+import re
+import uuid
+from io import BytesIO
+from urllib.parse import unquote
+
+from utils import metrics
+
+JOB_KIND = "product_images"
+
+ALLOWED_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+UPLOAD_URL_TTL = 900  # seconds
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+# Decoded size limit, checked from the header before any pixels are read: a
+# small, highly compressed file can otherwise decode to hundreds of MB
+MAX_IMAGE_PIXELS = 24_000_000
+
+# Variant name -> longest side in pixels
+VARIANTS = {"thumb": 160, "card": 480}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Variant names are content-addressed, so browsers may cache them forever
+VARIANT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _safe_name(filename):
+    base = os.path.basename(filename or "image")
+    return re.sub(r"[^A-Za-z0-9._-]+", "-", base).strip("-")[:80] or "image"
+
+
+def signed_upload(bucket, filename, content_type, size=None):
+    """
+    V4 signed PUT URL for a new original under products/. The browser must
+    send the returned headers as signed; GCS rejects bodies over
+    MAX_UPLOAD_BYTES through the content-length-range header.
+    """
+    if content_type not in ALLOWED_TYPES:
+        raise ValueError(f"Unsupported image type. Allowed: {list(ALLOWED_TYPES)}")
+    if size is not None and not 0 < int(size) <= MAX_UPLOAD_BYTES:
+        raise ValueError(f"Image must be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    blob = bucket.blob(f"products/{uuid.uuid4()}-{_safe_name(filename)}")
+    signed_headers = {"x-goog-content-length-range": f"0,{MAX_UPLOAD_BYTES}"}
+    url = blob.generate_signed_url(
+        version="v4", expiration=UPLOAD_URL_TTL, method="PUT", content_type=content_type,
+        headers=signed_headers
+    )
+    return {
+        "upload_url": url,
+        "method": "PUT",
+        "headers": {"Content-Type": content_type, **signed_headers},
+        "object": blob.name,
+        "public_url": blob.public_url,
+        "expires_in": UPLOAD_URL_TTL,
+    }
+
+
+def blob_name_for(bucket, url):
+    """Object name if `url` is a public URL in this bucket, else None"""
+    prefix = bucket.blob("").public_url
+    if url and url.startswith(prefix) and len(url) > len(prefix):
+        return unquote(url[len(prefix):])
+    return None
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def _open_checked(fp):
+    """Open an image lazily, rejecting it from its header when it decodes past MAX_IMAGE_PIXELS"""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        img = Image.open(fp)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a usable image: {e}") from e
+    width, height = img.size
+    if width * height > MAX_IMAGE_PIXELS:
+        img.close()
+        raise ImageTooLarge(f"Image is {width}x{height}; at most {MAX_IMAGE_PIXELS // 1_000_000} MP is allowed")
+    return img
+
+
+def check_image(fp):
+    """Validate an upload from its header only; raises ValueError (ImageTooLarge when oversized)"""
+    position = fp.tell()
+    # Not closed: Image.close() would close the caller's stream too
+    _open_checked(fp)
+    fp.seek(position)
+
+
+def render_variants(data):
+    """{variant: {"webp": bytes, "jpeg": bytes, "width", "height"}} for image bytes"""
+    from PIL import Image, ImageOps
+
+    with metrics.span("image"):
+        with _open_checked(BytesIO(data)) as img:
+            if img.format == "JPEG":
+                # Let the decoder downscale by up to 8x; the largest variant still fits
+                largest = max(VARIANTS.values())
+                img.draft("RGB", (largest, largest))
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+            else:
+                img = img.convert("RGB")
+            out = {}
+            for name, size in VARIANTS.items():
+                resized = img.copy()
+                resized.thumbnail((size, size), Image.LANCZOS)
+                webp = BytesIO()
+                resized.save(webp, "WEBP", quality=WEBP_QUALITY, method=4)
+                if resized.mode == "RGBA":
+                    # JPEG has no alpha; flatten onto white like the storefront background
+                    flat = Image.new("RGB", resized.size, (255, 255, 255))
+                    flat.paste(resized, mask=resized.getchannel("A"))
+                    resized = flat
+                jpeg = BytesIO()
+                resized.save(jpeg, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                out[name] = {
+                    "webp": webp.getvalue(),
+                    "jpeg": jpeg.getvalue(),
+                    "width": resized.width,
+                    "height": resized.height,
+                }
+            return out
+
+
+def process_product_image(bucket, products, product_id, force=False):
+    """
+    Render and upload variants for the product's current image_url.
+    Skips products whose image lives outside the bucket or, unless force,
+    is already processed. Returns True if the product was updated.
+    """
+    ref = products.document(product_id)
+    snap = ref.get()
+    if not snap.exists:
+        return False
+    product = snap.to_dict()
+    source = product.get("image_url")
+    name = blob_name_for(bucket, source)
+    done = product.get("image_source") == source and product.get("image_variants")
+    if name is None or (done and not force):
+        return False
+
+    with metrics.span("gcs"):
+        data = bucket.blob(name).download_as_bytes()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    variants = {}
+    for variant, rendered in render_variants(data).items():
+        urls = {"width": rendered["width"], "height": rendered["height"]}
+        for fmt, content_type in (("webp", "image/webp"), ("jpeg", "image/jpeg")):
+            blob = bucket.blob(f"products/variants/{product_id}/{digest}-{variant}.{fmt}")
+            blob.cache_control = VARIANT_CACHE_CONTROL
+            with metrics.span("gcs"):
+                blob.upload_from_string(rendered[fmt], content_type=content_type)
+            urls[fmt] = blob.public_url
+        variants[variant] = urls
+
+    # Only record the variants if the image was not replaced meanwhile
+    if ref.get().to_dict().get("image_url") != source:
+        return False
+    ref.update({"image_variants": variants, "image_source": source})
+    return True
+
+
+def stale_variant_fields():
+    """Update fields that drop the variants of a replaced image_url"""
+    from google.cloud import firestore
+
+    return {"image_variants": firestore.DELETE_FIELD, "image_source": firestore.DELETE_FIELD}
+
+
+def register(queue, get_bucket, get_products, on_change=None):
+    """Register the variant job; on_change runs after a product gains variants"""
+    def handle(payload):
+        try:
+            updated = process_product_image(
+                get_bucket(), get_products(), payload["product_id"], force=payload.get("force", False)
+            )
+        except ValueError as e:
+            # Oversized or undecodable: retrying cannot help
+            print(f"Product {payload['product_id']} image skipped: {e}")
+            return
+        if updated and on_change:
+            on_change()
+
+    queue.register(JOB_KIND, handle)
+
+
+def enqueue(queue, product_id, image_url, force=False):
+    # One job per product and source image, so re-saving a product is a no-op;
+    # force gets a fresh key to re-render anyway
+    key = f"{product_id}:{hashlib.sha1(image_url.encode('utf-8')).hexdigest()[:12]}"
+    if force:
+        key += f":{uuid.uuid4().hex[:8]}"
+    return queue.enqueue(JOB_KIND, key, {"product_id": product_id, "force": force}, max_attempts=3)
@@ -0,0 +1,180 @@
+"""
+Bulk product import from CSV or JSON.
+
+One read of the whole products collection gives the name index and the highest
+sequence_number; new rows are numbered in the same pass and everything is
+written in batches of at most MAX_WRITES.
+"""
+import csv
+import io
+import json
+
+from google.cloud import firestore
+
+from clients import get_db
+from utils import metrics, product_images
+from utils.product_order import products_collection, MAX_WRITES
+
+IMPORT_FIELDS = ("name", "category", "mrp", "price", "image_url", "description", "is_active", "sequence_number")
+MODES = ("create", "upsert")
+MAX_IMPORT_ROWS = 5000
+
+
+def parse_rows(data, fmt):
+    """
+    Rows from CSV text (header row required) or JSON: a list of objects, or
+    {"products": [...]}. Raises ValueError for unreadable input.
+    """
+    if fmt == "csv":
+        if isinstance(data, bytes):
+            data = data.decode("utf-8-sig")
+        return [
+            {k.strip(): v for k, v in row.items() if k and v not in (None, "")}
+            for row in csv.DictReader(io.StringIO(data))
+        ]
+    if fmt == "json":
+        if isinstance(data, (str, bytes)):
+            data = json.loads(data)
+        if isinstance(data, dict):
+            data = data.get("products")
+        if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+            raise ValueError("Expected a list of product objects")
+        return data
+    raise ValueError(f"Unknown format {fmt!r}; use csv or json")
+
+
+def clean_row(row):
+    """(fields, error) for one input row; only IMPORT_FIELDS are kept"""
+    fields = {k: row[k] for k in IMPORT_FIELDS if k in row}
+    name = str(fields.get("name") or "").strip()
+    if not name:
+        return None, "name is required"
+    fields["name"] = name
+    try:
+        for key in ("mrp", "price"):
+            if key in fields:
+                fields[key] = float(fields[key])
+                if fields[key] < 0:
+                    return None, f"{key} must not be negative"
+        if "sequence_number" in fields:
+            fields["sequence_number"] = int(fields["sequence_number"])
+    except (TypeError, ValueError):
+        return None, "Invalid price/mrp/sequence_number"
+    if "is_active" in fields:
+        fields["is_active"] = str(fields["is_active"]).lower() in ("true", "1", "yes")
+    return fields, None
+
+
+@metrics.timed("firestore")
+def _snapshot():
+    """({name: (doc_ref, data)}, used sequence numbers) from one collection read"""
+    by_name, used = {}, set()
+    for snap in products_collection().stream():
+        data = snap.to_dict()
+        by_name.setdefault(data.get("name"), (snap.reference, data))
+        if isinstance(data.get("sequence_number"), int):
+            used.add(data["sequence_number"])
+    return by_name, used
+
+
+def import_products(rows, mode="create", dry_run=False):
+    """
+    Create (and with mode="upsert", update) products from parsed rows.
+    Names are matched exactly against the catalog and earlier rows. New
+    products without a sequence_number, or whose requested slot is taken,
+    are appended after the current highest one. Returns the report:
+    {"created", "updated", "unchanged", "skipped", "errors", "rows": [...]}.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Invalid mode. Allowed: {list(MODES)}")
+    by_name, used = _snapshot()
+    next_seq = max(used, default=0) + 1
+    seen = set()
+    report = []
+    writes = []  # (report entry, op, ref, fields)
+
+    def claim(requested):
+        nonlocal next_seq
+        if requested is not None and requested not in used:
+            used.add(requested)
+            return requested, None
+        while next_seq in used:
+            next_seq += 1
+        used.add(next_seq)
+        note = f"sequence_number {requested} is taken" if requested is not None else None
+        return next_seq, note
+
+    for line, row in enumerate(rows, start=1):
+        fields, error = clean_row(row)
+        entry = {"row": line, "name": (fields or {}).get("name", row.get("name"))}
+        report.append(entry)
+        if error:
+            entry.update(status="error", error=error)
+            continue
+        if fields["name"] in seen:
+            entry.update(status="error", error="Duplicate name in this import")
+            continue
+        seen.add(fields["name"])
+
+        existing = by_name.get(fields["name"])
+        if existing is None:
+            seq, note = claim(fields.pop("sequence_number", None))
+            doc = {"is_active": True, **fields, "sequence_number": seq}
+            ref = products_collection().document()
+            entry.update(status="created", id=ref.id, sequence_number=seq)
+            if note:
+                entry["note"] = note
+            writes.append((entry, "set", ref, dict(doc, created_at=firestore.SERVER_TIMESTAMP)))
+            continue
+
+        ref, current = existing
+        entry["id"] = ref.id
+        if mode == "create":
+            entry.update(status="skipped", error="Product with this name already exists")
+            continue
+        patch = {k: v for k, v in fields.items() if current.get(k) != v}
+        if "sequence_number" in patch:
+            seq, note = claim(patch["sequence_number"])
+            if note:
+                del patch["sequence_number"]
+                entry["note"] = f"{note}; kept {current.get('sequence_number')}"
+            else:
+                patch["sequence_number"] = seq
+        if not patch:
+            entry["status"] = "unchanged"
+            continue
+        entry.update(status="updated", fields=sorted(patch))
+        if "image_url" in patch:
+            patch.update(product_images.stale_variant_fields())
+        writes.append((entry, "update", ref, patch))
+
+    if not dry_run:
+        _commit(writes)
+
+    summary = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0, "error": 0}
+    for entry in report:
+        summary[entry["status"]] += 1
+    return {
+        "created": summary["created"],
+        "updated": summary["updated"],
+        "unchanged": summary["unchanged"],
+        "skipped": summary["skipped"],
+        "errors": summary["error"],
+        "dry_run": dry_run,
+        "rows": report,
+    }
+
+
+@metrics.timed("firestore")
+def _commit(writes):
+    """Commit in chunks; a failed chunk marks its rows as errors and the rest carry on"""
+    for i in range(0, len(writes), MAX_WRITES):
+        chunk = writes[i:i + MAX_WRITES]
+        batch = get_db().batch()
+        for _, op, ref, fields in chunk:
+            getattr(batch, op)(ref, fields)
+        try:
+            batch.commit()
+        except Exception as e:
+            for entry, *_ in chunk:
+                entry.update(status="error", error=f"Write failed: {e}")
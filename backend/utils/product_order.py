@@ -0,0 +1,145 @@
+from google.cloud import firestore
+
+from clients import get_db
+from utils import metrics
+
+
+def products_collection():
+    return get_db().collection("products")
+
+
+# Firestore caps a batch or transaction at 500 writes
+MAX_WRITES = 500
+
+
+@metrics.timed("firestore")
+def commit_updates(updates, chunk_size=MAX_WRITES):
+    """Apply (doc_ref, fields) updates in batches of at most chunk_size writes"""
+    for i in range(0, len(updates), chunk_size):
+        batch = get_db().batch()
+        for ref, fields in updates[i:i + chunk_size]:
+            batch.update(ref, fields)
+        batch.commit()
+
+
+def _make_room(transaction, seq, old_seq=None):
+    """
+    Updates needed to free slot `seq` for a product leaving `old_seq` (None
+    for a new product). Moving later, products between the two slots move
+    down one towards the old slot; moving earlier or inserting, they move up
+    one. Either shift stops at the first gap, so a move only touches
+    products between its two slots and most write a handful of documents.
+    """
+    q = products_collection()
+    if old_seq is not None and old_seq < seq:
+        q = q.where("sequence_number", ">", old_seq).where("sequence_number", "<=", seq)
+        q, step = q.order_by("sequence_number", direction=firestore.Query.DESCENDING), -1
+    else:
+        q = q.where("sequence_number", ">=", seq)
+        if old_seq is not None:
+            q = q.where("sequence_number", "<", old_seq)
+        q, step = q.order_by("sequence_number"), 1
+    updates = []
+    needed = seq
+    for snap in q.stream(transaction=transaction):
+        current = snap.get("sequence_number")
+        if (current - needed) * step > 0:
+            # A gap (or the moving product's old slot) absorbs the shift
+            break
+        needed += step
+        updates.append((snap.reference, {"sequence_number": needed}))
+    return updates
+
+
+@metrics.timed("firestore")
+def _run(fn):
+    """
+    Run fn(transaction) -> (updates, final_writes) atomically. If the writes
+    do not fit in one transaction they are applied in chunked batches instead.
+    """
+    overflow = []
+
+    @firestore.transactional
+    def _txn(transaction):
+        overflow.clear()
+        updates, final_writes = fn(transaction)
+        if len(updates) + len(final_writes) > MAX_WRITES:
+            overflow.extend(updates)
+            overflow.append(final_writes)
+            return
+        for ref, fields in updates:
+            transaction.update(ref, fields)
+        for write in final_writes:
+            write(transaction)
+
+    _txn(get_db().transaction())
+    if overflow:
+        final_writes = overflow.pop()
+        commit_updates(overflow)
+        batch = get_db().batch()
+        for write in final_writes:
+            write(batch)
+        batch.commit()
+
+
+def insert_product(doc):
+    """Create a product at doc['sequence_number'], shifting the run it lands on"""
+    ref = products_collection().document()
+
+    def _insert(transaction):
+        updates = _make_room(transaction, doc["sequence_number"])
+        return updates, [lambda w: w.set(ref, doc)]
+
+    _run(_insert)
+    return ref
+
+
+def move_product(pid, new_seq, patch=None):
+    """Move a product to new_seq and apply any other field changes in the same write"""
+    ref = products_collection().document(pid)
+    fields = dict(patch or {}, sequence_number=new_seq)
+
+    def _move(transaction):
+        snap = ref.get(transaction=transaction)
+        if not snap.exists:
+            raise KeyError(pid)
+        old_seq = snap.to_dict().get("sequence_number")
+        if old_seq == new_seq:
+            return [], [lambda w: w.update(ref, fields)]
+        updates = _make_room(transaction, new_seq, old_seq)
+        return updates, [lambda w: w.update(ref, fields)]
+
+    _run(_move)
+
+
+def _reorder_updates(ids, by_id):
+    """Hand the slots held by `ids` back out in list order; unsequenced products sort last"""
+    current = {pid: by_id[pid].to_dict().get("sequence_number") for pid in ids}
+    slots = sorted(current.values(), key=lambda seq: (seq is None, seq or 0))
+    return [
+        (by_id[pid].reference, {"sequence_number": seq})
+        for pid, seq in zip(ids, slots)
+        if current[pid] != seq
+    ]
+
+
+def reorder_products(ids):
+    """
+    Put the given products in the given order, reusing the slots they already
+    occupy; products not listed keep their positions. Only changed docs are
+    written. Returns the ids whose sequence_number changed.
+    """
+    refs = [products_collection().document(pid) for pid in ids]
+    changed = []
+
+    def _reorder(transaction):
+        by_id = {s.id: s for s in get_db().get_all(refs, transaction=transaction) if s.exists}
+        missing = [pid for pid in ids if pid not in by_id]
+        if missing:
+            raise KeyError(", ".join(missing))
+        updates = _reorder_updates(ids, by_id)
+        changed[:] = [ref.id for ref, _ in updates]
+        return updates, []
+
+    _run(_reorder)
+    return changed
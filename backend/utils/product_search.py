@@ -0,0 +1,258 @@
+"""
+In-memory product search over the cached catalog.
+
+An inverted index maps tokens from product name, category and description
+to the products containing them. Lookups go exact, then prefix (over the
+sorted vocabulary), then typo-tolerant (a deletion index in the style of
+SymSpell, verified with a bounded edit distance). The index follows the
+catalog cache: when the catalog reloads, only products whose indexed
+fields changed are re-tokenized.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+# Field -> weight of a token found in it
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+# Match quality by kind; fuzzy matches lose FUZZY_PENALTY per edit
+EXACT, PREFIX, FUZZY, FUZZY_PENALTY = 1.0, 0.7, 0.6, 0.15
+MIN_PREFIX = 2
+PRICE_BUCKETS = ((0, 100), (100, 250), (250, 500), (500, 1000), (1000, None))
+SORTS = ("relevance", "price_asc", "price_desc")
+MAX_LIMIT = 200
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode().lower()
+    return _TOKEN.findall(text)
+
+
+def max_edits(token):
+    """Typos tolerated for a query term of this length"""
+    return 0 if len(token) < 4 else 1 if len(token) < 8 else 2
+
+
+def _deletes(token, edits):
+    """Every string reachable from token by deleting up to `edits` characters"""
+    out, frontier = {token}, {token}
+    for _ in range(edits):
+        frontier = {t[:i] + t[i + 1:] for t in frontier for i in range(len(t))}
+        out |= frontier
+    return out
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein (optimal string alignment) distance, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _price(product):
+    try:
+        return float(product.get("price") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _bucket(price):
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        if price >= low and (high is None or price < high):
+            return i
+    return 0
+
+
+class ProductSearch:
+    """
+    Search index over a CatalogCache. Queries sync with the cache first, so
+    product writes (which invalidate it) show up in the next search.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.lock = threading.Lock()
+        self.synced = None        # the catalog's by_id dict the index reflects
+        self.docs = {}            # id -> (product, indexed text fields, {token: weight}, facets)
+        self.postings = {}        # token -> {id: weight}
+        self.vocab = []           # sorted tokens, for prefix ranges
+        self.delete_index = {}    # deletion variant -> {tokens}
+        self.browse = {}          # results of query-less searches, until the next sync
+
+    def _add_token(self, token):
+        bisect.insort(self.vocab, token)
+        for variant in _deletes(token, max_edits(token)):
+            self.delete_index.setdefault(variant, set()).add(token)
+
+    def _drop_token(self, token):
+        del self.vocab[bisect.bisect_left(self.vocab, token)]
+        for variant in _deletes(token, max_edits(token)):
+            tokens = self.delete_index[variant]
+            tokens.discard(token)
+            if not tokens:
+                del self.delete_index[variant]
+
+    def remove(self, pid):
+        entry = self.docs.pop(pid, None)
+        if entry is None:
+            return
+        for token in entry[2]:
+            posting = self.postings[token]
+            del posting[pid]
+            if not posting:
+                del self.postings[token]
+                self._drop_token(token)
+
+    def upsert(self, product):
+        """Index or re-index one product; untouched text is not re-tokenized"""
+        pid = product["id"]
+        fields = tuple(str(product.get(f) or "") for f in FIELD_WEIGHTS)
+        price = _price(product)
+        # Everything a query needs per hit, precomputed
+        facets = (price, _bucket(price), product.get("category"), product.get("sequence_number") or 0)
+        current = self.docs.get(pid)
+        if current is not None and current[1] == fields:
+            self.docs[pid] = (product, fields, current[2], facets)
+            return
+        self.remove(pid)
+        weights = {}
+        for field, text in zip(FIELD_WEIGHTS, fields):
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), FIELD_WEIGHTS[field])
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                self._add_token(token)
+            self.postings[token][pid] = weight
+        self.docs[pid] = (product, fields, weights, facets)
+
+    def sync(self):
+        """Apply the catalog's current contents as per-product upserts and removals"""
+        by_id = self.catalog.by_id()
+        if by_id is self.synced:
+            return
+        with self.lock:
+            if by_id is self.synced:
+                return
+            for pid in [pid for pid in self.docs if pid not in by_id]:
+                self.remove(pid)
+            for product in by_id.values():
+                self.upsert(product)
+            self.browse.clear()
+            self.synced = by_id
+
+    def _matches(self, term, prefix):
+        """{token: quality} for one query term"""
+        found = {}
+        if term in self.postings:
+            found[term] = EXACT
+        if prefix and len(term) >= MIN_PREFIX:
+            i = bisect.bisect_left(self.vocab, term)
+            while i < len(self.vocab) and self.vocab[i].startswith(term):
+                found.setdefault(self.vocab[i], PREFIX)
+                i += 1
+        limit = max_edits(term)
+        if limit:
+            for variant in _deletes(term, limit):
+                for token in self.delete_index.get(variant, ()):
+                    if token not in found:
+                        dist = edit_distance(term, token, limit)
+                        if dist <= limit:
+                            found[token] = FUZZY - FUZZY_PENALTY * (dist - 1)
+        return found
+
+    def search(self, q="", category=None, min_price=None, max_price=None,
+               sort="relevance", limit=24, offset=0):
+        """
+        Products matching every query term (by exact, prefix or fuzzy token),
+        with category and price-range facet counts. Each facet ignores its own
+        filter, so the counts show what selecting another value would give.
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Invalid sort. Allowed: {list(SORTS)}")
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        offset = max(0, int(offset))
+        self.sync()
+        synced = self.synced
+        t0 = time.perf_counter()
+        terms = tokenize(q)
+        browse_key = None if terms else (category, min_price, max_price, sort, limit, offset)
+        cached = self.browse.get(browse_key) if browse_key else None
+        if cached is not None:
+            return dict(cached, query=q, took_ms=round((time.perf_counter() - t0) * 1000, 3))
+        with self.lock:
+            if terms:
+                scores = None
+                for n, term in enumerate(terms):
+                    # Only the term being typed (the last one) matches as a prefix
+                    matched = self._matches(term, prefix=n == len(terms) - 1)
+                    term_scores = {}
+                    for token, quality in matched.items():
+                        for pid, weight in self.postings[token].items():
+                            score = weight * quality
+                            if score > term_scores.get(pid, 0):
+                                term_scores[pid] = score
+                    if scores is None:
+                        scores = term_scores
+                    else:
+                        scores = {pid: s + term_scores[pid] for pid, s in scores.items() if pid in term_scores}
+                    if not scores:
+                        break
+            else:
+                scores = dict.fromkeys(self.docs, 0.0)
+
+            low = float("-inf") if min_price is None else min_price
+            high = float("inf") if max_price is None else max_price
+            categories, buckets, results = {}, [0] * len(PRICE_BUCKETS), []
+            for pid, score in scores.items():
+                product, _, _, (price, bucket, cat, seq) = self.docs[pid]
+                price_ok = low <= price <= high
+                category_ok = not category or cat == category
+                if price_ok and cat:
+                    categories[cat] = categories.get(cat, 0) + 1
+                if category_ok:
+                    buckets[bucket] += 1
+                if price_ok and category_ok:
+                    results.append((score, seq, price, product))
+
+        if sort == "relevance":
+            key = lambda r: (-r[0], r[1])
+        elif sort == "price_asc":
+            key = lambda r: (r[2], r[1])
+        else:
+            key = lambda r: (-r[2], r[1])
+        # Only the requested page needs ordering
+        page = heapq.nsmallest(offset + limit, results, key=key)[offset:]
+        result = {
+            "query": q,
+            "total": len(results),
+            "products": [r[3] for r in page],
+            "facets": {
+                "categories": [{"category": c, "count": n} for c, n in sorted(categories.items())],
+                "price": [
+                    {"min": low, "max": high, "count": buckets[i]}
+                    for i, (low, high) in enumerate(PRICE_BUCKETS)
+                ],
+            },
+            "took_ms": round((time.perf_counter() - t0) * 1000, 3),
+        }
+        if browse_key and self.synced is synced:
+            if len(self.browse) >= 256:
+                self.browse.clear()
+            self.browse[browse_key] = result
+        return result
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from utils.ttl_cache import TTLCache
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available"""
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class KeyedRateLimiter:
+    """One token bucket per key (e.g. client IP), idle keys evicted LRU"""
+
+    def __init__(self, rate_per_minute, burst, max_keys=10000):
+        if rate_per_minute <= 0:
+            raise ValueError("Rate limit must be positive")
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        # A full bucket refills in burst / rate seconds; forgetting it after that is harmless
+        self.buckets = TTLCache(maxsize=max_keys, ttl=burst / self.rate)
+        self.lock = threading.Lock()
+
+    def allow(self, key, tokens=1):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+            self.buckets.set(key, bucket)
+        return bucket.try_acquire(tokens)
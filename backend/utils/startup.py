@@ -0,0 +1,32 @@
+import threading
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+
+_timings = {}
+_lock = threading.Lock()
+
+
+def record(name, seconds):
+    with _lock:
+        _timings[name] = round(seconds * 1000, 2)
+
+
+@contextmanager
+def timed(name):
+    """Record how long the block took, in ms, under `name`"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+def report():
+    with _lock:
+        timings = dict(_timings)
+    return {
+        "uptime_ms": round((time.perf_counter() - PROCESS_START) * 1000, 2),
+        "timings_ms": dict(sorted(timings.items(), key=lambda kv: kv[1], reverse=True)),
+    }
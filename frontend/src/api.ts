@@ -1,7 +1,7 @@
 export const API_BASE = import.meta.env.VITE_API_BASE || '/'
 console.log(API_BASE, 'API_BASE')
-export const j = async (path: string, method: string, body?: any, token?: string) => {
-  const headers: any = { ...(token ? { Authorization: `Bearer ${token}` } : {}) };
+export const j = async (path: string, method: string, body?: any, token?: string, extraHeaders?: Record<string, string>) => {
+  const headers: any = { ...(token ? { Authorization: `Bearer ${token}` } : {}), ...extraHeaders };
 
   // Only set JSON content-type if body is not FormData
   const isFormData = body instanceof FormData;
@@ -18,3 +18,39 @@ export const j = async (path: string, method: string, body?: any, token?: string
 }
 
 export const g = async (path: string, token?: string) => j(path, 'GET', undefined, token);
+
+// One Idempotency-Key per distinct order payload until it succeeds, so
+// double-clicks and retries of the same order create it only once
+const checkoutKeys = new Map<string, string>();
+export const placeOrder = async (payload: any) => {
+  const fingerprint = JSON.stringify(payload);
+  let key = checkoutKeys.get(fingerprint);
+  if (!key) {
+    key = crypto.randomUUID();
+    checkoutKeys.set(fingerprint, key);
+  }
+  const res = await j('/api/orders/quick-checkout', 'POST', payload, undefined, { 'Idempotency-Key': key });
+  checkoutKeys.delete(fingerprint);
+  return res;
+}
+
+// Upload an image straight to the bucket through a signed URL; returns its public URL
+export const uploadImage = async (file: File, token?: string): Promise<string> => {
+  const meta = await j('/api/admin/upload-url', 'POST', { filename: file.name, content_type: file.type, size: file.size }, token);
+  const res = await fetch(meta.upload_url, { method: 'PUT', headers: meta.headers, body: file });
+  if (!res.ok) throw new Error(`Upload failed: ${res.status}`);
+  return meta.public_url;
+}
+
+// Open a file from an admin endpoint in a new tab; plain links cannot send the token
+export const openWithToken = async (path: string, token?: string) => {
+  const tab = window.open('', '_blank');
+  const res = await fetch(API_BASE + path, { headers: token ? { Authorization: `Bearer ${token}` } : {} });
+  if (!res.ok) {
+    tab?.close();
+    throw new Error(await res.text());
+  }
+  const url = URL.createObjectURL(await res.blob());
+  if (tab) tab.location.href = url;
+  else window.location.href = url;
+}
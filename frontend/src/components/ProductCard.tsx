@@ -1,4 +1,5 @@
 import type { Product } from '../types';
+import ProductImage from './ProductImage';
 
 export default function ProductCard({
   p,
@@ -9,7 +10,7 @@ export default function ProductCard({
 }) {
   return (
     <div className="card">
-      {p.image_url && <img src={p.image_url} alt={p.name} />}
+      <ProductImage p={p} size="card" />
       <div style={{ padding: 12 }}>
         <div style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
           <h3 style={{ margin: '6px 0' }}>{p.name}</h3>
@@ -0,0 +1,25 @@
+import type { Product } from '../types';
+
+// Serves the resized WebP/JPEG variant when the backend has made one for
+// the current image_url, falling back to the uploaded original
+export default function ProductImage({
+  p,
+  size,
+  fallback,
+  className,
+}: {
+  p: Pick<Product, 'name' | 'image_url' | 'image_variants' | 'image_source'>;
+  size: 'thumb' | 'card';
+  fallback?: string;
+  className?: string;
+}) {
+  const variant = p.image_source === p.image_url ? p.image_variants?.[size] : undefined;
+  const src = variant?.jpeg || p.image_url || fallback;
+  if (!src) return null;
+  return (
+    <picture>
+      {variant?.webp && <source type="image/webp" srcSet={variant.webp} />}
+      <img src={src} alt={p.name} className={className} loading="lazy" />
+    </picture>
+  );
+}
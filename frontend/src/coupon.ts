@@ -0,0 +1,23 @@
+// Cart preview of a voucher; the server prices the order (backend/utils/pricing.py)
+export type Coupon = {
+	discount_type: 'percentage' | 'flat';
+	discount_value: number;
+};
+
+// Parse an /api/orders/apply-coupon response; vouchers without a type are percentages
+export const toCoupon = (response: any): Coupon | null => {
+	if (!response || typeof response.discount_value !== 'number' || response.discount_value <= 0) return null;
+	return {
+		discount_type: response.discount_type === 'flat' ? 'flat' : 'percentage',
+		discount_value: response.discount_value,
+	};
+};
+
+export const couponDiscount = (subtotal: number, coupon: Coupon | null): number => {
+	if (!coupon) return 0;
+	const off = coupon.discount_type === 'flat' ? coupon.discount_value : (subtotal * coupon.discount_value) / 100;
+	return Math.min(Math.round(off * 100) / 100, subtotal);
+};
+
+export const couponLabel = (coupon: Coupon): string =>
+	coupon.discount_type === 'flat' ? `₹${coupon.discount_value} off` : `${coupon.discount_value}% off`;
@@ -157,7 +157,7 @@ export default function AdminPanel({
           
           {activeTab === "AdminOffer" && <AdminOffer                  token={token}
  />}
-          {activeTab === "AdminOrderList" && <AdminOrderList />}
+          {activeTab === "AdminOrderList" && <AdminOrderList token={token} />}
         </div>
       </main>
 
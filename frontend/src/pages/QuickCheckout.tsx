@@ -1,10 +1,12 @@
 import React, { useEffect, useState, useMemo } from "react";
-import { g, j } from "../api";
+import { g, j, placeOrder as submitOrder } from "../api";
 import type { Product } from "../types";
+import { type Coupon, toCoupon, couponDiscount, couponLabel } from "../coupon";
 import Select from "react-select";
 import useToast from "../pages/Toast/useToast";
 import { FaPlus, FaMinus, FaChevronLeft, FaChevronRight } from "react-icons/fa";
 import { ShoppingCart } from "lucide-react";
+import ProductImage from "../components/ProductImage";
 
 // ---------------- Subcomponents ---------------- //
 function Field({ id, label, children, error }: { id: string; label: string; children: React.ReactNode; error?: string }) {
@@ -20,7 +22,7 @@ function Field({ id, label, children, error }: { id: string; label: string; chil
 function ProductCardMobile({ r, setQty, formatCurrency }: { r: any; setQty: React.Dispatch<React.SetStateAction<Record<string, number>>>; formatCurrency: (n: number) => string; }) {
   return (
     <article className="bg-white rounded-xl shadow-sm border border-gray-100 p-4 flex items-center space-x-4">
-      <img src={r.image_url || "/default-image.jpg"} alt={r.name} className="w-24 h-24 object-cover rounded-lg flex-shrink-0" />
+      <ProductImage p={r} size="thumb" fallback="/default-image.jpg" className="w-24 h-24 object-cover rounded-lg flex-shrink-0" />
       <div className="flex-grow">
         <h4 className="text-base font-bold text-gray-800 mb-1 leading-tight">{r.name}</h4>
         <div className="flex items-baseline space-x-2 mb-2">
@@ -57,7 +59,7 @@ export default function QuickCheckout() {
   const [qty, setQty] = useState<Record<string, number>>({});
   const [cust, setCust] = useState({ name: "", email: "", phone: "", address: "" });
   const [couponCode, setCouponCode] = useState("");
-  const [discountPercentage, setDiscountPercentage] = useState(0);
+  const [coupon, setCoupon] = useState<Coupon | null>(null);
   const [appliedCouponCode, setAppliedCouponCode] = useState<string | null>(null);
   const [applyingCoupon, setApplyingCoupon] = useState(false);
   const [errors, setErrors] = useState<Record<string, string>>({});
@@ -101,7 +103,7 @@ export default function QuickCheckout() {
   }, [rows, currentPage]);
 
   const subtotal = rows.reduce((s, r) => s + (r.amount || 0), 0);
-  const discountAmount = (subtotal * discountPercentage) / 100;
+  const discountAmount = couponDiscount(subtotal, coupon);
   const totalAmount = subtotal - discountAmount;
   const formatCurrency = (n: number) => `₹${n.toFixed(2)}`;
 
@@ -137,12 +139,12 @@ export default function QuickCheckout() {
 
     try {
       setPlacing(true);
-      const res = await j("/api/orders/quick-checkout", "POST", payload);
-      addToast(`✅ Order #${res?.order_id || "-"} confirmed! Email sent (check spam folder if needed)`, "success");      
+      const res = await submitOrder(payload);
+      addToast(`✅ Order #${res?.order_id || "-"} accepted! Total ${formatCurrency(Number(res?.total ?? 0))}. Your invoice will be emailed shortly (check spam folder if needed)`, "success");      
       setQty({}); 
       setCust({ name: "", email: "", phone: "", address: "" }); 
       setErrors({}); 
-      setDiscountPercentage(0);
+      setCoupon(null);
       setAppliedCouponCode(null);
       setCouponCode("");
     } catch {
@@ -160,10 +162,11 @@ export default function QuickCheckout() {
     try {
       const response = await g(`/api/orders/apply-coupon?code=${encodeURIComponent(couponCode.trim())}`);
       
-      if (response && typeof response.discount_value === "number" && response.discount_value > 0) {
-        setDiscountPercentage(response.discount_value);
+      const applied = toCoupon(response);
+      if (applied) {
+        setCoupon(applied);
         setAppliedCouponCode(couponCode.trim());
-        addToast(`✅ Coupon applied! You got ${response.discount_value}% off.`, "success");
+        addToast(`✅ Coupon applied! You got ${couponLabel(applied)}.`, "success");
       } else {
         addToast("❌ Invalid coupon code.", "error");
       }
@@ -177,7 +180,7 @@ export default function QuickCheckout() {
 
   // Remove applied coupon
   function removeCoupon() {
-    setDiscountPercentage(0);
+    setCoupon(null);
     setAppliedCouponCode(null);
     setCouponCode("");
     addToast("Coupon removed", "info");
@@ -230,7 +233,7 @@ export default function QuickCheckout() {
                   {rows.map((r) => (
                     <tr key={r.id} className="hover:bg-blue-50 transition-colors duration-200">
                       <td className="px-6 py-4 flex items-center space-x-3">
-                        <img src={r.image_url || "/default-image.jpg"} alt={r.name} className="w-16 h-16 object-cover rounded-md shadow-sm border border-gray-100" />
+                        <ProductImage p={r} size="thumb" fallback="/default-image.jpg" className="w-16 h-16 object-cover rounded-md shadow-sm border border-gray-100" />
                         <div className="font-medium text-gray-900 text-base">{r.name}</div>
                       </td>
                       <td className="px-6 py-4 text-sm text-gray-500 line-through">{formatCurrency(r.mrp)}</td>
@@ -332,7 +335,7 @@ export default function QuickCheckout() {
                         {selectedRows.map((r) => (
                           <tr key={r.id} className="hover:bg-red-50 transition-colors duration-200">
                             <td className="px-6 py-4 flex items-center space-x-3">
-                              <img src={r.image_url || "/default-image.jpg"} alt={r.name} className="w-16 h-16 object-cover rounded-md shadow-sm border border-gray-100" />
+                              <ProductImage p={r} size="thumb" fallback="/default-image.jpg" className="w-16 h-16 object-cover rounded-md shadow-sm border border-gray-100" />
                               <div className="font-medium text-gray-900 text-base">{r.name}</div>
                             </td>
                             <td className="px-6 py-4 text-sm text-gray-500 line-through">{formatCurrency(r.mrp)}</td>
@@ -387,7 +390,7 @@ export default function QuickCheckout() {
                         <Field id="coupon" label="Coupon Code (Optional)">
                           {appliedCouponCode ? (
                             <div className="flex items-center gap-2 p-3 bg-green-50 border border-green-200 rounded-lg">
-                              <span className="text-green-700 font-medium">✅ {appliedCouponCode} applied ({discountPercentage}% off)</span>
+                              <span className="text-green-700 font-medium">✅ {appliedCouponCode} applied ({coupon && couponLabel(coupon)})</span>
                               <button 
                                 type="button" 
                                 onClick={removeCoupon}
@@ -429,9 +432,9 @@ export default function QuickCheckout() {
                             <span>Subtotal:</span>
                             <span>{formatCurrency(subtotal)}</span>
                           </div>
-                          {discountPercentage > 0 && (
+                          {coupon && (
                             <div className="flex justify-between text-green-600">
-                              <span>Discount ({discountPercentage}% off):</span>
+                              <span>Discount ({couponLabel(coupon)}):</span>
                               <span>-{formatCurrency(discountAmount)}</span>
                             </div>
                           )}
@@ -1,8 +1,10 @@
 import { useEffect, useState } from "react";
-import { g, j } from "../api";
+import { g, j, placeOrder as submitOrder } from "../api";
 import type { Product } from "../types";
+import { type Coupon, toCoupon, couponDiscount, couponLabel } from "../coupon";
 import Select from "react-select";
 import Default from "../assets/shop/products-def.jpg";
+import ProductImage from "../components/ProductImage";
 import useToast from "../pages/Toast/useToast";
 import { ShoppingCart } from "lucide-react";
 
@@ -14,6 +16,8 @@ export default function Shop() {
   const [loading, setLoading] = useState(false);
   const { addToast, ToastContainer } = useToast();
   const [categories, setCategories] = useState<string[]>([]);
+  const [query, setQuery] = useState("");
+  const [searchResults, setSearchResults] = useState<Product[] | null>(null);
 
   const [customer, setCustomer] = useState({
     name: "",
@@ -38,9 +42,26 @@ export default function Shop() {
       .catch(() => setProducts([]));
   }, []);
 
-  const filteredProducts = category
+  // Server-side search (typo tolerant); the full catalog stays loaded for the cart
+  useEffect(() => {
+    const q = query.trim();
+    if (!q) {
+      setSearchResults(null);
+      return;
+    }
+    const params = new URLSearchParams({ q, limit: "200" });
+    if (category) params.set("category", category);
+    const timer = setTimeout(() => {
+      g(`/api/products/search?${params}`)
+        .then((data: { products: Product[] }) => setSearchResults(data.products || []))
+        .catch(() => setSearchResults(null));
+    }, 200);
+    return () => clearTimeout(timer);
+  }, [query, category]);
+
+  const filteredProducts = searchResults ?? (category
     ? products.filter((p) => p.category === category)
-    : products;
+    : products);
 
   function add(p: Product) {
     setCart((c) => ({ ...c, [p.id]: (c[p.id] || 0) + 1 }));
@@ -101,8 +122,8 @@ export default function Shop() {
 
     try {
       setLoading(true);
-      const res = await j("/api/orders/quick-checkout", "POST", payload);
-      addToast(`✅ Order #${res?.order_id || "-"} confirmed! Email sent (check spam folder if needed)`, "success");
+      const res = await submitOrder(payload);
+      addToast(`✅ Order #${res?.order_id || "-"} accepted! Total ${formatCurrency(Number(res?.total ?? 0))}. Your invoice will be emailed shortly (check spam folder if needed)`, "success");
       setCart({});
       setCustomer({ name: "", email: "", phone: "", address: "", coupon: "" });
       setErrors({});
@@ -128,7 +149,7 @@ export default function Shop() {
   }));
 
   // Coupon/discount state for overlay
-  const [discountPercentage, setDiscountPercentage] = useState(0);
+  const [coupon, setCoupon] = useState<Coupon | null>(null);
   const [appliedCouponCode, setAppliedCouponCode] = useState<string | null>(null);
 
   // Coupon code for overlay
@@ -162,14 +183,14 @@ export default function Shop() {
       });
       setOverlayErrors({});
       setCouponCode("");
-      setDiscountPercentage(0);
+      setCoupon(null);
       setAppliedCouponCode(null);
     }
   }, [showCart]);
 
   // Calculate subtotal and discount amount
   const subtotal = selectedRows.reduce((sum, r) => sum + r.amount, 0);
-  const discountAmount = (subtotal * discountPercentage) / 100;
+  const discountAmount = couponDiscount(subtotal, coupon);
   const finalTotal = subtotal - discountAmount;
 
   // Validate overlay customer info
@@ -209,12 +230,12 @@ export default function Shop() {
     };
     try {
       setPlacing(true);
-      const res = await j("/api/orders/quick-checkout", "POST", payload);
-      addToast(`✅ Order placed! ID: ${res?.order_id || "-"}`, "success");
+      const res = await submitOrder(payload);
+      addToast(`✅ Order accepted! Total ${formatCurrency(Number(res?.total ?? 0))}. ID: ${res?.order_id || "-"}. Your invoice will be emailed shortly.`, "success");
       setCart({});
       setOverlayCustomer({ name: "", email: "", phone: "", address: "" });
       setOverlayErrors({});
-      setDiscountPercentage(0);
+      setCoupon(null);
       setAppliedCouponCode(null);
       setCouponCode("");
       setShowCart(false);
@@ -236,10 +257,11 @@ export default function Shop() {
     try {
       const response = await g(`/api/orders/apply-coupon?code=${encodeURIComponent(couponCode.trim())}`);
       
-      if (response && typeof response.discount_value === "number" && response.discount_value > 0) {
-        setDiscountPercentage(response.discount_value);
+      const applied = toCoupon(response);
+      if (applied) {
+        setCoupon(applied);
         setAppliedCouponCode(couponCode.trim());
-        addToast(`✅ Coupon applied! You got ${response.discount_value}% off.`, "success");
+        addToast(`✅ Coupon applied! You got ${couponLabel(applied)}.`, "success");
       } else {
         addToast("❌ Invalid coupon code.", "error");
       }
@@ -253,7 +275,7 @@ export default function Shop() {
 
   // Remove applied coupon
   function removeCoupon() {
-    setDiscountPercentage(0);
+    setCoupon(null);
     setAppliedCouponCode(null);
     setCouponCode("");
     addToast("Coupon removed", "info");
@@ -266,8 +288,15 @@ export default function Shop() {
           ✨ Premium Fireworks Collection
         </h2>
 
-        {/* Category Filter */}
-        <div className="mb-8 max-w-sm mx-auto">
+        {/* Search and Category Filter */}
+        <div className="mb-8 max-w-sm mx-auto space-y-3">
+          <input
+            type="search"
+            value={query}
+            onChange={(e) => setQuery(e.target.value)}
+            placeholder="Search crackers, e.g. bijili"
+            className="w-full border border-gray-300 rounded px-3 py-2"
+          />
           <Select
             options={categoryOptions}
             value={categoryOptions.find((opt) => opt.value === category)}
@@ -282,9 +311,10 @@ export default function Shop() {
           {filteredProducts.map((p) => (
             <div key={p.id} className="flex flex-col bg-white rounded-lg shadow overflow-hidden">
               <div className="relative w-full h-36 sm:h-40 md:h-44 lg:h-48 bg-gray-100 overflow-hidden">
-                <img
-                  src={p.image_url || Default}
-                  alt={p.name}
+                <ProductImage
+                  p={p}
+                  size="card"
+                  fallback={Default}
                   className="w-full h-full object-contain transition-transform duration-500 hover:scale-105"
                 />
                 {cart[p.id] > 0 && (
@@ -363,7 +393,7 @@ export default function Shop() {
                         {selectedRows.map((r) => (
                           <tr key={r.id} className="hover:bg-red-50 transition-colors duration-200">
                             <td className="px-6 py-4 flex items-center space-x-3">
-                              <img src={r.image_url || Default} alt={r.name} className="w-16 h-16 object-cover rounded-md shadow-sm border border-gray-100" />
+                              <ProductImage p={r} size="thumb" fallback={Default} className="w-16 h-16 object-cover rounded-md shadow-sm border border-gray-100" />
                               <div className="font-medium text-gray-900 text-base">{r.name}</div>
                             </td>
                             <td className="px-6 py-4 text-sm text-gray-500 line-through">{formatCurrency(r.mrp)}</td>
@@ -425,7 +455,7 @@ export default function Shop() {
                           <label htmlFor="coupon" className="block text-sm font-semibold text-gray-700 mb-2">Coupon Code (Optional)</label>
                           {appliedCouponCode ? (
                             <div className="flex items-center gap-2 p-3 bg-green-50 border border-green-200 rounded-lg">
-                              <span className="text-green-700 font-medium">✅ {appliedCouponCode} applied ({discountPercentage}% off)</span>
+                              <span className="text-green-700 font-medium">✅ {appliedCouponCode} applied ({coupon && couponLabel(coupon)})</span>
                               <button 
                                 type="button" 
                                 onClick={removeCoupon}
@@ -469,9 +499,9 @@ export default function Shop() {
                             <span>Subtotal:</span>
                             <span>{formatCurrency(subtotal)}</span>
                           </div>
-                          {discountPercentage > 0 && (
+                          {coupon && (
                             <div className="flex justify-between text-green-600">
-                              <span>Discount ({discountPercentage}% off):</span>
+                              <span>Discount ({couponLabel(coupon)}):</span>
                               <span>-{formatCurrency(discountAmount)}</span>
                             </div>
                           )}
@@ -1,5 +1,5 @@
 import { useState, useEffect } from "react";
-import { g, j } from "../../api"; // Assuming these are correctly configured
+import { g, j, openWithToken } from "../../api"; // Assuming these are correctly configured
 import { FaExternalLinkAlt, FaFilePdf, FaChevronDown, FaChevronUp, FaSort, FaExclamationTriangle, FaBoxOpen, FaSpinner, FaEye, FaEyeSlash } from 'react-icons/fa';
 import { MoreVertical, Edit, Trash2 } from "lucide-react";
 import useToast from "../../pages/Toast/useToast";
@@ -29,6 +29,10 @@ type Order = {
 };
 
 const STATUS_OPTIONS: Order["status"][] = ["NOT_ENQUIRED", "IN_PROGRESS", "DELIVERED", "ABORTED"];
+// Columns the order index can sort on
+const SORT_KEYS = ["created_at", "total"] as const;
+type SortKey = typeof SORT_KEYS[number];
+const ITEMS_PER_PAGE = 8;
 
 // ---------------- Helper Functions ---------------- //
 const getStatusClass = (status?: Order["status"]): string => {
@@ -53,37 +57,47 @@ const formatCurrency = (amount?: number): string => {
   return `₹${(amount ?? 0).toFixed(2)}`;
 };
 
+type AdminOrderListProps = {
+  token: string;
+};
+
 // ---------------- Component ---------------- //
-export default function AdminOrderList() {
+export default function AdminOrderList({ token }: AdminOrderListProps) {
   const [orders, setOrders] = useState<Order[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [expandedOrderId, setExpandedOrderId] = useState<string | null>(null);
-  const [sortKey, setSortKey] = useState<keyof Order>('created_at');
+  const [sortKey, setSortKey] = useState<SortKey>('created_at');
   const [sortDirection, setSortDirection] = useState<'asc' | 'desc'>('desc');
   const [statusFilter, setStatusFilter] = useState<string>("ALL");
+  // cursors[i] fetches page i + 1; the first page needs none
+  const [cursors, setCursors] = useState<(string | null)[]>([null]);
   const [currentPage, setCurrentPage] = useState(1);
-  const ITEMS_PER_PAGE = 8;
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isUpdatingStatus, setIsUpdatingStatus] = useState<string | null>(null); // To disable select during update
   const [open, setOpen] = useState<string | null>(null);
   const { addToast, ToastContainer } = useToast();
 
   useEffect(() => {
-
+    if (!token) return;
     fetchOrders();
-  }, []);
+  }, [token, statusFilter, sortKey, sortDirection, currentPage]);
+  // Filtering, sorting and paging all happen in the order index; only the current page is loaded
   const fetchOrders = async () => {
     setLoading(true);
     setError(null);
     try {
-      const data = await g("/api/admin/orders");
+      const params = new URLSearchParams({ sort: sortKey, direction: sortDirection, limit: String(ITEMS_PER_PAGE) });
+      if (statusFilter !== "ALL") params.set("status", statusFilter);
+      const cursor = cursors[currentPage - 1];
+      if (cursor) params.set("cursor", cursor);
+      const page: { orders: Order[]; next_cursor: string | null } = await g(`/api/admin/orders?${params}`, token);
       // Ensure items is an array for all orders, default to empty array if missing
-      const processedData = data.map((order: Order) => ({
+      setOrders(page.orders.map((order: Order) => ({
         ...order,
         items: order.items || [],
-      }));
-      const sortedData = processedData.sort((a: Order, b: Order) => new Date(b.created_at).getTime() - new Date(a.created_at).getTime());
-      setOrders(sortedData);
+      })));
+      setNextCursor(page.next_cursor);
     } catch (err: any) {
       console.error("API Fetch Error:", err);
       setError(err.message || "An unknown error occurred while fetching orders.");
@@ -98,7 +112,7 @@ export default function AdminOrderList() {
     setIsUpdatingStatus(orderId); // Mark which order is being deleted
 
     // Send DELETE request
-    await j(`/api/admin/orders/${orderId}`, "DELETE");
+    await j(`/api/admin/orders/${orderId}`, "DELETE", undefined, token);
 
     // Refresh orders after successful deletion
     await fetchOrders();
@@ -125,7 +139,7 @@ export default function AdminOrderList() {
       setOrders(prev => prev.map(o =>
         o.order_id === orderId ? { ...o, status: typedNewStatus } : o
       ));
-      await j(`/api/admin/orders/${orderId}/status`, "PATCH", { status: newStatus });
+      await j(`/api/admin/orders/${orderId}/status`, "PATCH", { status: newStatus }, token);
     } catch (err) {
       console.error("Failed to update status", err);
       // Revert to original status if update fails
@@ -140,47 +154,37 @@ export default function AdminOrderList() {
     }
   };
 
-  const handleSort = (key: keyof Order) => {
+  // The local order store serves invoices from an admin route, which needs the token
+  const openInvoice = (e: React.MouseEvent, url: string) => {
+    if (!url.startsWith("/api/")) return;
+    e.preventDefault();
+    openWithToken(url, token).catch(err => {
+      console.error("Failed to open invoice", err);
+      addToast("Could not open the invoice PDF.");
+    });
+  };
+
+  // Cursors only hold for the query that produced them
+  const resetPages = () => {
+    setCursors([null]);
+    setCurrentPage(1);
+  };
+
+  const handleSort = (key: SortKey) => {
     if (key === sortKey) {
       setSortDirection(sortDirection === 'asc' ? 'desc' : 'asc');
     } else {
       setSortKey(key);
       setSortDirection('desc'); // Default to descending for new sort key
     }
+    resetPages();
   };
 
-  // Ensure order.status is treated as a string for filtering
-  const filteredOrders = orders.filter(order => statusFilter === "ALL" || (order.status ?? 'NOT_ENQUIRED') === statusFilter);
-
-  const sortedOrders = [...filteredOrders].sort((a, b) => {
-    let aValue: any = a[sortKey];
-    let bValue: any = b[sortKey];
-
-    // Type-specific comparisons
-    if (sortKey === 'created_at') {
-      aValue = new Date(a.created_at).getTime();
-      bValue = new Date(b.created_at).getTime();
-    } else if (sortKey === 'customer_name' || sortKey === 'order_id') {
-      aValue = String(aValue ?? '').toLowerCase();
-      bValue = String(bValue ?? '').toLowerCase();
-    } else if (sortKey === 'total') {
-      aValue = Number(aValue ?? 0);
-      bValue = Number(bValue ?? 0);
-    }
-    // Handle 'status' sorting by ensuring both are strings
-    else if (sortKey === 'status') {
-      aValue = String(a.status ?? 'NOT_ENQUIRED');
-      bValue = String(b.status ?? 'NOT_ENQUIRED');
-    }
-
-
-    if (aValue < bValue) return sortDirection === 'asc' ? -1 : 1;
-    if (aValue > bValue) return sortDirection === 'asc' ? 1 : -1;
-    return 0;
-  });
-
-  const totalPages = Math.ceil(sortedOrders.length / ITEMS_PER_PAGE);
-  const paginatedOrders = sortedOrders.slice((currentPage - 1) * ITEMS_PER_PAGE, currentPage * ITEMS_PER_PAGE);
+  const goToNextPage = () => {
+    if (!nextCursor) return;
+    setCursors(prev => [...prev.slice(0, currentPage), nextCursor]);
+    setCurrentPage(p => p + 1);
+  };
 
   // --- Loading, Error, Empty States ---
   if (loading) return (
@@ -206,7 +210,7 @@ export default function AdminOrderList() {
     </div>
   );
 
-  if (orders.length === 0 && statusFilter === "ALL") return (
+  if (orders.length === 0 && currentPage === 1 && statusFilter === "ALL") return (
     <div className="flex flex-col items-center justify-center h-screen bg-gray-50 p-8">
       <FaBoxOpen className="h-12 w-12 text-indigo-500 mb-4" />
       <h2 className="text-2xl font-bold text-gray-800 mb-2">No Orders Found</h2>
@@ -214,13 +218,13 @@ export default function AdminOrderList() {
     </div>
   );
 
-  if (filteredOrders.length === 0 && statusFilter !== "ALL") return (
+  if (orders.length === 0 && currentPage === 1 && statusFilter !== "ALL") return (
     <div className="flex flex-col items-center justify-center h-screen bg-gray-50 p-8">
       <FaBoxOpen className="h-12 w-12 text-gray-400 mb-4" />
       <h2 className="text-2xl font-bold text-gray-700 mb-2">No Orders Matching Filter</h2>
       <p className="text-lg text-gray-500">No orders found with status: **{statusFilter.replace('_', ' ')}**.</p>
       <button
-        onClick={() => setStatusFilter("ALL")}
+        onClick={() => { setStatusFilter("ALL"); resetPages(); }}
         className="mt-6 px-6 py-2 bg-indigo-600 text-white rounded-lg shadow hover:bg-indigo-700 transition-colors"
       >
         Show All Orders
@@ -237,7 +241,7 @@ export default function AdminOrderList() {
             <span className="text-indigo-600">📦</span> Orders Dashboard
           </h1>
           <p className="text-gray-500 mt-1 text-sm md:text-base">
-            Manage and update order statuses. ({filteredOrders.length} {filteredOrders.length === 1 ? 'order' : 'orders'} visible of {orders.length} total)
+            Manage and update order statuses. (Page {currentPage}, {orders.length} {orders.length === 1 ? 'order' : 'orders'} shown)
           </p>
         </div>
         <div className="flex flex-col sm:flex-row gap-2 items-start sm:items-center">
@@ -247,7 +251,7 @@ export default function AdminOrderList() {
             className="border border-gray-300 rounded-lg px-4 py-2 text-sm text-gray-800 bg-white shadow-sm
                        focus:ring-2 focus:ring-indigo-400 focus:border-transparent transition duration-200 ease-in-out"
             value={statusFilter}
-            onChange={(e) => { setStatusFilter(e.target.value); setCurrentPage(1); }}
+            onChange={(e) => { setStatusFilter(e.target.value); resetPages(); }}
           >
             <option value="ALL">All Orders</option>
             {STATUS_OPTIONS.map(status => (
@@ -275,12 +279,12 @@ export default function AdminOrderList() {
                 if (key === 'status') label = 'Status'; // Added for clarity
                 if (key === 'action') label = 'Action';
 
-                const isSortable = ['created_at', 'order_id', 'customer_name', 'total', 'status'].includes(key); // Added 'status'
+                const isSortable = (SORT_KEYS as readonly string[]).includes(key);
                 return (
                   <th
                     key={key}
                     className={`px-4 py-3 ${isSortable ? 'cursor-pointer hover:bg-gray-100 transition-colors' : ''}`}
-                    onClick={() => isSortable && handleSort(key as keyof Order)}
+                    onClick={() => isSortable && handleSort(key as SortKey)}
                   >
                     <div className="flex items-center gap-1">
                       {label}
@@ -297,7 +301,7 @@ export default function AdminOrderList() {
             </tr>
           </thead>
           <tbody className="divide-y divide-gray-100">
-            {paginatedOrders.map(order => {
+            {orders.map(order => {
               const isExpanded = order.order_id === expandedOrderId;
               return (
                 <tr key={order.order_id} className="hover:bg-indigo-50 transition duration-200 align-top text-sm">
@@ -363,6 +367,7 @@ export default function AdminOrderList() {
                     {order.order_pdf ? (
                       <a
                         href={order.order_pdf}
+                        onClick={(e) => openInvoice(e, order.order_pdf!)}
                         target="_blank"
                         rel="noopener noreferrer"
                         className="text-indigo-600 hover:text-indigo-800 transition-colors focus:outline-none focus:ring-2 focus:ring-indigo-300 rounded-full inline-flex p-2"
@@ -412,7 +417,7 @@ export default function AdminOrderList() {
       </div>
 
       {/* Pagination Controls */}
-      {totalPages > 1 && (
+      {(currentPage > 1 || nextCursor) && (
         <div className="flex justify-center items-center gap-2 mt-6 flex-wrap">
           <button
             onClick={() => setCurrentPage(p => Math.max(1, p - 1))}
@@ -421,19 +426,12 @@ export default function AdminOrderList() {
           >
             Previous
           </button>
-          {Array.from({ length: totalPages }, (_, i) => (
-            <button
-              key={i}
-              onClick={() => setCurrentPage(i + 1)}
-              className={`px-4 py-2 border border-gray-300 rounded-lg text-sm transition-colors
-                          ${currentPage === i + 1 ? 'bg-indigo-600 text-white shadow-md' : 'bg-white text-gray-700 hover:bg-gray-100'}`}
-            >
-              {i + 1}
-            </button>
-          ))}
+          <span className="px-4 py-2 border border-gray-300 rounded-lg text-sm bg-indigo-600 text-white shadow-md">
+            {currentPage}
+          </span>
           <button
-            onClick={() => setCurrentPage(p => Math.min(totalPages, p + 1))}
-            disabled={currentPage === totalPages}
+            onClick={goToNextPage}
+            disabled={!nextCursor}
             className="px-4 py-2 border border-gray-300 rounded-lg text-gray-700 bg-white hover:bg-gray-100 disabled:opacity-50 disabled:cursor-not-allowed transition-colors text-sm"
           >
             Next
@@ -443,7 +441,7 @@ export default function AdminOrderList() {
 
       {/* Mobile Cards */}
       <div className="md:hidden space-y-5 mt-4">
-        {paginatedOrders.map(order => {
+        {orders.map(order => {
           const isExpanded = order.order_id === expandedOrderId;
           return (
             <div key={order.order_id} className="bg-white rounded-xl shadow-md p-5 border border-gray-200 transition duration-300 hover:shadow-lg">
@@ -523,6 +521,7 @@ export default function AdminOrderList() {
                   {order.order_pdf ? (
                     <a
                       href={order.order_pdf}
+                      onClick={(e) => openInvoice(e, order.order_pdf!)}
                       target="_blank"
                       rel="noopener noreferrer"
                       className="flex items-center gap-2 text-indigo-600 text-sm font-medium hover:underline pt-2"
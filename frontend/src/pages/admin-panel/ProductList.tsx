@@ -1,6 +1,6 @@
 import React, { useState } from "react";
 import type { Product } from "../../types";
-import { j } from "../../api";
+import { j, uploadImage } from "../../api";
 import { saveAs } from "file-saver";
 import * as XLSX from "xlsx";
 import jsPDF from "jspdf";
@@ -67,13 +67,7 @@ export default function ProductList({ products, setProducts, token }: ProductLis
 
     let image_url = form.image_url;
     if (file) {
-      const meta = await j("/api/admin/upload-url", "POST", { file }, token);
-      await fetch(meta.upload_url, {
-        method: "PUT",
-        headers: { "Content-Type": "application/octet-stream" },
-        body: file,
-      });
-      image_url = meta.public_url;
+      image_url = await uploadImage(file, token);
     }
 
     const payload = { ...form, image_url };
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { j } from "../../api";
+import { j, uploadImage } from "../../api";
 import type { Product } from "../../types";
 import * as XLSX from "xlsx";
 import exampleFile from "../../assets/exampule-formet.xlsx";
@@ -33,19 +33,7 @@ function ProductForm({ token, products, setProducts }: any) {
     if (!file) return;
 
     try {
-      const formData = new FormData();
-      formData.append("file", file);
-
-      const res = await fetch("/api/admin/upload-url", {
-        method: "POST",
-        body: formData,
-        headers: { Authorization: `Bearer ${token}` },
-      });
-
-      if (!res.ok) throw new Error("Upload failed");
-
-      const data = await res.json();
-      setImageUrl(data.public_url);
+      setImageUrl(await uploadImage(file, token));
     } catch (err: any) {
       console.error("Image upload failed:", err.message);
       setImageUrl(null);
@@ -1,3 +1,10 @@
+export type ImageVariant = {
+	webp: string;
+	jpeg: string;
+	width: number;
+	height: number;
+};
+
 export type Product = {
 	id: string;
 	name: string;
@@ -5,6 +12,8 @@ export type Product = {
 	price: number;
 	mrp: number;
 	image_url?: string;
+	image_variants?: Record<'thumb' | 'card', ImageVariant>;
+	image_source?: string;
 	category?: string;
 	is_active: boolean;
 	sequence_number?: number;